@@ -1,6 +1,7 @@
 from . import appointments
 from . import conversations
 from . import doctors
+from . import jobs
 from . import llm
 from . import patients
 from . import transcribe 
\ No newline at end of file
@@ -1,15 +1,20 @@
-from fastapi import APIRouter, HTTPException
-from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Request
+from typing import Dict, List, Optional
 from pydantic import BaseModel
 from datetime import date
-from core.crud import (
+from core.async_crud import (
     create_appointment,
     read_appointment,
     update_appointment,
     delete_appointment,
     get_doctor_appointments_by_date,
-    get_doctor_appointment_times
+    get_doctor_appointment_times,
+    get_availability,
+    get_consultation,
+    get_doctor_day
 )
+from core.paging import list_response
+from core.responses import json_response
 
 router = APIRouter()
 
@@ -30,41 +35,84 @@ class AppointmentUpdate(BaseModel):
 @router.post("/", response_model=dict)
 async def create_new_appointment(appointment: AppointmentBase):
     try:
-        return create_appointment(**appointment.dict())
+        return await create_appointment(**appointment.dict())
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/availability", response_model=Dict[str, Dict[str, List[str]]])
+async def get_doctors_availability(request: Request, doctor_ids: str, start: str, end: str):
+    """
+    Get free slots for one or more doctors (comma-separated IDs) between two dates, inclusive.
+    """
+    try:
+        ids = [doctor_id.strip() for doctor_id in doctor_ids.split(",") if doctor_id.strip()]
+        return json_response(request, await get_availability(ids, start, end))
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/{appointment_id}", response_model=dict)
-async def get_appointment(appointment_id: str):
-    appointment = read_appointment(appointment_id)
+async def get_appointment(request: Request, appointment_id: str):
+    appointment = await read_appointment(appointment_id)
     if not appointment:
         raise HTTPException(status_code=404, detail="Appointment not found")
-    return appointment
+    return json_response(request, appointment)
+
+@router.get("/{appointment_id}/consultation", response_model=dict)
+async def get_appointment_consultation(request: Request, appointment_id: str, patient_fields: str = "*", conversation_fields: str = "*"):
+    """
+    Get an appointment with its patient and latest conversation in one request.
+    The *_fields parameters take comma-separated column names to return.
+    """
+    try:
+        consultation = await get_consultation(appointment_id, patient_fields, conversation_fields)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not consultation:
+        raise HTTPException(status_code=404, detail="Appointment not found")
+    return json_response(request, consultation)
 
 @router.put("/{appointment_id}", response_model=dict)
 async def update_existing_appointment(appointment_id: str, appointment: AppointmentUpdate):
     try:
-        return update_appointment(appointment_id, **appointment.dict(exclude_unset=True))
+        return await update_appointment(appointment_id, **appointment.dict(exclude_unset=True))
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.delete("/{appointment_id}")
 async def delete_existing_appointment(appointment_id: str):
     try:
-        return delete_appointment(appointment_id)
+        return await delete_appointment(appointment_id)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/doctor/{doctor_id}/date/{date}", response_model=List[dict])
-async def get_doctor_appointments(doctor_id: str, date: str):
+async def get_doctor_appointments(request: Request, doctor_id: str, date: str, fields: str = "*",
+                                  limit: Optional[int] = None, cursor: Optional[str] = None, format: str = "json"):
+    """
+    Get a doctor's appointments for a date.
+    `fields` picks columns; `limit` and `cursor` page through them (the next cursor is in the
+    X-Next-Cursor header); format=ndjson streams every row.
+    """
+    try:
+        return await list_response(request, "appointment", [("doctor_id", "eq", doctor_id), ("date", "eq", date)],
+                                   fields, limit, cursor, format,
+                                   unpaged=lambda: get_doctor_appointments_by_date(doctor_id, date, fields))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/doctor/{doctor_id}/day/{date}", response_model=dict)
+async def get_doctor_schedule(request: Request, doctor_id: str, date: str, patient_fields: str = "id,name,contact"):
+    """
+    Get a doctor's appointments for a date with each patient embedded, plus the free times.
+    """
     try:
-        return get_doctor_appointments_by_date(doctor_id, date)
+        return json_response(request, await get_doctor_day(doctor_id, date, patient_fields))
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/doctor/{doctor_id}/times/{date}", response_model=List[str])
-async def get_doctor_times(doctor_id: str, date: str):
+async def get_doctor_times(request: Request, doctor_id: str, date: str):
     try:
-        return get_doctor_appointment_times(doctor_id, date)
+        return json_response(request, await get_doctor_appointment_times(doctor_id, date))
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e)) 
\ No newline at end of file
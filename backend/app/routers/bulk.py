@@ -0,0 +1,73 @@
+from fastapi import APIRouter, HTTPException, Request
+from typing import Any, Dict, List
+from pydantic import BaseModel
+from core.bulk import (
+    bulk_create,
+    bulk_update,
+    bulk_delete,
+    bulk_read,
+    bulk_import
+)
+
+router = APIRouter()
+
+class BatchItems(BaseModel):
+    # Validated per item, so one malformed item fails alone
+    items: List[Any]
+
+class BatchUpdates(BaseModel):
+    items: List[Dict[str, Any]]
+
+class BatchIds(BaseModel):
+    ids: List[str]
+
+class BatchRead(BaseModel):
+    ids: List[str]
+    fields: str = "*"
+
+@router.post("/{resource}/create", response_model=dict)
+async def create_many(resource: str, batch: BatchItems):
+    """
+    Create patients, appointments or conversations in chunks, reporting the outcome of each item.
+    """
+    try:
+        return await bulk_create(resource, batch.items)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/{resource}/import", response_model=dict)
+async def import_many(resource: str, request: Request):
+    """
+    Create rows from an NDJSON request body (one JSON object per line), streamed in chunks.
+    """
+    try:
+        return await bulk_import(resource, request.stream())
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/{resource}/update", response_model=dict)
+async def update_many(resource: str, batch: BatchUpdates):
+    """
+    Update rows; each item holds the primary key and the fields to change.
+    """
+    try:
+        return await bulk_update(resource, batch.items)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/{resource}/delete", response_model=dict)
+async def delete_many(resource: str, batch: BatchIds):
+    try:
+        return await bulk_delete(resource, batch.ids)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/{resource}/read", response_model=dict)
+async def read_many(resource: str, batch: BatchRead):
+    """
+    Read rows by primary key; `fields` takes comma-separated column names to return.
+    """
+    try:
+        return await bulk_read(resource, batch.ids, batch.fields)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
@@ -1,12 +1,13 @@
-from fastapi import APIRouter, HTTPException
-from typing import Optional
+from fastapi import APIRouter, HTTPException, Request
+from typing import List, Optional
 from pydantic import BaseModel
-from core.crud import (
+from core.async_crud import (
     create_conversation,
     read_conversation,
     update_conversation,
     delete_conversation
 )
+from core.paging import list_response
 
 router = APIRouter()
 
@@ -28,14 +29,30 @@ class ConversationUpdate(BaseModel):
 async def create_new_conversation(conversation: ConversationBase):
     """Create a new conversation."""
     try:
-        return create_conversation(**conversation.dict())
+        return await create_conversation(**conversation.dict())
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/", response_model=List[dict])
+async def list_conversations(request: Request, patient_id: Optional[str] = None, appointment_id: Optional[str] = None,
+                             doctor_id: Optional[str] = None, fields: str = "*", limit: Optional[int] = None,
+                             cursor: Optional[str] = None, format: str = "json"):
+    """
+    List conversations, optionally for one patient, appointment or doctor, a page at a time.
+    Transcripts are large: pass e.g. fields=conversation_id,summary to leave out `text`.
+    The next page's cursor is in the X-Next-Cursor header; format=ndjson streams every row.
+    """
+    filters = [(column, "eq", value) for column, value in
+               (("patient_id", patient_id), ("appointment_id", appointment_id), ("doctor_id", doctor_id)) if value]
+    try:
+        return await list_response(request, "conversation", filters, fields, limit, cursor, format)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/{conversation_id}", response_model=dict)
 async def get_conversation(conversation_id: str):
     """Get a specific conversation by ID."""
-    conversation = read_conversation(conversation_id)
+    conversation = await read_conversation(conversation_id)
     if not conversation:
         raise HTTPException(status_code=404, detail="Conversation not found")
     return conversation
@@ -44,7 +61,7 @@ async def get_conversation(conversation_id: str):
 async def update_existing_conversation(conversation_id: str, conversation: ConversationUpdate):
     """Update an existing conversation."""
     try:
-        return update_conversation(conversation_id, **conversation.dict(exclude_unset=True))
+        return await update_conversation(conversation_id, **conversation.dict(exclude_unset=True))
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -52,6 +69,6 @@ async def update_existing_conversation(conversation_id: str, conversation: Conve
 async def delete_existing_conversation(conversation_id: str):
     """Delete a conversation by ID."""
     try:
-        return delete_conversation(conversation_id)
+        return await delete_conversation(conversation_id)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e)) 
\ No newline at end of file
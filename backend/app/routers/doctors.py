@@ -1,13 +1,22 @@
-from fastapi import APIRouter, HTTPException
-from typing import List
-from core.crud import get_doctors
+from fastapi import APIRouter, HTTPException, Request
+from typing import List, Optional
+from core.async_crud import get_doctors
+from core.paging import list_response
 
 router = APIRouter()
 
 @router.get("/", response_model=List[dict])
-async def get_all_doctors():
-    """Get all doctors from the database."""
+async def get_all_doctors(request: Request, fields: str = "*", limit: Optional[int] = None,
+                          cursor: Optional[str] = None, format: str = "json"):
+    """
+    Get all doctors from the database.
+    `fields` picks columns; `limit` and `cursor` page through them (the next cursor is in the
+    X-Next-Cursor header); format=ndjson streams every row.
+    """
     try:
-        return get_doctors()
+        return await list_response(request, "doctor", [], fields, limit, cursor, format,
+                                   unpaged=lambda: get_doctors(fields))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,157 @@
+from fastapi import APIRouter, HTTPException, Request
+from pydantic import BaseModel
+from sse_starlette.sse import EventSourceResponse
+from typing import List, Literal
+import json
+import os
+from core.jobs import (
+    FAILED,
+    SOAP_NOTE,
+    STEP_ORDER,
+    SUCCEEDED,
+    SUMMARY,
+    TRANSCRIPTION,
+    QueueFull,
+    job_queue,
+    public_job,
+    save_audio
+)
+from core.transcribe import ALLOWED_TYPES, SEGMENTED_MAX_UPLOAD_BYTES
+from core.uploads import InvalidUpload, UploadTooLarge, open_upload
+
+router = APIRouter()
+
+NoteStep = Literal["summary", "soap_note", "referral_letter"]
+CacheMode = Literal["use", "refresh", "bypass"]
+# Longest wait before re-reading a job on the progress stream; changes made by another process are only seen this way
+EVENTS_POLL_SECONDS = 15
+
+class NotesJobInput(BaseModel):
+    text: str
+    doctor_notes: str = ""
+    patient_information: str = ""
+    steps: List[NoteStep] = [SUMMARY, SOAP_NOTE]
+    cache: CacheMode = "use"
+
+async def _submit(steps, params, audio_path=None):
+    try:
+        return public_job(await job_queue.submit(steps, params, audio_path))
+    except QueueFull as e:
+        if audio_path and os.path.exists(audio_path):
+            os.remove(audio_path)
+        raise HTTPException(status_code=503, detail=str(e))
+
+@router.post("/consultation", status_code=202)
+async def submit_consultation_job(request: Request, segmented: bool = False, cache: CacheMode = "use"):
+    """
+    Queue transcription of a recording followed by note generation.
+
+    Multipart form: `file` (the recording) plus optional `doctor_notes`,
+    `patient_information` and `steps` (comma-separated, default
+    "transcription,summary,soap_note"). Returns the job straight away; poll
+    /{job_id} or follow /{job_id}/events for progress.
+    """
+    try:
+        upload = await open_upload(request.headers, request.stream(), "file", SEGMENTED_MAX_UPLOAD_BYTES)
+        media_type = upload.content_type.split(";")[0].strip().lower()
+        if media_type not in ALLOWED_TYPES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"File type {upload.content_type} not supported. Must be one of: {ALLOWED_TYPES}"
+            )
+        suffix = os.path.splitext(upload.filename or "")[1] or ".wav"
+        audio_path = await save_audio(upload.chunks(), suffix)
+        try:
+            fields = await upload.finish()
+        except Exception:
+            os.remove(audio_path)
+            raise
+    except HTTPException:
+        raise
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except InvalidUpload as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    steps = [s.strip() for s in fields.get("steps", f"{TRANSCRIPTION},{SUMMARY},{SOAP_NOTE}").split(",")]
+    unknown = [step for step in steps if step not in STEP_ORDER]
+    if unknown:
+        os.remove(audio_path)
+        raise HTTPException(status_code=400, detail=f"Unknown steps {unknown}. Must be among: {list(STEP_ORDER)}")
+    if TRANSCRIPTION not in steps:
+        steps.insert(0, TRANSCRIPTION)
+    params = {
+        "filename": upload.filename or f"audio{suffix}",
+        "content_type": media_type,
+        "segmented": segmented,
+        "doctor_notes": fields.get("doctor_notes", ""),
+        "patient_information": fields.get("patient_information", ""),
+        "cache": cache,
+    }
+    return await _submit(steps, params, audio_path)
+
+@router.post("/notes", status_code=202)
+async def submit_notes_job(request: NotesJobInput):
+    """Queue note generation for a transcript that is already available."""
+    params = {
+        "text": request.text,
+        "doctor_notes": request.doctor_notes,
+        "patient_information": request.patient_information,
+        "cache": request.cache,
+    }
+    return await _submit(request.steps, params)
+
+async def _get_job(job_id: str):
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.get("/{job_id}")
+async def get_job(job_id: str):
+    """Return a job's status and progress."""
+    return public_job(await _get_job(job_id))
+
+@router.get("/{job_id}/result")
+async def get_job_result(job_id: str):
+    """Return the results of every completed step, once the job has succeeded."""
+    job = await _get_job(job_id)
+    if job["status"] == FAILED:
+        raise HTTPException(status_code=500, detail=job["error"])
+    if job["status"] != SUCCEEDED:
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+    return {"job_id": job_id, "results": job["results"]}
+
+@router.get("/{job_id}/events")
+async def get_job_events(job_id: str):
+    """
+    Stream job progress as Server-Sent Events.
+
+    Sends a `status` event whenever the job changes, a `result` event per
+    completed step, and ends with `done` (carrying the final status).
+    """
+    await _get_job(job_id)
+
+    async def events():
+        sent_status = None
+        sent_steps = set()
+        while True:
+            version = job_queue.version
+            job = await job_queue.get(job_id)
+            if job is None:
+                yield {"event": "error", "data": json.dumps({"detail": "Job not found"})}
+                return
+            status = public_job(job)
+            if (status["status"], status["stage"]) != sent_status:
+                sent_status = (status["status"], status["stage"])
+                yield {"event": "status", "data": json.dumps(status)}
+            for step in status["completed_steps"]:
+                if step not in sent_steps:
+                    sent_steps.add(step)
+                    yield {"event": "result", "data": json.dumps({"step": step, "result": job["results"][step]})}
+            if job["status"] in (SUCCEEDED, FAILED):
+                yield {"event": "done", "data": json.dumps({"status": job["status"], "error": job["error"]})}
+                return
+            await job_queue.wait_for_change(version, EVENTS_POLL_SECONDS)
+
+    return EventSourceResponse(events())
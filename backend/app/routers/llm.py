@@ -1,11 +1,23 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
+from sse_starlette.sse import EventSourceResponse
+from typing import AsyncIterator, Callable, Dict, List, Literal
+import json
+import time
 from core.llm import (
     get_medical_soap_note, 
-    get_appointment_prerequisites,
     get_medical_referral_letter,
-    get_transcription_summary
+    get_transcription_summary,
+    cached_stream_generate,
+    fit_prompt,
+    load_router,
+    soap_note_prompt,
+    referral_letter_prompt,
+    transcription_summary_prompt
 )
+from core.llm_cache import result_cache
+from core.artifacts import generate_artifacts
+from core.prerequisites import get_appointment_prerequisites
 
 router = APIRouter()
 
@@ -23,10 +35,70 @@ class TranscriptionInput(BaseModel):
 class PrerequisitesRequest(BaseModel):
     condition: str
 
+class ArtifactsInput(ConversationInput):
+    artifacts: List[Literal["soap_note", "summary", "referral_letter"]] = ["soap_note", "summary", "referral_letter"]
+    mode: Literal["combined", "parallel"] = "combined"
+
+# "refresh" regenerates and overwrites a cached result, "bypass" skips the cache entirely
+CacheMode = Literal["use", "refresh", "bypass"]
+
+def stream_events(name: str, tokens: AsyncIterator[str]) -> EventSourceResponse:
+    """
+    Relay generated text as Server-Sent Events.
+
+    Emits one `token` event per chunk, then a `done` event carrying time to first
+    token and throughput, or an `error` event. If the client disconnects the
+    response task is cancelled, which closes `tokens` and aborts the upstream call.
+    """
+    async def events():
+        start = time.perf_counter()
+        first_token_at = None
+        count = 0
+        try:
+            async for token in tokens:
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                count += 1
+                yield {"event": "token", "data": json.dumps({"text": token})}
+        except Exception as e:
+            yield {"event": "error", "data": json.dumps({"detail": str(e)})}
+            return
+        finally:
+            await tokens.aclose()
+        elapsed = time.perf_counter() - start
+        generating = elapsed - (first_token_at - start) if first_token_at else 0
+        metrics = {
+            "ttft_ms": round((first_token_at - start) * 1000, 1) if first_token_at else None,
+            "tokens": count,
+            "tokens_per_sec": round(count / generating, 2) if generating > 0 else None,
+            "total_ms": round(elapsed * 1000, 1),
+        }
+        print(f"{name} stream: {metrics}")
+        yield {"event": "done", "data": json.dumps(metrics)}
+
+    return EventSourceResponse(events())
+
+async def fitted_stream(kind: str, inputs: Dict, build_prompt: Callable[[str], str], text: str,
+                        cache: CacheMode) -> AsyncIterator[str]:
+    """
+    Fit the prompt to the token budget, then stream its generation.
+
+    Condensing a long transcript happens inside the stream, so the response
+    starts straight away, a disconnect cancels it, and a failed chunk summary
+    reaches the client as an `error` event.
+    """
+    prompt = await fit_prompt(build_prompt, text, cache)
+    tokens = cached_stream_generate(kind, inputs, prompt, cache)
+    try:
+        async for token in tokens:
+            yield token
+    finally:
+        await tokens.aclose()
+
 @router.post("/soap-note")
-async def create_soap_note(conversation: ConversationInput):
+async def create_soap_note(conversation: ConversationInput, cache: CacheMode = "use"):
     try:
-        return {"soap_note": await get_medical_soap_note(conversation.text, conversation.doctor_notes, conversation.patient_information)}
+        return {"soap_note": await get_medical_soap_note(conversation.text, conversation.doctor_notes, conversation.patient_information, cache)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -42,19 +114,86 @@ async def get_prerequisites(request: PrerequisitesRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/referral-letter")
-async def create_referral_letter(conversation: ConversationInput):
+async def create_referral_letter(conversation: ConversationInput, cache: CacheMode = "use"):
     try:
         return {"referral_letter": await get_medical_referral_letter(
             conversation.text,
             conversation.doctor_notes,
-            conversation.patient_information
+            conversation.patient_information,
+            cache
         )}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/transcription-summary")
-async def create_transcription_summary(transcription: TranscriptionInput):
+async def create_transcription_summary(transcription: TranscriptionInput, cache: CacheMode = "use"):
     try:
-        return {"summary": await get_transcription_summary(transcription.text)}
+        return {"summary": await get_transcription_summary(transcription.text, cache)}
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/soap-note/stream")
+async def stream_soap_note(conversation: ConversationInput, cache: CacheMode = "use"):
+    """Stream a SOAP note as Server-Sent Events while it is generated."""
+    return stream_events("soap-note", fitted_stream(
+        "soap_note",
+        conversation.dict(),
+        lambda text: soap_note_prompt(text, conversation.doctor_notes, conversation.patient_information),
+        conversation.text,
+        cache
+    ))
+
+@router.post("/referral-letter/stream")
+async def stream_referral_letter(conversation: ConversationInput, cache: CacheMode = "use"):
+    """Stream a referral letter as Server-Sent Events while it is generated."""
+    return stream_events("referral-letter", fitted_stream(
+        "referral_letter",
+        conversation.dict(),
+        lambda text: referral_letter_prompt(text, conversation.doctor_notes, conversation.patient_information),
+        conversation.text,
+        cache
+    ))
+
+@router.post("/transcription-summary/stream")
+async def stream_transcription_summary(transcription: TranscriptionInput, cache: CacheMode = "use"):
+    """Stream a transcription summary as Server-Sent Events while it is generated."""
+    return stream_events("transcription-summary", fitted_stream(
+        "transcription_summary", transcription.dict(), transcription_summary_prompt, transcription.text, cache
+    ))
+
+@router.get("/cache/stats")
+async def get_result_cache_stats():
+    """Report LLM result cache size and hit/miss counts."""
+    return result_cache.stats()
+
+@router.get("/models/stats")
+async def get_model_router_stats():
+    """Report per-model time to first token, hedged races won and lost, and failures."""
+    return (await load_router()).stats()
+
+@router.post("/consultation-artifacts")
+async def create_consultation_artifacts(request: ArtifactsInput, cache: CacheMode = "use"):
+    """
+    Generate several documents from one consultation transcript.
+
+    Streams an `artifact` Server-Sent Event as each document completes, then a
+    `done` event reporting prompt tokens sent and tokens saved versus separate calls.
+    """
+    if not request.artifacts:
+        raise HTTPException(status_code=400, detail="At least one artifact must be requested")
+
+    async def events():
+        try:
+            async for event in generate_artifacts(
+                request.artifacts,
+                request.text,
+                request.doctor_notes,
+                request.patient_information,
+                request.mode,
+                cache
+            ):
+                yield {"event": event.pop("event"), "data": json.dumps(event)}
+        except Exception as e:
+            yield {"event": "error", "data": json.dumps({"detail": str(e)})}
+
+    return EventSourceResponse(events())
@@ -1,7 +1,7 @@
 from fastapi import APIRouter, HTTPException
 from typing import Optional
 from pydantic import BaseModel
-from core.crud import (
+from core.async_crud import (
     create_patient,
     read_patient,
     update_patient,
@@ -26,14 +26,14 @@ class PatientUpdate(BaseModel):
 async def create_new_patient(patient: PatientBase):
     """Create a new patient."""
     try:
-        return create_patient(**patient.dict())
+        return await create_patient(**patient.dict())
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/{patient_id}", response_model=dict)
 async def get_patient(patient_id: str):
     """Get a specific patient by ID."""
-    patient = read_patient(patient_id)
+    patient = await read_patient(patient_id)
     if not patient:
         raise HTTPException(status_code=404, detail="Patient not found")
     return patient
@@ -42,7 +42,7 @@ async def get_patient(patient_id: str):
 async def update_existing_patient(patient_id: str, patient: PatientUpdate):
     """Update an existing patient."""
     try:
-        return update_patient(patient_id, **patient.dict(exclude_unset=True))
+        return await update_patient(patient_id, **patient.dict(exclude_unset=True))
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -50,6 +50,6 @@ async def update_existing_patient(patient_id: str, patient: PatientUpdate):
 async def delete_existing_patient(patient_id: str):
     """Delete a patient by ID."""
     try:
-        return delete_patient(patient_id)
+        return await delete_patient(patient_id)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e)) 
\ No newline at end of file
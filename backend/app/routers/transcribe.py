@@ -1,37 +1,159 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
-import tempfile
-import os
-from core.transcribe import transcribe_audio
+from fastapi import APIRouter, HTTPException, Request, WebSocket, WebSocketDisconnect
+from typing import Literal
+import asyncio
+import json
+import re
+from core.audio import UnsupportedAudio, can_segment
+from core.streaming import StreamingSession, get_transcript
+from core.transcribe import (
+    ALLOWED_TYPES,
+    MAX_UPLOAD_BYTES,
+    SEGMENTED_MAX_UPLOAD_BYTES,
+    transcribe_segmented,
+    transcribe_stream,
+    transcript_cache
+)
+from core.uploads import InvalidUpload, UploadTooLarge, open_upload
 
 router = APIRouter()
 
+SHA256_HEX = re.compile(r"^[0-9a-fA-F]{64}$")
+
+# "refresh" transcribes again and overwrites a cached transcript, "bypass" skips the cache entirely
+CacheMode = Literal["use", "refresh", "bypass"]
+
 @router.post("/audio")
-async def transcribe_audio_file(file: UploadFile = File(...)):
+async def transcribe_audio_file(request: Request, segmented: bool = False, cache: CacheMode = "use"):
+    """
+    Transcribe the `file` field of a multipart upload.
+
+    The body is parsed as it arrives and the audio is forwarded straight to the
+    transcription backend, without a temporary file. With `segmented=true` the
+    recording is split at pauses and the pieces are transcribed concurrently,
+    which allows longer recordings; the response then also reports the
+    recording's duration and the number of pieces.
+
+    Transcripts are cached by the SHA-256 of the audio, which is always computed
+    from the upload itself. Segmented uploads are decoded whole before any piece
+    is sent, so a repeat is answered from the cache. A plain upload is forwarded
+    while it is received, so a repeat skips the backend only when the client
+    sends the hash in an `X-Content-SHA256` header: the upload is then read in
+    full and the cached transcript returned if its digest matches.
+    """
     try:
-        # Validate file type
-        allowed_types = ["audio/wav", "audio/mp3", "audio/mpeg", "audio/webm"]
-        if file.content_type not in allowed_types:
+        claimed = request.headers.get("x-content-sha256", "")
+        max_bytes = SEGMENTED_MAX_UPLOAD_BYTES if segmented else MAX_UPLOAD_BYTES
+        upload = await open_upload(request.headers, request.stream(), "file", max_bytes)
+
+        # Validate file type, ignoring parameters such as ";codecs=opus"
+        media_type = upload.content_type.split(";")[0].strip().lower()
+        if media_type not in ALLOWED_TYPES:
             raise HTTPException(
-                status_code=400, 
-                detail=f"File type {file.content_type} not supported. Must be one of: {allowed_types}"
+                status_code=400,
+                detail=f"File type {upload.content_type} not supported. Must be one of: {ALLOWED_TYPES}"
             )
 
-        # Create a temporary file to store the uploaded audio
-        suffix = os.path.splitext(file.filename)[1] or ".wav"
-        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp_file:
-            # Read chunks of the file instead of all at once
-            while content := await file.read(1024 * 1024):  # Read 1MB at a time
-                temp_file.write(content)
-            temp_file_path = temp_file.name
+        if segmented and can_segment(media_type):
+            result = await transcribe_segmented(media_type, upload.chunks(), cache=cache)
+            return {"transcription": result["text"], "segments": result["segments"],
+                    "duration": result["duration"], "pieces": result["pieces"], "cached": result["cached"]}
+
+        # Formats that cannot be decoded here go upstream whole, within the single-request limit
+        upload.max_bytes = MAX_UPLOAD_BYTES
+        result = await transcribe_stream(upload.filename or "audio.wav", media_type, upload.chunks(), cache,
+                                         claimed if SHA256_HEX.match(claimed) else None)
+        return {"transcription": result["text"], "segments": result["segments"], "cached": result["cached"]}
+
+    except HTTPException:
+        raise
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except (InvalidUpload, UnsupportedAudio) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 
+@router.get("/cache/stats")
+async def get_transcript_cache_stats():
+    """Report transcript cache size and hit/miss counts."""
+    return transcript_cache.stats()
+
+@router.websocket("/stream")
+async def transcribe_live(websocket: WebSocket, sample_rate: int = 16000):
+    """
+    Transcribe a recording while it is being made.
+
+    The client sends 16-bit little-endian mono PCM at `sample_rate` as binary
+    messages and {"type": "stop"} when the recording ends. The server sends
+    {"type": "session"} first, then "partial" and "final" events as audio is
+    transcribed, and a "transcript" event with the full text once stopped.
+    The transcript can also be fetched from /sessions/{session_id}.
+    """
+    await websocket.accept()
+    if not 8000 <= sample_rate <= 48000:
+        await websocket.send_json({"type": "error", "detail": "sample_rate must be between 8000 and 48000"})
+        await websocket.close(code=1003)
+        return
+
+    session = StreamingSession(sample_rate=sample_rate)
+    await websocket.send_json({"type": "session", "session_id": session.session_id})
+    new_audio = asyncio.Event()
+
+    async def transcribe_pending():
+        # Runs beside the receive loop so incoming audio is never held up by a slow transcription
+        while True:
+            await new_audio.wait()
+            new_audio.clear()
+            if not session.ready():
+                continue
+            try:
+                for event in await session.step():
+                    await websocket.send_json(event)
+            except Exception as e:
+                await websocket.send_json({"type": "error", "detail": str(e)})
+
+    worker = asyncio.create_task(transcribe_pending())
+    connected = True
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                connected = False
+                break
+            if message.get("bytes"):
+                session.append(message["bytes"])
+                new_audio.set()
+            elif message.get("text") and json.loads(message["text"]).get("type") == "stop":
+                break
+    except (ValueError, WebSocketDisconnect) as e:
+        connected = isinstance(e, ValueError)
+        if connected:
+            await websocket.send_json({"type": "error", "detail": str(e)})
+    finally:
+        worker.cancel()
         try:
-            # Transcribe the audio file
-            transcription = transcribe_audio(temp_file_path)
-            return {"transcription": transcription}
-        finally:
-            # Clean up the temporary file
-            if os.path.exists(temp_file_path):
-                os.unlink(temp_file_path)
+            await worker
+        except asyncio.CancelledError:
+            pass
 
+    try:
+        # Even if the client went away, finish so the transcript can be fetched afterwards
+        events = await session.finish()
+        if connected:
+            for event in events:
+                await websocket.send_json(event)
+            await websocket.close()
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        if connected:
+            await websocket.send_json({"type": "error", "detail": str(e)})
+            await websocket.close(code=1011)
+
+
+@router.get("/sessions/{session_id}")
+async def get_live_transcript(session_id: str):
+    """Return the transcript of a finished live transcription session."""
+    transcript = get_transcript(session_id)
+    if transcript is None:
+        raise HTTPException(status_code=404, detail="Transcription session not found")
+    return transcript
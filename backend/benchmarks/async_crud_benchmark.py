@@ -0,0 +1,84 @@
+"""
+Concurrency benchmark: blocking core.crud versus core.async_crud.
+
+Both variants serve GET /doctors from an `async def` route against a slow
+stand-in PostgREST server. The blocking variant stalls the event loop for each
+round-trip, so its throughput collapses to roughly 1 / latency.
+
+Usage (from backend/):
+    python -m benchmarks.async_crud_benchmark --latency 0.05 --requests 200 --concurrency 50
+"""
+import argparse
+import asyncio
+import os
+import time
+
+import httpx
+from fastapi import FastAPI
+
+from benchmarks.fake_postgrest import create_app, serve_in_thread
+
+FAKE_PORT = 54399
+# Any JWT-shaped key is accepted by the Supabase client
+FAKE_KEY = "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoic2VydmljZV9yb2xlIn0.benchmark"
+
+
+def build_app(use_async: bool) -> FastAPI:
+    from core import async_crud, crud
+
+    app = FastAPI()
+
+    if use_async:
+        @app.get("/doctors")
+        async def doctors():
+            return await async_crud.get_doctors()
+    else:
+        @app.get("/doctors")
+        async def doctors():
+            return crud.get_doctors()
+
+    return app
+
+
+async def drive(url: str, total: int, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency)
+
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+        async def one():
+            async with semaphore:
+                response = await client.get(url)
+                response.raise_for_status()
+
+        await client.get(url)  # warm the connection pools
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(total)))
+        return total / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.05, help="stand-in backend latency in seconds")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    os.environ["SUPABASE_URL"] = f"http://127.0.0.1:{FAKE_PORT}"
+    os.environ["SUPABASE_KEY"] = FAKE_KEY
+    os.environ["SUPABASE_HTTP2"] = "false"
+
+    seed = {"doctor": [{"doctor_id": f"DR{i:03}", "name": f"Doctor {i}"} for i in range(20)]}
+    serve_in_thread(create_app(latency=args.latency, seed=seed), FAKE_PORT)
+
+    results = {}
+    for port, label, use_async in ((54400, "blocking crud", False), (54401, "async crud", True)):
+        serve_in_thread(build_app(use_async), port)
+        results[label] = asyncio.run(drive(f"http://127.0.0.1:{port}/doctors", args.requests, args.concurrency))
+
+    print(f"latency={args.latency}s requests={args.requests} concurrency={args.concurrency}")
+    for label, rps in results.items():
+        print(f"  {label:<14} {rps:8.1f} req/s")
+
+
+if __name__ == "__main__":
+    main()
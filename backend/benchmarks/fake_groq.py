@@ -0,0 +1,71 @@
+"""
+Stand-in for Groq's audio transcription API used by the benchmarks.
+
+Serves POST /openai/v1/audio/transcriptions. The request body is consumed as
+a stream and discarded, so the server's own memory use stays flat; the
+"transcription" only reports how many bytes were received.
+
+FakeTranscriptionBackend does the same in process for live transcription:
+    TRANSCRIPTION_BACKEND=benchmarks.fake_groq:FakeTranscriptionBackend
+"""
+import asyncio
+import io
+import json
+import random
+import wave
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Route
+
+from core.streaming import TranscriptionBackend
+
+
+def create_app(latency: float = 0.0, error_rate: float = 0.0, error_status: int = 503) -> Starlette:
+    """
+    Build the stand-in transcription application.
+
+    Args:
+        latency (float): Seconds to wait after the upload before answering
+        error_rate (float): Fraction of requests answered with `error_status`
+        error_status (int): HTTP status of the injected errors
+    """
+    async def transcriptions(request: Request) -> Response:
+        received = 0
+        async for chunk in request.stream():
+            received += len(chunk)
+        if latency:
+            await asyncio.sleep(latency)
+        if random.random() < error_rate:
+            return Response(json.dumps({"error": {"message": "Injected error"}}), status_code=error_status,
+                            media_type="application/json")
+        body = {"text": f"Transcribed {received} bytes.", "segments": []}
+        return Response(json.dumps(body), media_type="application/json")
+
+    return Starlette(routes=[
+        Route("/openai/v1/audio/transcriptions", transcriptions, methods=["POST"]),
+    ])
+
+
+class FakeTranscriptionBackend(TranscriptionBackend):
+    """Describes each WAV it receives, with one segment per `segment_seconds`."""
+
+    def __init__(self, latency: float = 0.0, segment_seconds: float = 2.0):
+        self.latency = latency
+        self.segment_seconds = segment_seconds
+        self.calls = 0
+
+    async def transcribe(self, wav: bytes) -> dict:
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        with wave.open(io.BytesIO(wav), "rb") as audio:
+            duration = audio.getnframes() / audio.getframerate()
+        segments = []
+        start = 0.0
+        while start < duration:
+            end = min(duration, start + self.segment_seconds)
+            segments.append({"start": start, "end": end, "text": f"Audio from {start:.1f} to {end:.1f}."})
+            start = end
+        return {"text": " ".join(s["text"] for s in segments), "segments": segments}
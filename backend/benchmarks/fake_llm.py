@@ -0,0 +1,93 @@
+"""
+Stand-in for an Ollama model server, used to exercise model routing offline.
+
+Serves POST /api/chat, streamed (NDJSON) or not. Each reply echoes the start
+of the last message after `first_token_latency` seconds, then sends
+`tokens` words `token_delay` seconds apart. Run one per port to give the
+router several providers, e.g.:
+
+    python -m benchmarks.fake_llm --port 11435 --first-token-latency 3
+    LLM_PROVIDERS=ollama:slow@http://127.0.0.1:11435,ollama:fast@http://127.0.0.1:11436
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Route
+
+
+def create_app(first_token_latency: float = 0.0, token_delay: float = 0.0, tokens: int = 20,
+               fail_status: int = 0) -> Starlette:
+    """
+    Build the stand-in model application.
+
+    Args:
+        first_token_latency (float): Seconds before the first token
+        token_delay (float): Seconds between tokens
+        tokens (int): Words generated per reply
+        fail_status (int): If set, every request is answered with this HTTP status
+    """
+    stats = {"requests": 0, "completed": 0, "aborted": 0}
+
+    def chunk(model: str, content: str, done: bool, **extra) -> bytes:
+        body = {"model": model, "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "message": {"role": "assistant", "content": content}, "done": done, **extra}
+        return (json.dumps(body) + "\n").encode()
+
+    async def chat(request: Request) -> Response:
+        stats["requests"] += 1
+        if fail_status:
+            return Response(json.dumps({"error": "unavailable"}), status_code=fail_status,
+                            media_type="application/json")
+        payload = await request.json()
+        model = payload.get("model", "fake")
+        prompt = payload["messages"][-1]["content"]
+        words = [f"{prompt[:20]!r}"] + [f"w{i}" for i in range(1, tokens)]
+        usage = {"done_reason": "stop", "prompt_eval_count": len(prompt) // 4, "eval_count": len(words)}
+
+        if not payload.get("stream", True):
+            await asyncio.sleep(first_token_latency + token_delay * (len(words) - 1))
+            stats["completed"] += 1
+            return Response(chunk(model, " ".join(words), True, **usage), media_type="application/json")
+
+        async def body():
+            try:
+                await asyncio.sleep(first_token_latency)
+                for index, word in enumerate(words):
+                    if index:
+                        await asyncio.sleep(token_delay)
+                    yield chunk(model, word + " ", False)
+                yield chunk(model, "", True, **usage)
+                stats["completed"] += 1
+            except asyncio.CancelledError:
+                # The client went away, e.g. it lost a hedged race
+                stats["aborted"] += 1
+                raise
+
+        return StreamingResponse(body(), media_type="application/x-ndjson")
+
+    async def get_stats(request: Request) -> Response:
+        return Response(json.dumps(stats), media_type="application/json")
+
+    return Starlette(routes=[
+        Route("/api/chat", chat, methods=["POST"]),
+        Route("/stats", get_stats, methods=["GET"]),
+    ])
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--first-token-latency", type=float, default=0.2)
+    parser.add_argument("--token-delay", type=float, default=0.02)
+    parser.add_argument("--tokens", type=int, default=20)
+    parser.add_argument("--fail-status", type=int, default=0)
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.first_token_latency, args.token_delay, args.tokens, args.fail_status),
+                host="127.0.0.1", port=args.port, log_level="warning")
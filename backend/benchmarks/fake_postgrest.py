@@ -0,0 +1,130 @@
+"""
+Stand-in for the Supabase PostgREST API used by the benchmarks.
+
+Serves the `doctor`, `patient`, `appointment` and `conversation` tables from
+memory under /rest/v1 with a configurable per-request latency and error rate. Only the subset
+of PostgREST the backend uses is implemented: select, column filters
+(eq/neq/in/gt/gte/lt/lte), order, limit, insert, update and delete.
+"""
+import asyncio
+import json
+import random
+import threading
+import time
+from datetime import datetime, timezone
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Route
+
+TABLES = ("doctor", "patient", "appointment", "conversation")
+# Column defaults applied to inserted rows that leave the column out, like the real schema's
+DEFAULTS = {"conversation": {"created_at": lambda: datetime.now(timezone.utc).isoformat()}}
+
+
+def _parse_value(raw: str):
+    if raw.startswith("(") and raw.endswith(")"):
+        return [v.strip('"') for v in raw[1:-1].split(",") if v]
+    return raw.strip('"')
+
+
+def _matches(row, column, op, value) -> bool:
+    current = row.get(column)
+    current = "" if current is None else str(current)
+    if op == "eq":
+        return current == value
+    if op == "neq":
+        return current != value
+    if op == "in":
+        return current in value
+    if op == "gt":
+        return current > value
+    if op == "gte":
+        return current >= value
+    if op == "lt":
+        return current < value
+    if op == "lte":
+        return current <= value
+    raise ValueError(f"Unsupported filter operator: {op}")
+
+
+def _filters(request: Request):
+    for column, raw in request.query_params.multi_items():
+        if column in ("select", "order", "limit", "offset", "columns", "on_conflict"):
+            continue
+        op, _, value = raw.partition(".")
+        yield column, op, _parse_value(value)
+
+
+def _project(rows, select: str):
+    if not select or select == "*":
+        return rows
+    columns = [c.strip() for c in select.split(",")]
+    return [{c: row.get(c) for c in columns} for row in rows]
+
+
+def create_app(latency: float = 0.0, seed: dict = None, error_rate: float = 0.0,
+               error_status: int = 503) -> Starlette:
+    """
+    Build the stand-in PostgREST application.
+
+    Args:
+        latency (float): Seconds to wait before answering each request
+        seed (dict): Optional initial rows keyed by table name
+        error_rate (float): Fraction of requests answered with `error_status`
+        error_status (int): HTTP status of the injected errors
+    """
+    tables = {name: list((seed or {}).get(name, [])) for name in TABLES}
+
+    async def handle(request: Request) -> Response:
+        if latency:
+            await asyncio.sleep(latency)
+        if random.random() < error_rate:
+            return Response(json.dumps({"message": "Injected error", "code": str(error_status)}),
+                            status_code=error_status, media_type="application/json")
+        table = request.path_params["table"]
+        if table not in tables:
+            return Response(json.dumps({"message": f"relation {table} does not exist"}), status_code=404)
+        rows = tables[table]
+
+        if request.method == "POST":
+            payload = await request.json()
+            new_rows = payload if isinstance(payload, list) else [payload]
+            for row in new_rows:
+                for column, default in DEFAULTS.get(table, {}).items():
+                    row.setdefault(column, default())
+            rows.extend(new_rows)
+            return Response(json.dumps(new_rows), status_code=201, media_type="application/json")
+
+        selected = [r for r in rows if all(_matches(r, *f) for f in _filters(request))]
+        if request.method == "PATCH":
+            updates = await request.json()
+            for row in selected:
+                row.update(updates)
+        elif request.method == "DELETE":
+            tables[table] = [r for r in rows if not any(r is s for s in selected)]
+        else:
+            order = request.query_params.get("order")
+            if order:
+                column, _, direction = order.partition(".")
+                selected = sorted(selected, key=lambda r: str(r.get(column)), reverse=direction.startswith("desc"))
+            offset = int(request.query_params.get("offset", 0))
+            limit = request.query_params.get("limit")
+            selected = selected[offset:offset + int(limit) if limit else None]
+            selected = _project(selected, request.query_params.get("select"))
+        return Response(json.dumps(selected), media_type="application/json")
+
+    return Starlette(routes=[
+        Route("/rest/v1/{table}", handle, methods=["GET", "HEAD", "POST", "PATCH", "DELETE"]),
+    ])
+
+
+def serve_in_thread(app, port: int) -> uvicorn.Server:
+    """Run an ASGI app with uvicorn on a background thread and wait until it is up."""
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
@@ -0,0 +1,95 @@
+"""
+Stand-in for the watsonx.ai chat API used by the benchmarks.
+
+Serves POST /ml/v1/text/chat and /ml/v1/text/chat_stream (OpenAI-style
+chunks over SSE), plus POST /identity/token so the IAM exchange stays local
+too. Each reply echoes the start of the last message after
+`first_token_latency` seconds, then sends `tokens` words `token_delay`
+seconds apart. Point the backend at it with:
+
+    WATSONX_URL=http://127.0.0.1:54420 WATSONX_IAM_URL=http://127.0.0.1:54420/identity/token
+"""
+import asyncio
+import json
+import random
+import time
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Route
+
+
+def create_app(first_token_latency: float = 0.0, token_delay: float = 0.0, tokens: int = 20,
+               error_rate: float = 0.0, error_status: int = 503) -> Starlette:
+    """
+    Build the stand-in watsonx application.
+
+    Args:
+        first_token_latency (float): Seconds before the first token
+        token_delay (float): Seconds between tokens
+        tokens (int): Words generated per reply
+        error_rate (float): Fraction of chat requests answered with `error_status`
+        error_status (int): HTTP status of the injected errors
+    """
+    stats = {"requests": 0, "errors": 0, "completed": 0, "aborted": 0}
+
+    async def token(request: Request) -> Response:
+        body = {"access_token": "benchmark", "token_type": "Bearer", "expires_in": 3600}
+        return Response(json.dumps(body), media_type="application/json")
+
+    def completion(model: str, words, usage: dict, stream: bool, index: int = 0, final: bool = False) -> dict:
+        body = {"id": "chat-benchmark", "model_id": model, "model": model, "created": int(time.time())}
+        if stream:
+            delta = {"role": "assistant", "content": words[index] + " "} if not final else {}
+            body["choices"] = [{"index": 0, "delta": delta, "finish_reason": "stop" if final else None}]
+        else:
+            body["choices"] = [{"index": 0, "message": {"role": "assistant", "content": " ".join(words)},
+                                "finish_reason": "stop"}]
+        if final or not stream:
+            body["usage"] = usage
+        return body
+
+    async def chat(request: Request) -> Response:
+        stats["requests"] += 1
+        if random.random() < error_rate:
+            stats["errors"] += 1
+            return Response(json.dumps({"errors": [{"code": "unavailable", "message": "Injected error"}]}),
+                            status_code=error_status, media_type="application/json")
+        payload = await request.json()
+        model = payload.get("model_id", "fake")
+        prompt = str(payload["messages"][-1]["content"])
+        words = [f"{prompt[:20]!r}"] + [f"w{i}" for i in range(1, tokens)]
+        usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(words),
+                 "total_tokens": len(prompt) // 4 + len(words)}
+
+        if not request.url.path.endswith("_stream"):
+            await asyncio.sleep(first_token_latency + token_delay * (len(words) - 1))
+            stats["completed"] += 1
+            return Response(json.dumps(completion(model, words, usage, False)), media_type="application/json")
+
+        async def body():
+            try:
+                await asyncio.sleep(first_token_latency)
+                for index in range(len(words)):
+                    if index:
+                        await asyncio.sleep(token_delay)
+                    yield f"data: {json.dumps(completion(model, words, usage, True, index))}\n\n"
+                yield f"data: {json.dumps(completion(model, words, usage, True, final=True))}\n\n"
+                yield "data: [DONE]\n\n"
+                stats["completed"] += 1
+            except asyncio.CancelledError:
+                stats["aborted"] += 1
+                raise
+
+        return StreamingResponse(body(), media_type="text/event-stream")
+
+    async def get_stats(request: Request) -> Response:
+        return Response(json.dumps(stats), media_type="application/json")
+
+    return Starlette(routes=[
+        Route("/identity/token", token, methods=["POST"]),
+        Route("/ml/v1/text/chat", chat, methods=["POST"]),
+        Route("/ml/v1/text/chat_stream", chat, methods=["POST"]),
+        Route("/stats", get_stats, methods=["GET"]),
+    ])
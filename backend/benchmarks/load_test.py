@@ -0,0 +1,336 @@
+"""
+End-to-end load test of main.app against stand-in Supabase, watsonx and Groq servers.
+
+The backend runs unmodified in its own uvicorn process, pointed at local
+stand-ins with configurable latency and error rates. Virtual users then run
+each scenario in a loop:
+
+    booking       doctors -> availability -> new patient -> new appointment -> free times
+    consultation  consultation (appointment, patient, conversation) -> the doctor's day
+    pipeline      transcribe audio -> summarize -> SOAP note -> save the conversation
+
+Requests/sec and p50/p95/p99 latency are reported per route, along with the
+backend's peak RSS (VmHWM, Linux only). The results are also written to a
+JSON file tagged with the git commit; pass an earlier file to --compare to
+see how this run differs from it.
+
+Usage (from backend/):
+    python -m benchmarks.load_test --users 20 --duration 30 --output results.json
+    python -m benchmarks.load_test --compare results.json --db-error-rate 0.01
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+import httpx
+
+from benchmarks import fake_groq, fake_postgrest, fake_watsonx
+from benchmarks.async_crud_benchmark import FAKE_KEY
+from benchmarks.transcription_benchmark import rss_mb, wait_for_port
+
+WATSONX_PORT = 54420
+SUPABASE_PORT = 54421
+GROQ_PORT = 54422
+APP_PORT = 54423
+SCENARIOS = ("booking", "consultation", "pipeline")
+# Days the seeded appointments and new bookings fall on
+DATES = [f"2030-01-{day:02}" for day in range(7, 12)]
+TRANSCRIPT = ("Doctor: What brings you in today? Patient: I have had a dry cough and a mild fever for three "
+              "days, and I feel tired in the evenings. Doctor: Any shortness of breath? Patient: No. ")
+
+
+def seed_rows(doctors: int, patients: int) -> Dict[str, List[Dict]]:
+    """Doctors, patients and one appointment per patient spread over DATES."""
+    rows = {
+        "doctor": [{"doctor_id": f"DR{i:03}", "name": f"Doctor {i}"} for i in range(1, doctors + 1)],
+        "patient": [{"id": f"P{i:05}", "name": f"Patient {i}", "contact": f"555-{i:04}",
+                     "medical_history": "Hypertension", "previous_procedures": "None"}
+                    for i in range(1, patients + 1)],
+        "appointment": [],
+    }
+    for i, patient in enumerate(rows["patient"]):
+        rows["appointment"].append({
+            "appointment_id": f"A{i + 1:05}", "date": DATES[i % len(DATES)],
+            "time": f"{9 + i % 8}:{'30' if i % 2 else '00'}", "patient_id": patient["id"],
+            "type": "checkup", "doctor_id": rows["doctor"][i % doctors]["doctor_id"],
+        })
+    return rows
+
+
+def percentile(ordered: List[float], fraction: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class Recorder:
+    """Collects the latency and outcome of every request, keyed by route template."""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.iterations = 0
+        self.failed_iterations = 0
+
+    async def call(self, client: httpx.AsyncClient, route: str, method: str, url: str, **kwargs) -> httpx.Response:
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self.errors[route] += 1
+            self.latencies[route].append(time.perf_counter() - start)
+            raise
+        self.latencies[route].append(time.perf_counter() - start)
+        if response.status_code >= 400:
+            self.errors[route] += 1
+        response.raise_for_status()
+        return response
+
+    def summary(self, wall: float) -> Dict:
+        routes = {}
+        for route, samples in sorted(self.latencies.items()):
+            ordered = sorted(samples)
+            routes[route] = {
+                "requests": len(samples),
+                "errors": self.errors[route],
+                "requests_per_sec": round(len(samples) / wall, 2),
+                "p50_ms": round(percentile(ordered, 0.50) * 1000, 1),
+                "p95_ms": round(percentile(ordered, 0.95) * 1000, 1),
+                "p99_ms": round(percentile(ordered, 0.99) * 1000, 1),
+                "max_ms": round(ordered[-1] * 1000, 1),
+            }
+        requests = sum(route["requests"] for route in routes.values())
+        return {
+            "iterations": self.iterations,
+            "failed_iterations": self.failed_iterations,
+            "requests": requests,
+            "errors": sum(route["errors"] for route in routes.values()),
+            "wall_s": round(wall, 2),
+            "requests_per_sec": round(requests / wall, 2),
+            "routes": routes,
+        }
+
+
+async def booking(client: httpx.AsyncClient, record: Recorder, seed: Dict) -> None:
+    doctors = (await record.call(client, "GET /api/doctors/", "GET", "/api/doctors/")).json()
+    doctor_id = random.choice(doctors)["doctor_id"]
+    date = random.choice(DATES)
+    await record.call(client, "GET /api/appointments/availability", "GET", "/api/appointments/availability",
+                      params={"doctor_ids": doctor_id, "start": DATES[0], "end": DATES[-1]})
+    patient = (await record.call(client, "POST /api/patients/", "POST", "/api/patients/", json={
+        "name": "Load Test", "contact": "555-0000", "medical_history": "None", "previous_procedures": "None",
+    })).json()
+    await record.call(client, "POST /api/appointments/", "POST", "/api/appointments/", json={
+        "date": date, "time": f"{random.randint(9, 17)}:{random.choice(['00', '30'])}",
+        "patient_id": patient["id"], "type": "consultation", "doctor_id": doctor_id,
+    })
+    await record.call(client, "GET /api/appointments/doctor/{doctor_id}/times/{date}", "GET",
+                      f"/api/appointments/doctor/{doctor_id}/times/{date}")
+
+
+async def consultation(client: httpx.AsyncClient, record: Recorder, seed: Dict) -> None:
+    appointment_id = random.choice(seed["appointment"])["appointment_id"]
+    consultation = (await record.call(client, "GET /api/appointments/{appointment_id}/consultation", "GET",
+                                      f"/api/appointments/{appointment_id}/consultation")).json()
+    appointment = consultation["appointment"]
+    await record.call(client, "GET /api/appointments/doctor/{doctor_id}/day/{date}", "GET",
+                      f"/api/appointments/doctor/{appointment['doctor_id']}/day/{appointment['date']}")
+
+
+async def pipeline(client: httpx.AsyncClient, record: Recorder, seed: Dict, audio_kb: int) -> None:
+    appointment = random.choice(seed["appointment"])
+    # Fresh random audio and cache=bypass, so every iteration reaches the upstreams
+    files = {"file": ("consultation.webm", os.urandom(audio_kb * 1024), "audio/webm")}
+    await record.call(client, "POST /api/transcribe/audio", "POST", "/api/transcribe/audio",
+                      params={"cache": "bypass"}, files=files)
+    text = TRANSCRIPT * random.randint(1, 4)
+    summary = (await record.call(client, "POST /api/llm/transcription-summary", "POST",
+                                 "/api/llm/transcription-summary", params={"cache": "bypass"},
+                                 json={"text": text})).json()["summary"]
+    soap = (await record.call(client, "POST /api/llm/soap-note", "POST", "/api/llm/soap-note",
+                              params={"cache": "bypass"},
+                              json={"text": text, "doctor_notes": "", "patient_information": ""})).json()
+    await record.call(client, "POST /api/conversations/", "POST", "/api/conversations/", json={
+        "doctor_id": appointment["doctor_id"], "patient_id": appointment["patient_id"],
+        "appointment_id": appointment["appointment_id"], "text": text,
+        "summary": f"{summary}\n\n{soap['soap_note']}",
+    })
+
+
+async def run_scenario(name: str, args, seed: Dict, warmup: bool = False) -> Dict:
+    flows = {
+        "booking": booking,
+        "consultation": consultation,
+        "pipeline": lambda client, record, seed: pipeline(client, record, seed, args.audio_kb),
+    }
+    flow = flows[name]
+    record = Recorder()
+    limits = httpx.Limits(max_connections=args.users, max_keepalive_connections=args.users)
+
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{APP_PORT}", limits=limits, timeout=120) as client:
+        if warmup:
+            await flow(client, record, seed)
+            return {}
+        deadline = time.perf_counter() + args.duration
+
+        async def user():
+            while time.perf_counter() < deadline:
+                try:
+                    await flow(client, record, seed)
+                except httpx.HTTPError:
+                    record.failed_iterations += 1
+                record.iterations += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(user() for _ in range(args.users)))
+        return record.summary(time.perf_counter() - start)
+
+
+def git_commit() -> Dict:
+    try:
+        sha = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                                    capture_output=True, text=True).stdout.strip())
+        return {"commit": sha, "dirty": dirty}
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+
+
+def start_backend(args, workdir: str, seed: Dict) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        STORAGE_BACKEND=args.storage,
+        SUPABASE_URL=f"http://127.0.0.1:{SUPABASE_PORT}",
+        SUPABASE_KEY=FAKE_KEY,
+        SUPABASE_HTTP2="false",
+        SQLITE_PATH=os.path.join(workdir, "mediscribe.db"),
+        WATSONX_URL=f"http://127.0.0.1:{WATSONX_PORT}",
+        WATSONX_IAM_URL=f"http://127.0.0.1:{WATSONX_PORT}/identity/token",
+        WATSONX_API_KEY="benchmark",
+        WATSONX_PROJECT_ID="benchmark",
+        LLM_PROVIDERS="watsonx:ibm/granite-3-8b-instruct",
+        GROQ_API_KEY="benchmark",
+        GROQ_BASE_URL=f"http://127.0.0.1:{GROQ_PORT}/openai/v1",
+        # The stand-ins have no quotas; concurrency limits stay as configured
+        WATSONX_REQUESTS_PER_MINUTE="0",
+        GROQ_REQUESTS_PER_MINUTE="0",
+        JOBS_DB_PATH=os.path.join(workdir, "jobs.db"),
+        JOBS_AUDIO_DIR=os.path.join(workdir, "jobs-audio"),
+        LLM_CACHE_PATH="",
+        TRANSCRIPTION_CACHE_PATH="",
+    )
+    if args.storage == "sqlite":
+        from core.storage import SQLiteRepository
+
+        async def load():
+            repository = SQLiteRepository(env["SQLITE_PATH"], 1)
+            for table, rows in seed.items():
+                await repository.insert(table, rows)
+            await repository.close()
+
+        asyncio.run(load())
+    command = [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(APP_PORT),
+               "--log-level", "warning", "--no-access-log"]
+    return subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL if args.quiet else None)
+
+
+def compare(results: Dict, baseline_path: str) -> None:
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nCompared with {baseline_path} (commit {(baseline.get('commit') or '?')[:10]}):")
+    for name, scenario in results["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before:
+            continue
+        print(f"  {name}: {change(before['requests_per_sec'], scenario['requests_per_sec'])} req/s")
+        for route, stats in scenario["routes"].items():
+            old = before["routes"].get(route)
+            if old:
+                print(f"    {route:<58} p95 {change(old['p95_ms'], stats['p95_ms'])}  "
+                      f"p99 {change(old['p99_ms'], stats['p99_ms'])}")
+    if baseline.get("peak_rss_mb") and results.get("peak_rss_mb"):
+        print(f"  peak RSS: {change(baseline['peak_rss_mb'], results['peak_rss_mb'])} MB")
+
+
+def change(before: float, after: float) -> str:
+    delta = f"{(after - before) / before * 100:+.0f}%" if before else "n/a"
+    return f"{before:g} -> {after:g} ({delta})"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma-separated, from " + ", ".join(SCENARIOS))
+    parser.add_argument("--users", type=int, default=10, help="concurrent virtual users per scenario")
+    parser.add_argument("--duration", type=float, default=20, help="seconds each scenario runs")
+    parser.add_argument("--storage", choices=["supabase", "sqlite"], default="supabase")
+    parser.add_argument("--doctors", type=int, default=10)
+    parser.add_argument("--patients", type=int, default=500)
+    parser.add_argument("--db-latency", type=float, default=0.02, help="stand-in Supabase latency in seconds")
+    parser.add_argument("--db-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-first-token", type=float, default=0.3, help="stand-in watsonx time to first token")
+    parser.add_argument("--llm-token-delay", type=float, default=0.01)
+    parser.add_argument("--llm-tokens", type=int, default=60)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--groq-latency", type=float, default=0.5, help="stand-in Groq latency in seconds")
+    parser.add_argument("--groq-error-rate", type=float, default=0.0)
+    parser.add_argument("--audio-kb", type=int, default=256, help="size of each uploaded recording")
+    parser.add_argument("--output", default="load_test_results.json", help="where to write the JSON results")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("--quiet", action="store_true", help="hide the backend's own output")
+    args = parser.parse_args()
+    names = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"Unknown scenarios {unknown}")
+
+    seed = seed_rows(args.doctors, args.patients)
+    fake_postgrest.serve_in_thread(
+        fake_postgrest.create_app(args.db_latency, json.loads(json.dumps(seed)), args.db_error_rate), SUPABASE_PORT)
+    fake_postgrest.serve_in_thread(
+        fake_watsonx.create_app(args.llm_first_token, args.llm_token_delay, args.llm_tokens, args.llm_error_rate),
+        WATSONX_PORT)
+    fake_postgrest.serve_in_thread(fake_groq.create_app(args.groq_latency, args.groq_error_rate), GROQ_PORT)
+
+    results = {**git_commit(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+               "config": vars(args), "scenarios": {}}
+    with tempfile.TemporaryDirectory() as workdir:
+        server = start_backend(args, workdir, seed)
+        try:
+            wait_for_port(APP_PORT)
+            for name in names:
+                asyncio.run(run_scenario(name, args, seed, warmup=True))
+            results["startup_rss_mb"] = rss_mb(server.pid, "VmRSS")
+            for name in names:
+                print(f"Running {name} with {args.users} users for {args.duration:g}s...")
+                results["scenarios"][name] = asyncio.run(run_scenario(name, args, seed))
+                # VmHWM never goes down, so this is the peak up to the end of the scenario
+                results["scenarios"][name]["peak_rss_mb"] = rss_mb(server.pid, "VmHWM")
+            results["peak_rss_mb"] = rss_mb(server.pid, "VmHWM")
+        finally:
+            server.terminate()
+            server.wait()
+
+    print(f"\ncommit {(results['commit'] or '?')[:10]}{' (dirty)' if results['dirty'] else ''}  "
+          f"users={args.users} duration={args.duration:g}s storage={args.storage}")
+    for name, scenario in results["scenarios"].items():
+        print(f"\n{name}: {scenario['requests_per_sec']:.1f} req/s, {scenario['iterations']} iterations "
+              f"({scenario['failed_iterations']} failed), peak RSS {scenario['peak_rss_mb']:.1f} MB")
+        for route, stats in scenario["routes"].items():
+            print(f"  {route:<58} {stats['requests_per_sec']:7.1f} req/s  p50 {stats['p50_ms']:7.1f}  "
+                  f"p95 {stats['p95_ms']:7.1f}  p99 {stats['p99_ms']:7.1f} ms  errors {stats['errors']}")
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
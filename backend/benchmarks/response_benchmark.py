@@ -0,0 +1,102 @@
+"""
+Response benchmark: FastAPI's default JSON path versus core.responses.
+
+For payloads shaped like the API's busiest answers, measures:
+- serialization time per response. "before" is what a route with
+  response_model used to cost: validation, jsonable_encoder, then
+  JSONResponse.render. "after" is json_response: orjson plus the ETag hash.
+- bytes on the wire: uncompressed, gzip and brotli at the configured levels,
+  and the time each compression takes. A 304 revalidation sends no body at all.
+
+Usage (from backend/):
+    python -m benchmarks.response_benchmark --repeat 200
+"""
+import argparse
+import asyncio
+import hashlib
+import random
+import time
+from typing import Any, Callable, Dict, List
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+from core.responses import compress, dumps
+
+WORDS = ("patient", "reports", "pain", "since", "two", "weeks", "no", "fever", "blood", "pressure", "normal",
+         "prescribed", "follow", "up", "in", "allergy", "history", "of", "asthma", "knee", "left", "mild")
+
+
+def _text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def payloads() -> Dict[str, Any]:
+    rng = random.Random(7)
+    times = [f"{minutes // 60}:{minutes % 60:02d}" for minutes in range(9 * 60, 17 * 60, 30)]
+    patients = [{"id": f"p-{i:05d}", "name": f"Patient {i}", "contact": f"555-{i:04d}"} for i in range(16)]
+    return {
+        "doctors (20)": (List[dict], [{"doctor_id": f"DR{i:03}", "name": f"Doctor {i}", "work_start": "9:00",
+                                       "work_end": "17:00", "slot_minutes": 30} for i in range(20)]),
+        "availability (10 doctors x 14 days)": (dict, {
+            f"DR{d:03}": {f"2030-01-{day:02d}": [t for t in times if rng.random() > 0.3] for day in range(1, 15)}
+            for d in range(10)}),
+        "doctor day (16 appointments)": (dict, {"doctor_id": "DR001", "date": "2030-01-07", "free_times": times[:4],
+                                                "appointments": [{"appointment_id": f"a-{i:05d}", "date": "2030-01-07",
+                                                                  "time": times[i], "patient_id": patients[i]["id"],
+                                                                  "type": "checkup", "doctor_id": "DR001",
+                                                                  "patient": patients[i]} for i in range(16)]}),
+        "conversations page (100)": (List[dict], [{"conversation_id": f"c-{i:05d}", "doctor_id": "DR001",
+                                                   "patient_id": f"p-{i % 16:05d}", "appointment_id": f"a-{i:05d}",
+                                                   "text": _text(rng, 500), "summary": _text(rng, 120)}
+                                                  for i in range(100)]),
+    }
+
+
+def best_time(work: Callable[[], Any], repeat: int) -> float:
+    """Fastest of five rounds, in microseconds per call."""
+    rounds = []
+    for _ in range(5):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            work()
+        rounds.append((time.perf_counter() - started) / repeat * 1e6)
+    return min(rounds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=200, help="calls per timing round")
+    args = parser.parse_args()
+    loop = asyncio.new_event_loop()
+
+    for name, (response_type, content) in payloads().items():
+        field = create_model_field(name="Response", type_=response_type, mode="serialization")
+
+        def before():
+            encoded = loop.run_until_complete(serialize_response(field=field, response_content=content))
+            return JSONResponse(encoded).body
+
+        def after():
+            body = dumps(content)
+            hashlib.blake2b(body, digest_size=16).hexdigest()
+            return body
+
+        body = after()
+        assert len(before()) == len(body), "both paths should produce the same JSON"
+        before_us, after_us = best_time(before, args.repeat), best_time(after, args.repeat)
+        print(f"\n{name}")
+        print(f"  serialize   before {before_us:9.1f} us   after {after_us:8.1f} us   ({before_us / after_us:.1f}x faster)")
+        print(f"  identity    {len(body):9,d} bytes")
+        for encoding in ("gzip", "br"):
+            compressed = compress(body, encoding)
+            took = best_time(lambda: compress(body, encoding), max(1, args.repeat // 10))
+            print(f"  {encoding:<8}    {len(compressed):9,d} bytes ({len(compressed) / len(body):6.1%})"
+                  f"   in {took:8.1f} us")
+        print("  304         0 bytes of body when the ETag still matches")
+    loop.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Cold-start profile: how long importing the backend takes, and where the time goes.
+
+Imports a module (main by default) in fresh interpreters with `-X importtime`
+and reports the fastest run's total, then:
+- our own modules (app, core, main), by cumulative import time, which shows
+  which of them pulls in what
+- third-party packages, by the time spent importing their modules
+
+With --budget-ms the command fails when the import takes longer, so a CI job
+can keep cold start within budget. Heavy stacks (beeai, litellm, the search
+agent, tiktoken) should not appear here; they load on first use or in the
+background warm-up.
+
+Usage (from backend/):
+    python -m benchmarks.startup_profile --runs 3 --top 15 --budget-ms 1500
+    python -m benchmarks.startup_profile --module core.llm
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List
+
+LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+FIRST_PARTY = ("app", "core", "main")
+
+
+def profile(module: str) -> List[Dict]:
+    """Import `module` in a fresh interpreter and return one entry per module imported."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, env=dict(os.environ, PYTHONDONTWRITEBYTECODE="1"),
+    )
+    if result.returncode != 0:
+        raise SystemExit(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+    entries = []
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            entries.append({"module": name, "self_ms": int(self_us) / 1000,
+                            "cumulative_ms": int(cumulative_us) / 1000, "depth": len(indent) // 2})
+    return entries
+
+
+def summarize(entries: List[Dict], module: str, top: int) -> Dict:
+    total = next((e["cumulative_ms"] for e in entries if e["module"] == module and e["depth"] == 0),
+                 sum(e["self_ms"] for e in entries))
+    packages = defaultdict(float)
+    for entry in entries:
+        package = entry["module"].split(".")[0]
+        if package not in FIRST_PARTY:
+            packages[package] += entry["self_ms"]
+    ours = [e for e in entries if e["module"].split(".")[0] in FIRST_PARTY]
+    return {
+        "module": module,
+        "total_ms": round(total, 1),
+        "modules_imported": len(entries),
+        "first_party": {e["module"]: round(e["cumulative_ms"], 1)
+                        for e in sorted(ours, key=lambda e: -e["cumulative_ms"])[:top]},
+        "packages": {name: round(ms, 1) for name, ms in sorted(packages.items(), key=lambda p: -p[1])[:top]},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="main", help="module to import")
+    parser.add_argument("--runs", type=int, default=3, help="fresh imports to run; the fastest is reported")
+    parser.add_argument("--top", type=int, default=15, help="rows to show per table")
+    parser.add_argument("--budget-ms", type=float, help="fail if the import takes longer than this")
+    parser.add_argument("--output", help="also write the report as JSON")
+    args = parser.parse_args()
+
+    reports = [summarize(profile(args.module), args.module, args.top) for _ in range(max(1, args.runs))]
+    report = min(reports, key=lambda r: r["total_ms"])
+    report["runs_ms"] = [r["total_ms"] for r in reports]
+
+    print(f"import {args.module}: {report['total_ms']:.0f} ms "
+          f"({report['modules_imported']} modules; runs {', '.join(f'{ms:.0f}' for ms in report['runs_ms'])} ms)")
+    print("\nOur modules, cumulative:")
+    for name, ms in report["first_party"].items():
+        print(f"  {ms:8.1f} ms  {name}")
+    print("\nThird-party packages, own import time:")
+    for name, ms in report["packages"].items():
+        print(f"  {ms:8.1f} ms  {name}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.budget_ms is not None:
+        if report["total_ms"] > args.budget_ms:
+            raise SystemExit(f"\nOver budget: {report['total_ms']:.0f} ms > {args.budget_ms:.0f} ms")
+        print(f"\nWithin budget ({args.budget_ms:.0f} ms)")
+
+
+if __name__ == "__main__":
+    main()
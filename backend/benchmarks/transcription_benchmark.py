@@ -0,0 +1,176 @@
+"""
+Transcription upload benchmark: temp-file path versus streamed forwarding.
+
+The "legacy" variant reproduces the original handler: the upload is copied to
+a NamedTemporaryFile, read back into memory and sent with a new synchronous
+Groq client inside the async route. The "streaming" variant is the current
+/api/transcribe/audio endpoint. Each variant runs in its own uvicorn process
+against a stand-in transcription server, and the peak RSS of that process
+(VmHWM, Linux only) is reported alongside request latency. Both variants load
+the same modules, and the growth over the RSS measured right after startup
+is shown separately.
+
+Usage (from backend/):
+    python -m benchmarks.transcription_benchmark --size-mb 20 --requests 8 --concurrency 4
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+from fastapi import FastAPI, File, HTTPException, UploadFile
+
+from benchmarks.fake_groq import create_app
+from benchmarks.fake_postgrest import serve_in_thread
+
+FAKE_PORT = 54410
+APP_PORT = 54411
+UPLOAD_CHUNK = 256 * 1024
+
+
+def build_app(variant: str) -> FastAPI:
+    from app.routers import transcribe
+
+    if variant == "streaming":
+        app = FastAPI()
+        app.include_router(transcribe.router, prefix="/api/transcribe")
+        return app
+
+    from groq import Groq
+
+    app = FastAPI()
+
+    @app.post("/api/transcribe/audio")
+    async def transcribe_audio_file(file: UploadFile = File(...)):
+        try:
+            suffix = os.path.splitext(file.filename)[1] or ".wav"
+            with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp_file:
+                while content := await file.read(1024 * 1024):
+                    temp_file.write(content)
+                temp_file_path = temp_file.name
+            try:
+                with open(temp_file_path, "rb") as audio:
+                    transcription = Groq(base_url=f"http://127.0.0.1:{FAKE_PORT}").audio.transcriptions.create(
+                        file=(os.path.basename(temp_file_path), audio.read()),
+                        model="whisper-large-v3",
+                        response_format="verbose_json",
+                    )
+                return {"transcription": transcription.text}
+            finally:
+                os.unlink(temp_file_path)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+    return app
+
+
+def rss_mb(pid: int, field: str) -> float:
+    """Read VmRSS (current) or VmHWM (peak) for a process from /proc."""
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith(f"{field}:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+
+async def upload_body(path: str, boundary: str):
+    yield (f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="consultation.webm"\r\n'
+           f"Content-Type: audio/webm\r\n\r\n").encode()
+    with open(path, "rb") as audio:
+        while chunk := audio.read(UPLOAD_CHUNK):
+            yield chunk
+    yield f"\r\n--{boundary}--\r\n".encode()
+
+
+async def drive(url: str, path: str, total: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    boundary = "benchmarkboundary"
+
+    async with httpx.AsyncClient(timeout=300) as client:
+        async def one():
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post(
+                    url,
+                    content=upload_body(path, boundary),
+                    headers={"Content-Type": f"multipart/form-data; boundary={boundary}"},
+                )
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(total)))
+        return latencies, time.perf_counter() - start
+
+
+def wait_for_port(port: int, timeout: float = 120) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/docs", timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Server on port {port} did not start")
+
+
+def run_variant(variant: str, path: str, args) -> dict:
+    # Lift the outbound limits so both variants put the same load on the stand-in server
+    env = dict(os.environ, GROQ_API_KEY="benchmark", GROQ_BASE_URL=f"http://127.0.0.1:{FAKE_PORT}/openai/v1",
+               GROQ_REQUESTS_PER_MINUTE="0", GROQ_MAX_CONCURRENCY=str(args.concurrency))
+    server = subprocess.Popen([sys.executable, "-m", "benchmarks.transcription_benchmark", "--serve", variant], env=env)
+    try:
+        wait_for_port(APP_PORT)
+        startup_rss = rss_mb(server.pid, "VmRSS")
+        latencies, elapsed = asyncio.run(
+            drive(f"http://127.0.0.1:{APP_PORT}/api/transcribe/audio", path, args.requests, args.concurrency)
+        )
+        peak_rss = rss_mb(server.pid, "VmHWM")
+        return {
+            "p50_s": statistics.median(latencies),
+            "max_s": max(latencies),
+            "wall_s": elapsed,
+            "peak_rss_mb": peak_rss,
+            "rss_growth_mb": peak_rss - startup_rss,
+        }
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=float, default=20, help="size of each uploaded file")
+    parser.add_argument("--requests", type=int, default=8)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.5, help="stand-in transcription latency in seconds")
+    parser.add_argument("--serve", choices=["legacy", "streaming"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        import uvicorn
+
+        uvicorn.run(build_app(args.serve), host="127.0.0.1", port=APP_PORT, log_level="warning")
+        return
+
+    serve_in_thread(create_app(latency=args.latency), FAKE_PORT)
+    with tempfile.NamedTemporaryFile(suffix=".webm") as audio:
+        audio.write(os.urandom(int(args.size_mb * 1024 * 1024)))
+        audio.flush()
+        results = {variant: run_variant(variant, audio.name, args) for variant in ("legacy", "streaming")}
+
+    print(f"size={args.size_mb}MB requests={args.requests} concurrency={args.concurrency} latency={args.latency}s")
+    for variant, result in results.items():
+        print(f"  {variant:<10} p50 {result['p50_s']:6.2f}s  max {result['max_s']:6.2f}s  "
+              f"wall {result['wall_s']:6.2f}s  peak RSS {result['peak_rss_mb']:7.1f} MB "
+              f"(+{result['rss_growth_mb']:.1f} MB over startup)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+import asyncio
+import os
+import re
+import time
+from typing import AsyncIterator, Dict, List, Optional
+
+from core import llm
+from core.llm_cache import CACHE_USE
+from core.tokens import count_tokens
+
+# Documents that can be produced from one consultation
+SOAP_NOTE = "soap_note"
+SUMMARY = "summary"
+REFERRAL_LETTER = "referral_letter"
+ARTIFACT_NAMES = (SOAP_NOTE, SUMMARY, REFERRAL_LETTER)
+
+COMBINED = "combined"  # one generation that shares the consultation context
+PARALLEL = "parallel"  # one generation per artifact, run concurrently
+
+# Upper bound on concurrent upstream calls in parallel mode
+ARTIFACT_CONCURRENCY = int(os.getenv("ARTIFACT_CONCURRENCY", "3"))
+
+ARTIFACT_INSTRUCTIONS = {
+    SOAP_NOTE: """A SOAP note with these sections:
+    Subjective (S): Patient's symptoms, complaints, and relevant history
+    Objective (O): Observable findings, vital signs, examination results
+    Assessment (A): Medical diagnosis or clinical impression
+    Plan (P): Treatment plan, medications, follow-up""",
+    SUMMARY: """A clear and concise summary of the conversation capturing the main symptoms or health
+    concerns, key findings, decisions or next steps agreed upon, and any critical follow-up items.""",
+    REFERRAL_LETTER: """A formal referral letter to another doctor: today's date, "Dear Dr. [Receiving Doctor]",
+    "RE: [Patient Name] - Medical Referral", the reason for referral, patient history and current
+    presentation, current medications, investigations and results, the specific questions for the
+    receiving doctor, and a closing signed "Dr. [Referring Doctor's Name]".""",
+}
+
+_HEADER = re.compile(r"^###\s*(" + "|".join(name.upper() for name in ARTIFACT_NAMES) + r")\s*$", re.MULTILINE)
+
+
+def combined_prompt(artifacts: List[str], conversation_text: str, doctor_notes: str, patient_information: str) -> str:
+    """Build one prompt that carries the consultation once and asks for every artifact."""
+    sections = "\n\n    ".join(f"### {name.upper()}\n    {ARTIFACT_INSTRUCTIONS[name]}" for name in artifacts)
+    return f"""You are preparing clinical documents from a single medical consultation. Add no misinformation. If any information is not available, leave it out.
+
+    Consultation transcript:
+    {conversation_text}
+
+    Doctor's Notes: {doctor_notes}
+    Patient Information: {patient_information}
+
+    Write each of the following documents in this order. Start every document with its heading line
+    exactly as shown (for example "### {artifacts[0].upper()}") and write nothing before the first heading.
+
+    {sections}"""
+
+
+def _separate_prompt(name: str, conversation_text: str, doctor_notes: str, patient_information: str) -> str:
+    if name == SOAP_NOTE:
+        return llm.soap_note_prompt(conversation_text, doctor_notes, patient_information)
+    if name == REFERRAL_LETTER:
+        return llm.referral_letter_prompt(conversation_text, doctor_notes, patient_information)
+    return llm.transcription_summary_prompt(conversation_text)
+
+
+async def _generate_one(name: str, conversation_text: str, doctor_notes: str, patient_information: str,
+                        cache: str) -> str:
+    if name == SOAP_NOTE:
+        return await llm.get_medical_soap_note(conversation_text, doctor_notes, patient_information, cache)
+    if name == REFERRAL_LETTER:
+        return await llm.get_medical_referral_letter(conversation_text, doctor_notes, patient_information, cache)
+    return await llm.get_transcription_summary(conversation_text, cache)
+
+
+async def _fan_out(names: List[str], conversation_text: str, doctor_notes: str, patient_information: str,
+                   cache: str) -> AsyncIterator[Dict]:
+    semaphore = asyncio.Semaphore(ARTIFACT_CONCURRENCY)
+
+    async def run(name: str):
+        async with semaphore:
+            return name, await _generate_one(name, conversation_text, doctor_notes, patient_information, cache)
+
+    tasks = [asyncio.create_task(run(name)) for name in names]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            name, text = await finished
+            yield {"event": "artifact", "name": name, "text": text}
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def generate_artifacts(artifacts: List[str], conversation_text: str, doctor_notes: str,
+                             patient_information: str, mode: str = COMBINED,
+                             cache: str = CACHE_USE) -> AsyncIterator[Dict]:
+    """
+    Produce several documents from one consultation, yielding each as soon as it is complete.
+
+    In combined mode the transcript and patient context are sent once and the
+    streamed output is split on per-document headings; any document the model
+    skipped is generated separately. Parallel mode runs the regular per-document
+    generations with bounded concurrency.
+
+    Yields:
+        dict: {"event": "artifact", "name", "text"} per document, then
+              {"event": "done", ...} with prompt token counts and tokens saved
+    """
+    names = list(dict.fromkeys(artifacts))
+    start = time.perf_counter()
+    separate_tokens = sum(
+        count_tokens(_separate_prompt(name, conversation_text, doctor_notes, patient_information)) for name in names
+    )
+    sent_tokens = 0
+    missing = names
+
+    if mode == COMBINED:
+        prompt = await llm.fit_prompt(
+            lambda text: combined_prompt(names, text, doctor_notes, patient_information), conversation_text, cache
+        )
+        sent_tokens += count_tokens(prompt)
+        inputs = {"artifacts": names, "text": conversation_text, "doctor_notes": doctor_notes,
+                  "patient_information": patient_information}
+        tokens = llm.cached_stream_generate("consultation_artifacts", inputs, prompt, cache)
+        emitted = set()
+        buffer = ""
+        # buffer[:scanned] is complete lines already searched for headings, so each line is scanned once
+        scanned = 0
+        # The latest heading seen; its section runs until the next heading or the end of the output
+        last = None
+
+        def finish(heading, end: int) -> Optional[Dict]:
+            name = heading.group(1).lower()
+            if name not in names or name in emitted:
+                return None
+            emitted.add(name)
+            return {"event": "artifact", "name": name, "text": buffer[heading.end():end].strip()}
+
+        try:
+            async for token in tokens:
+                buffer += token
+                end = buffer.rfind("\n", scanned)
+                if end < 0:
+                    continue
+                finished = []
+                for heading in _HEADER.finditer(buffer, scanned, end):
+                    # Every section followed by another heading is finished
+                    if last is not None:
+                        finished.append(finish(last, heading.start()))
+                    last = heading
+                scanned = end + 1
+                for event in finished:
+                    if event:
+                        yield event
+        finally:
+            await tokens.aclose()
+        for heading in _HEADER.finditer(buffer, scanned):
+            if last is not None:
+                event = finish(last, heading.start())
+                if event:
+                    yield event
+            last = heading
+        if last is not None:
+            event = finish(last, len(buffer))
+            if event:
+                yield event
+        missing = [name for name in names if name not in emitted]
+        if missing:
+            print(f"Combined generation skipped {missing}; generating them separately")
+
+    sent_tokens += sum(
+        count_tokens(_separate_prompt(name, conversation_text, doctor_notes, patient_information)) for name in missing
+    )
+    if missing:
+        async for event in _fan_out(missing, conversation_text, doctor_notes, patient_information, cache):
+            yield event
+
+    yield {
+        "event": "done",
+        "mode": mode,
+        "prompt_tokens": sent_tokens,
+        "separate_prompt_tokens": separate_tokens,
+        "tokens_saved": separate_tokens - sent_tokens,
+        "total_ms": round((time.perf_counter() - start) * 1000, 1),
+    }
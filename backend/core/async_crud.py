@@ -0,0 +1,356 @@
+from typing import List, Dict, Optional
+import asyncio
+import uuid
+from core.cache import appointment_cache, doctor_day_cache, doctors_cache, invalidate_appointment, patient_cache
+from core.availability import to_minutes, date_range, get_schedule, slot_index
+from core.storage import TABLES, get_repository, is_missing_column
+
+# Non-blocking mirror of core.crud for use from async routes. Every query goes
+# through the storage backend selected by STORAGE_BACKEND (core.storage), so a
+# slow round-trip only suspends the awaiting request instead of the whole event loop.
+
+# 1. Doctor Operations (Read Only - get_db)
+async def get_doctors(columns: str = "*") -> List[Dict]:
+    """Retrieve all doctors from the database, optionally only some columns."""
+    found, doctors = doctors_cache.get("all")
+    if not found:
+        doctors = await get_repository().select("doctor")
+        doctors_cache.set("all", doctors)
+    columns = parse_fields("doctor", columns)
+    return [project(doctor, columns) for doctor in doctors]
+
+# 2. Appointment CRUD Operations
+async def create_appointment(date: str, time: str, patient_id: str, type: str, doctor_id: str) -> Dict:
+    """Create a new appointment."""
+    appointment_id = str(uuid.uuid4())
+    rows = await get_repository().insert("appointment", [{
+        "appointment_id": appointment_id,
+        "date": date,
+        "time": time,
+        "patient_id": patient_id,
+        "type": type,
+        "doctor_id": doctor_id
+    }])
+    appointment = rows[0]
+    invalidate_appointment(appointment_id, doctor_id, date)
+    slot_index.record(appointment)
+    return appointment
+
+async def read_appointment(appointment_id: str) -> Optional[Dict]:
+    """Read a specific appointment by ID."""
+    found, appointment = appointment_cache.get(appointment_id)
+    if found:
+        return appointment
+    data = await get_repository().select("appointment", [("appointment_id", "eq", appointment_id)])
+    if not data:
+        return None
+    appointment_cache.set(appointment_id, data[0])
+    return data[0]
+
+async def update_appointment(appointment_id: str, date: Optional[str] = None, time: Optional[str] = None,
+                             patient_id: Optional[str] = None, type: Optional[str] = None,
+                             doctor_id: Optional[str] = None) -> Dict:
+    """Update an existing appointment."""
+    updates = {k: v for k, v in {
+        "date": date,
+        "time": time,
+        "patient_id": patient_id,
+        "type": type,
+        "doctor_id": doctor_id
+    }.items() if v is not None}
+    updated = await get_repository().update("appointment", [("appointment_id", "eq", appointment_id)], updates)
+    appointment = updated[0]
+    invalidate_appointment(appointment_id)
+    slot_index.record(appointment)
+    return appointment
+
+async def delete_appointment(appointment_id: str) -> Dict:
+    """Delete an appointment by ID."""
+    deleted = await get_repository().delete("appointment", [("appointment_id", "eq", appointment_id)])
+    invalidate_appointment(appointment_id)
+    slot_index.remove(appointment_id)
+    return deleted
+
+# 3. Conversation CRUD Operations
+async def create_conversation(doctor_id: str, patient_id: str, appointment_id: str, text: str, summary: str) -> Dict:
+    """Create a new conversation."""
+    conversation_id = str(uuid.uuid4())
+    rows = await get_repository().insert("conversation", [{
+        "conversation_id": conversation_id,
+        "doctor_id": doctor_id,
+        "patient_id": patient_id,
+        "appointment_id": appointment_id,
+        "text": text,
+        "summary": summary
+    }])
+    return rows[0]
+
+async def read_conversation(conversation_id: str) -> Optional[Dict]:
+    """Read a specific conversation by ID."""
+    data = await get_repository().select("conversation", [("conversation_id", "eq", conversation_id)])
+    return data[0] if data else None
+
+async def update_conversation(conversation_id: str, doctor_id: Optional[str] = None, patient_id: Optional[str] = None,
+                              appointment_id: Optional[str] = None, text: Optional[str] = None,
+                              summary: Optional[str] = None) -> Dict:
+    """Update an existing conversation."""
+    updates = {k: v for k, v in {
+        "doctor_id": doctor_id,
+        "patient_id": patient_id,
+        "appointment_id": appointment_id,
+        "text": text,
+        "summary": summary
+    }.items() if v is not None}
+    updated = await get_repository().update("conversation", [("conversation_id", "eq", conversation_id)], updates)
+    return updated[0]
+
+async def delete_conversation(conversation_id: str) -> Dict:
+    """Delete a conversation by ID."""
+    return await get_repository().delete("conversation", [("conversation_id", "eq", conversation_id)])
+
+# 4. Patient CRUD Operations
+async def create_patient(name: str, contact: str, medical_history: str, previous_procedures: str) -> Dict:
+    """Create a new patient."""
+    patient_id = str(uuid.uuid4())
+    rows = await get_repository().insert("patient", [{
+        "id": patient_id,
+        "name": name,
+        "contact": contact,
+        "medical_history": medical_history,
+        "previous_procedures": previous_procedures
+    }])
+    return rows[0]
+
+async def read_patient(patient_id: str) -> Optional[Dict]:
+    """Read a specific patient by ID."""
+    found, patient = patient_cache.get(patient_id)
+    if found:
+        return patient
+    data = await get_repository().select("patient", [("id", "eq", patient_id)])
+    if not data:
+        return None
+    patient_cache.set(patient_id, data[0])
+    return data[0]
+
+async def update_patient(patient_id: str, name: Optional[str] = None, contact: Optional[str] = None,
+                         medical_history: Optional[str] = None, previous_procedures: Optional[str] = None) -> Dict:
+    """Update an existing patient."""
+    updates = {k: v for k, v in {
+        "name": name,
+        "contact": contact,
+        "medical_history": medical_history,
+        "previous_procedures": previous_procedures
+    }.items() if v is not None}
+    updated = await get_repository().update("patient", [("id", "eq", patient_id)], updates)
+    patient = updated[0]
+    patient_cache.invalidate(patient_id)
+    return patient
+
+async def delete_patient(patient_id: str) -> Dict:
+    """Delete a patient by ID."""
+    deleted = await get_repository().delete("patient", [("id", "eq", patient_id)])
+    patient_cache.invalidate(patient_id)
+    return deleted
+
+async def get_doctor_appointments_by_date(doctor_id: str, date: str, columns: str = "*") -> List[Dict]:
+    """
+    Get all appointments for a specific doctor on a specific date.
+    Returns full appointment details unless `columns` picks some.
+
+    Args:
+        doctor_id (str): The ID of the doctor
+        date (str): The date in format 'YYYY-MM-DD'
+        columns (str): "*" or comma-separated appointment columns to return
+    """
+    found, appointments = doctor_day_cache.get((doctor_id, date))
+    if not found:
+        appointments = await get_repository().select(
+            "appointment", [("doctor_id", "eq", doctor_id), ("date", "eq", date)]
+        )
+        doctor_day_cache.set((doctor_id, date), appointments)
+    columns = parse_fields("appointment", columns)
+    return [project(appointment, columns) for appointment in appointments]
+
+async def get_availability(doctor_ids: List[str], start_date: str, end_date: str) -> Dict[str, Dict[str, List[str]]]:
+    """
+    Get free appointment slots for several doctors over a date range.
+
+    Doctor-days missing from the slot index are loaded with a single query
+    covering every requested doctor and date; the rest are answered from the
+    in-memory bitmaps.
+
+    Args:
+        doctor_ids (List[str]): The IDs of the doctors
+        start_date (str): First date in format 'YYYY-MM-DD'
+        end_date (str): Last date (inclusive) in format 'YYYY-MM-DD'
+
+    Returns:
+        dict: {doctor_id: {date: [free times in slot order]}}
+    """
+    dates = date_range(start_date, end_date)
+    missing = slot_index.missing(doctor_ids, dates)
+    if missing:
+        doctors = {doctor["doctor_id"]: doctor for doctor in await get_doctors()}
+        missing_doctors = sorted({doctor_id for doctor_id, _ in missing})
+        missing_dates = date_range(min(day for _, day in missing), max(day for _, day in missing))
+        booked = await get_repository().select(
+            "appointment",
+            [("doctor_id", "in", missing_doctors), ("date", "gte", missing_dates[0]), ("date", "lte", missing_dates[-1])],
+            columns="appointment_id,doctor_id,date,time",
+        )
+        schedules = {doctor_id: get_schedule(doctor_id, doctors.get(doctor_id)) for doctor_id in missing_doctors}
+        slot_index.load(missing_doctors, missing_dates, booked, schedules)
+
+    return {doctor_id: {day: slot_index.free_slots(doctor_id, day) for day in dates} for doctor_id in doctor_ids}
+
+async def get_doctor_appointment_times(doctor_id: str, date: str) -> List[str]:
+    """
+    Get all free appointment times for a specific doctor on a specific date.
+
+    Args:
+        doctor_id (str): The ID of the doctor
+        date (str): The date in format 'YYYY-MM-DD'
+    """
+    availability = await get_availability([doctor_id], date, date)
+    return availability[doctor_id][date]
+
+
+# 5. Composite reads, for pages that would otherwise fetch related rows one by one
+def parse_fields(table: str, columns: str) -> str:
+    """Validate a comma-separated column list ("*" for all) against `table`."""
+    if columns.strip() == "*":
+        return "*"
+    names = [column.strip() for column in columns.split(",") if column.strip()]
+    unknown = [name for name in names if name not in TABLES[table]]
+    if not names:
+        raise ValueError(f"No {table} fields given")
+    if unknown:
+        raise ValueError(f"Unknown {table} fields: {', '.join(unknown)}")
+    return ",".join(dict.fromkeys(names))
+
+def project(row: Dict, columns: str) -> Dict:
+    """Keep only `columns` of a row, as returned by parse_fields."""
+    if columns == "*":
+        return row
+    return {name: row.get(name) for name in columns.split(",")}
+
+async def get_patients(patient_ids: List[str], columns: str = "*") -> Dict[str, Dict]:
+    """
+    Read several patients at once.
+
+    Cached patients are served from memory; the rest are fetched with a single
+    query. Only full rows are cached, so a projected read never hides columns
+    from a later one.
+
+    Args:
+        patient_ids (List[str]): The IDs of the patients
+        columns (str): "*" or comma-separated patient columns to return
+
+    Returns:
+        dict: {patient_id: patient} for the patients that exist
+    """
+    columns = parse_fields("patient", columns)
+    patients, missing = {}, []
+    for patient_id in dict.fromkeys(patient_ids):
+        found, patient = patient_cache.get(patient_id)
+        if found:
+            patients[patient_id] = project(patient, columns)
+        else:
+            missing.append(patient_id)
+    if missing:
+        # The id is needed to match rows back even when it was not asked for
+        selected = columns if columns == "*" or "id" in columns.split(",") else f"id,{columns}"
+        for patient in await get_repository().select("patient", [("id", "in", missing)], columns=selected):
+            if columns == "*":
+                patient_cache.set(patient["id"], patient)
+            patients[patient["id"]] = project(patient, columns)
+    return patients
+
+# Cleared once the storage backend reports conversation.created_at missing, so later reads skip the failing query
+_conversations_dated = True
+
+async def get_latest_conversation(appointment_id: str, columns: str = "*") -> Optional[Dict]:
+    """
+    Read the most recently created conversation of an appointment.
+
+    On a Supabase project whose conversation table has no created_at column
+    yet, this falls back to the last conversation returned.
+
+    Args:
+        appointment_id (str): The ID of the appointment
+        columns (str): "*" or comma-separated conversation columns to return
+    """
+    global _conversations_dated
+    columns = parse_fields("conversation", columns)
+    filters = [("appointment_id", "eq", appointment_id)]
+    if _conversations_dated:
+        try:
+            conversations = await get_repository().select(
+                "conversation", filters, columns=columns, order="created_at", descending=True, limit=1
+            )
+            return conversations[0] if conversations else None
+        except Exception as e:
+            if not is_missing_column(e):
+                raise
+            print("conversation.created_at is missing; latest conversations follow row order until it is added")
+            _conversations_dated = False
+    conversations = await get_repository().select("conversation", filters, columns=columns)
+    return conversations[-1] if conversations else None
+
+async def get_consultation(appointment_id: str, patient_columns: str = "*",
+                           conversation_columns: str = "*") -> Optional[Dict]:
+    """
+    Read an appointment with its patient and latest conversation.
+
+    The appointment and conversation are read concurrently, then the patient.
+
+    Args:
+        appointment_id (str): The ID of the appointment
+        patient_columns (str): "*" or comma-separated patient columns to return
+        conversation_columns (str): "*" or comma-separated conversation columns to return
+
+    Returns:
+        dict: {"appointment", "patient", "conversation"}, or None if the appointment does not exist
+    """
+    patient_columns = parse_fields("patient", patient_columns)
+    appointment, conversation = await asyncio.gather(
+        read_appointment(appointment_id), get_latest_conversation(appointment_id, conversation_columns)
+    )
+    if not appointment:
+        return None
+    patients = await get_patients([appointment["patient_id"]], patient_columns)
+    return {
+        "appointment": appointment,
+        "patient": patients.get(appointment["patient_id"]),
+        "conversation": conversation,
+    }
+
+async def get_doctor_day(doctor_id: str, date: str, patient_columns: str = "id,name,contact") -> Dict:
+    """
+    Get a doctor's day: every appointment with its patient embedded, plus the free times.
+
+    Patients are read with one batched query however many appointments
+    there are.
+
+    Args:
+        doctor_id (str): The ID of the doctor
+        date (str): The date in format 'YYYY-MM-DD'
+        patient_columns (str): "*" or comma-separated patient columns to embed
+
+    Returns:
+        dict: {"doctor_id", "date", "appointments" in time order, "free_times"}
+    """
+    patient_columns = parse_fields("patient", patient_columns)
+    appointments, free_times = await asyncio.gather(
+        get_doctor_appointments_by_date(doctor_id, date), get_doctor_appointment_times(doctor_id, date)
+    )
+    patients = await get_patients([appointment["patient_id"] for appointment in appointments], patient_columns)
+    return {
+        "doctor_id": doctor_id,
+        "date": date,
+        "appointments": [
+            {**appointment, "patient": patients.get(appointment["patient_id"])}
+            for appointment in sorted(appointments, key=lambda appointment: to_minutes(appointment["time"]))
+        ],
+        "free_times": free_times,
+    }
@@ -0,0 +1,238 @@
+import asyncio
+import io
+import math
+import os
+import shutil
+import warnings
+import wave
+from array import array
+from operator import mul
+from typing import AsyncIterator, List, Tuple, Union
+
+with warnings.catch_warnings():
+    # Deprecated since 3.11 and removed in 3.13, where loudness falls back to pure Python
+    warnings.simplefilter("ignore", DeprecationWarning)
+    try:
+        import audioop
+    except ImportError:
+        audioop = None
+
+# Frames quieter than this (dBFS) count as silence
+SILENCE_DB = float(os.getenv("TRANSCRIPTION_SILENCE_DB", "-40"))
+MIN_SILENCE_SECONDS = float(os.getenv("TRANSCRIPTION_MIN_SILENCE_SECONDS", "0.3"))
+FRAME_SECONDS = 0.03
+# Without audioop only every Nth sample is used to measure loudness, which is plenty for finding pauses
+ENERGY_STRIDE = 4
+# Compressed formats are decoded to 16 kHz mono, which is what Whisper uses internally
+DECODE_SAMPLE_RATE = 16000
+
+_TYPECODES = {1: "B", 2: "h", 4: "i"}
+
+
+class UnsupportedAudio(Exception):
+    """Raised when audio cannot be decoded for segmentation."""
+
+
+class PCMAudio:
+    """Uncompressed, interleaved PCM audio."""
+
+    def __init__(self, frames: Union[bytes, memoryview], sample_rate: int, channels: int, sample_width: int):
+        self.frames = frames
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.sample_width = sample_width
+
+    @property
+    def bytes_per_second(self) -> int:
+        return self.sample_rate * self.channels * self.sample_width
+
+    @property
+    def duration(self) -> float:
+        return len(self.frames) / self.bytes_per_second
+
+    def wav(self, start: float, end: float) -> bytes:
+        """Encode the audio between `start` and `end` seconds as a WAV file."""
+        frame_size = self.channels * self.sample_width
+        first = int(start * self.sample_rate) * frame_size
+        last = int(end * self.sample_rate) * frame_size
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as out:
+            out.setnchannels(self.channels)
+            out.setsampwidth(self.sample_width)
+            out.setframerate(self.sample_rate)
+            out.writeframes(self.frames[first:last])
+        return buffer.getvalue()
+
+
+def ffmpeg_available() -> bool:
+    return shutil.which("ffmpeg") is not None
+
+
+def can_segment(content_type: str) -> bool:
+    """Whether audio of this type can be decoded and split here."""
+    return content_type == "audio/wav" or ffmpeg_available()
+
+
+class _BufferFile(io.RawIOBase):
+    """A read-only file over a buffer; unlike BytesIO it does not copy a bytearray."""
+
+    def __init__(self, view: memoryview):
+        self._view = view
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: len(self._view)}[whence]
+        self._position = max(0, base + offset)
+        return self._position
+
+    def readinto(self, buffer) -> int:
+        chunk = self._view[self._position:self._position + len(buffer)]
+        buffer[:len(chunk)] = chunk
+        self._position += len(chunk)
+        return len(chunk)
+
+
+def read_wav(data: Union[bytes, bytearray, memoryview]) -> PCMAudio:
+    """Read a PCM WAV file. The samples are a view into `data`, not a copy of it."""
+    view = memoryview(data).cast("B")
+    source = _BufferFile(view)
+    try:
+        with wave.open(source, "rb") as wav:
+            # Reading the header stops at the start of the sample data
+            frame_size = wav.getnchannels() * wav.getsampwidth()
+            start = source.tell()
+            end = min(start + wav.getnframes() * frame_size, len(view))
+            audio = PCMAudio(view[start:end - (end - start) % frame_size], wav.getframerate(),
+                             wav.getnchannels(), wav.getsampwidth())
+    except (wave.Error, EOFError) as e:
+        raise UnsupportedAudio(f"Invalid WAV file: {str(e) or type(e).__name__}")
+    if audio.sample_width not in _TYPECODES:
+        raise UnsupportedAudio(f"Unsupported WAV sample width: {audio.sample_width * 8} bits")
+    return audio
+
+
+async def decode_with_ffmpeg(chunks: AsyncIterator[bytes]) -> PCMAudio:
+    """Decode any format ffmpeg understands to 16 kHz mono PCM, feeding it the input as it arrives."""
+    process = await asyncio.create_subprocess_exec(
+        "ffmpeg", "-loglevel", "error", "-i", "pipe:0", "-f", "s16le", "-ac", "1",
+        "-ar", str(DECODE_SAMPLE_RATE), "pipe:1",
+        stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+    )
+
+    async def feed():
+        try:
+            async for chunk in chunks:
+                process.stdin.write(chunk)
+                await process.stdin.drain()
+        finally:
+            process.stdin.close()
+
+    try:
+        _, pcm, errors = await asyncio.gather(feed(), process.stdout.read(), process.stderr.read())
+        await process.wait()
+    finally:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+    if process.returncode != 0:
+        raise UnsupportedAudio(f"ffmpeg could not decode the audio: {errors.decode(errors='replace').strip()}")
+    return PCMAudio(pcm, DECODE_SAMPLE_RATE, 1, 2)
+
+
+async def load_audio(content_type: str, chunks: AsyncIterator[bytes]) -> PCMAudio:
+    """
+    Decode an upload to PCM.
+
+    WAV is read directly; other formats need ffmpeg on the PATH.
+
+    Raises:
+        UnsupportedAudio: If the audio cannot be decoded
+    """
+    if content_type == "audio/wav":
+        data = bytearray()
+        async for chunk in chunks:
+            data.extend(chunk)
+        return read_wav(data)
+    if not ffmpeg_available():
+        raise UnsupportedAudio(f"Segmenting {content_type} audio requires ffmpeg")
+    return await decode_with_ffmpeg(chunks)
+
+
+def frame_levels(audio: PCMAudio) -> List[float]:
+    """Loudness in dBFS of each FRAME_SECONDS frame."""
+    width = audio.sample_width
+    full_scale = float(2 ** (8 * width - 1))
+    step = max(1, int(FRAME_SECONDS * audio.sample_rate) * audio.channels) * width
+    levels = []
+    for offset in range(0, len(audio.frames), step):
+        frame = audio.frames[offset:offset + step]
+        rms = _rms(frame, width) if frame else 0
+        levels.append(20 * math.log10(rms / full_scale) if rms else -120.0)
+    return levels
+
+
+def _rms(frame, width: int) -> float:
+    if audioop is not None:
+        # 8-bit WAV is unsigned; audioop reads it as signed, and the bias wraps it back around zero
+        return audioop.rms(audioop.bias(frame, 1, -128) if width == 1 else frame, width)
+    samples = array(_TYPECODES[width])
+    samples.frombytes(frame)
+    samples = samples[::ENERGY_STRIDE]
+    if width == 1:
+        samples = array("h", (s - 128 for s in samples))
+    return math.sqrt(sum(map(mul, samples, samples)) / len(samples))
+
+
+def find_silences(audio: PCMAudio, threshold_db: float = SILENCE_DB,
+                  min_seconds: float = MIN_SILENCE_SECONDS) -> List[Tuple[float, float]]:
+    """Return (start, end) times of pauses of at least `min_seconds`."""
+    silences = []
+    run_start = None
+    levels = frame_levels(audio)
+    for index, level in enumerate(levels + [0.0]):
+        if level < threshold_db:
+            if run_start is None:
+                run_start = index
+        elif run_start is not None:
+            if (index - run_start) * FRAME_SECONDS >= min_seconds:
+                silences.append((run_start * FRAME_SECONDS, min(index * FRAME_SECONDS, audio.duration)))
+            run_start = None
+    return silences
+
+
+def plan_pieces(duration: float, silences: List[Tuple[float, float]], max_seconds: float,
+                overlap_seconds: float) -> List[Tuple[float, float]]:
+    """
+    Split [0, duration] into pieces of at most `max_seconds`.
+
+    Each cut is placed in the middle of the longest pause within the last
+    quarter of the allowed length. Where there is no pause the cut is made at
+    the limit and the next piece starts `overlap_seconds` earlier, so words
+    cut in half are heard whole by one of the two pieces.
+    """
+    pieces = []
+    start = 0.0
+    search = max_seconds / 4
+    while duration - start > max_seconds:
+        limit = start + max_seconds
+        pauses = [s for s in silences if limit - search <= (s[0] + s[1]) / 2 <= limit]
+        if pauses:
+            # Longest pause wins; among equally long ones the latest keeps pieces large
+            pause = max(pauses, key=lambda s: (round(s[1] - s[0], 2), s[0]))
+            cut = (pause[0] + pause[1]) / 2
+            pieces.append((start, cut))
+            start = cut
+        else:
+            pieces.append((start, limit))
+            start = limit - overlap_seconds
+    pieces.append((start, duration))
+    return pieces
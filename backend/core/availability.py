@@ -0,0 +1,217 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date as Date, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Seconds a loaded doctor-day stays authoritative before it is re-read, which
+# bounds staleness from writes made by other workers
+INDEX_TTL = float(os.getenv("AVAILABILITY_INDEX_TTL", "60"))
+# Largest date range a single availability query may cover
+MAX_RANGE_DAYS = int(os.getenv("AVAILABILITY_MAX_DAYS", "62"))
+
+
+def to_minutes(value: str) -> int:
+    """Minutes since midnight of an "H:MM" time."""
+    hours, _, minutes = value.strip().partition(":")
+    return int(hours) * 60 + int(minutes or 0)
+
+
+def _format_minutes(minutes: int) -> str:
+    # Matches the stored appointment format, e.g. "9:00" and "13:30"
+    return f"{minutes // 60}:{minutes % 60:02d}"
+
+
+class DoctorSchedule:
+    """
+    Working hours of one doctor.
+
+    Args:
+        start (str): First bookable time, e.g. "9:00"
+        end (str): End of the working day; the last slot finishes at or before it
+        slot_minutes (int): Length of one appointment slot
+        weekdays (list): Working days as date.weekday() numbers (Monday is 0)
+    """
+
+    def __init__(self, start: str = "9:00", end: str = "19:00", slot_minutes: int = 30,
+                 weekdays: Optional[Iterable[int]] = None):
+        self.start = to_minutes(start)
+        self.end = to_minutes(end)
+        self.slot_minutes = int(slot_minutes)
+        self.weekdays = frozenset(range(7) if weekdays is None else weekdays)
+        if self.slot_minutes <= 0 or self.end <= self.start:
+            raise ValueError("Schedule needs a positive slot length and end after start")
+        self.slots = [_format_minutes(m) for m in range(self.start, self.end - self.slot_minutes + 1, self.slot_minutes)]
+        self.full_mask = (1 << len(self.slots)) - 1
+
+    def slot_index(self, time_value: str) -> Optional[int]:
+        """Return the slot an appointment starting at `time_value` occupies, if any."""
+        try:
+            offset = to_minutes(time_value) - self.start
+        except ValueError:
+            return None
+        index = offset // self.slot_minutes
+        return index if 0 <= index < len(self.slots) else None
+
+    def free_slots(self, booked_mask: int) -> List[str]:
+        return [slot for i, slot in enumerate(self.slots) if not booked_mask >> i & 1]
+
+
+DEFAULT_SCHEDULE = DoctorSchedule()
+
+
+def _schedule_from_config(config: Dict) -> DoctorSchedule:
+    return DoctorSchedule(
+        start=config.get("work_start", config.get("start", "9:00")),
+        end=config.get("work_end", config.get("end", "19:00")),
+        slot_minutes=config.get("slot_minutes", 30),
+        weekdays=config.get("weekdays"),
+    )
+
+
+def _load_schedule_overrides() -> Dict[str, DoctorSchedule]:
+    # DOCTOR_SCHEDULES='{"DR001": {"start": "8:00", "end": "16:00", "slot_minutes": 20}}'
+    raw = os.getenv("DOCTOR_SCHEDULES")
+    if not raw:
+        return {}
+    return {doctor_id: _schedule_from_config(config) for doctor_id, config in json.loads(raw).items()}
+
+
+SCHEDULE_OVERRIDES = _load_schedule_overrides()
+
+
+def get_schedule(doctor_id: str, doctor: Optional[Dict] = None) -> DoctorSchedule:
+    """
+    Resolve a doctor's schedule.
+
+    DOCTOR_SCHEDULES overrides win, then `work_start`/`work_end`/`slot_minutes`
+    columns on the doctor row, then the default 9:00-19:00 half-hour schedule.
+    """
+    if doctor_id in SCHEDULE_OVERRIDES:
+        return SCHEDULE_OVERRIDES[doctor_id]
+    if doctor and any(doctor.get(k) for k in ("work_start", "work_end", "slot_minutes")):
+        return _schedule_from_config({k: v for k, v in doctor.items() if v is not None})
+    return DEFAULT_SCHEDULE
+
+
+def date_range(start: str, end: str) -> List[str]:
+    """List ISO dates from `start` to `end` inclusive."""
+    first, last = Date.fromisoformat(start), Date.fromisoformat(end)
+    days = (last - first).days
+    if days < 0:
+        raise ValueError("End date must not be before start date")
+    if days >= MAX_RANGE_DAYS:
+        raise ValueError(f"Date range must cover at most {MAX_RANGE_DAYS} days")
+    return [(first + timedelta(days=i)).isoformat() for i in range(days + 1)]
+
+
+class SlotIndex:
+    """
+    Per-process index of booked slots.
+
+    Each (doctor_id, date) that has been loaded keeps the appointments booked on
+    it and a bitmap of occupied slots (bit i set means slot i is taken). Writes
+    patch the affected days in place so lookups do not need another query.
+    Days are dropped once they have been expired for a further `ttl`, so the
+    index only holds the days being queried rather than every day ever asked for.
+    """
+
+    def __init__(self, ttl: float = INDEX_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # Oldest load first, so expired days are found without scanning the rest
+        self._loaded_at: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._day_appointments: Dict[Tuple[str, str], Dict[str, str]] = {}
+        self._bitmaps: Dict[Tuple[str, str], int] = {}
+        self._locations: Dict[str, Tuple[str, str]] = {}
+        self._schedules: Dict[str, DoctorSchedule] = {}
+
+    def missing(self, doctor_ids: Iterable[str], dates: Iterable[str]) -> List[Tuple[str, str]]:
+        """Return the doctor-days that are not loaded or have expired."""
+        now = time.monotonic()
+        with self._lock:
+            return [(d, day) for d in doctor_ids for day in dates
+                    if now - self._loaded_at.get((d, day), float("-inf")) > self.ttl]
+
+    def load(self, doctor_ids: Iterable[str], dates: Iterable[str], appointments: Iterable[Dict],
+             schedules: Dict[str, DoctorSchedule]) -> None:
+        """Replace the given doctor-days with freshly queried appointments."""
+        now = time.monotonic()
+        with self._lock:
+            self._schedules.update(schedules)
+            keys = [(d, day) for d in doctor_ids for day in dates]
+            for key in keys:
+                for appointment_id in self._day_appointments.pop(key, {}):
+                    self._locations.pop(appointment_id, None)
+                self._day_appointments[key] = {}
+                self._loaded_at[key] = now
+                self._loaded_at.move_to_end(key)
+            for appointment in appointments:
+                key = (appointment["doctor_id"], appointment["date"])
+                if key in self._day_appointments:
+                    self._day_appointments[key][appointment["appointment_id"]] = appointment["time"]
+                    self._locations[appointment["appointment_id"]] = key
+            for key in keys:
+                self._rebuild(key)
+            self._evict(now)
+
+    def _evict(self, now: float) -> None:
+        # A day is kept for one more TTL after it expires, so a query that found it
+        # fresh can still read its bitmap after awaiting the load of other days
+        while self._loaded_at:
+            key, loaded_at = next(iter(self._loaded_at.items()))
+            if now - loaded_at <= 2 * self.ttl:
+                break
+            del self._loaded_at[key]
+            for appointment_id in self._day_appointments.pop(key, {}):
+                self._locations.pop(appointment_id, None)
+            self._bitmaps.pop(key, None)
+
+    def _rebuild(self, key: Tuple[str, str]) -> None:
+        schedule = self._schedules.get(key[0], DEFAULT_SCHEDULE)
+        mask = 0
+        for time_value in self._day_appointments.get(key, {}).values():
+            index = schedule.slot_index(time_value)
+            if index is not None:
+                mask |= 1 << index
+        self._bitmaps[key] = mask
+
+    def record(self, appointment: Dict) -> None:
+        """Apply a created or updated appointment to the days it leaves and enters."""
+        with self._lock:
+            self._discard(appointment["appointment_id"])
+            key = (appointment.get("doctor_id"), appointment.get("date"))
+            if key in self._day_appointments:
+                self._day_appointments[key][appointment["appointment_id"]] = appointment.get("time")
+                self._locations[appointment["appointment_id"]] = key
+                self._rebuild(key)
+
+    def remove(self, appointment_id: str) -> None:
+        """Free the slot held by a deleted appointment."""
+        with self._lock:
+            self._discard(appointment_id)
+
+    def _discard(self, appointment_id: str) -> None:
+        key = self._locations.pop(appointment_id, None)
+        if key is not None:
+            self._day_appointments.get(key, {}).pop(appointment_id, None)
+            self._rebuild(key)
+
+    def free_slots(self, doctor_id: str, day: str) -> List[str]:
+        schedule = self._schedules.get(doctor_id, DEFAULT_SCHEDULE)
+        if Date.fromisoformat(day).weekday() not in schedule.weekdays:
+            return []
+        with self._lock:
+            return schedule.free_slots(self._bitmaps.get((doctor_id, day), 0))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._loaded_at.clear()
+            self._day_appointments.clear()
+            self._bitmaps.clear()
+            self._locations.clear()
+
+
+slot_index = SlotIndex()
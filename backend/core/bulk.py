@@ -0,0 +1,367 @@
+import asyncio
+import json
+import os
+import uuid
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+from core.async_crud import parse_fields, project
+from core.availability import slot_index
+from core.cache import invalidate_appointment, patient_cache
+from core.governor import inspect_error
+from core.storage import PRIMARY_KEYS, SERVER_DEFAULTS, TABLES, get_repository
+
+# Batch create, update, delete and read for patients, appointments and conversations. Work is
+# split into chunks of BULK_CHUNK_SIZE rows, one statement each, and every item gets its own
+# outcome, so one bad row fails alone instead of taking the rest of the batch with it.
+
+# Rows per statement; each chunk is one round-trip to the database
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "500"))
+# Items accepted by one JSON batch request; larger loads should use the NDJSON import
+BULK_MAX_ITEMS = int(os.getenv("BULK_MAX_ITEMS", "5000"))
+# Update statements in flight at once
+BULK_CONCURRENCY = int(os.getenv("BULK_CONCURRENCY", "8"))
+# Failed lines listed in an import report; any beyond this are only counted
+BULK_MAX_ERRORS = int(os.getenv("BULK_MAX_ERRORS", "1000"))
+# Longest NDJSON line an import accepts, in bytes
+BULK_MAX_LINE_BYTES = int(os.getenv("BULK_MAX_LINE_BYTES", str(1024 * 1024)))
+
+# Resource name in the URL -> table. Doctors are read only.
+RESOURCES = {"patients": "patient", "appointments": "appointment", "conversations": "conversation"}
+
+CREATED = "created"
+UPDATED = "updated"
+DELETED = "deleted"
+NOT_FOUND = "not_found"
+FAILED = "failed"
+
+
+def _resource(resource: str) -> Tuple[str, str]:
+    if resource not in RESOURCES:
+        raise ValueError(f"Unknown resource {resource!r}; expected one of {', '.join(RESOURCES)}")
+    table = RESOURCES[resource]
+    return table, PRIMARY_KEYS[table]
+
+
+def _check_size(items: List) -> None:
+    if len(items) > BULK_MAX_ITEMS:
+        raise ValueError(f"Batches are limited to {BULK_MAX_ITEMS} items; use the NDJSON import for more")
+
+
+def _chunks(items: List, size: int = BULK_CHUNK_SIZE) -> Iterable[List]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _new_row(table: str, key: str, item: Any) -> Dict:
+    """Validate an item to create; a missing key is generated and missing SERVER_DEFAULTS columns left out."""
+    if isinstance(item, Exception):
+        raise item
+    if not isinstance(item, dict):
+        raise ValueError("Expected a JSON object")
+    unknown = [column for column in item if column not in TABLES[table]]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    defaults = SERVER_DEFAULTS[table]
+    missing = [column for column in TABLES[table]
+               if column != key and not isinstance(item.get(column), str)
+               and not (column in defaults and item.get(column) is None)]
+    if missing:
+        raise ValueError(f"Missing or non-string fields: {', '.join(missing)}")
+    if item.get(key) is not None and not (isinstance(item[key], str) and item[key]):
+        raise ValueError(f"{key} must be a non-empty string")
+    row = {column: item.get(column) for column in TABLES[table]
+           if column not in defaults or item.get(column) is not None}
+    row[key] = row[key] or str(uuid.uuid4())
+    # Same columns in the same order for every row, so a chunk is a single multi-row insert;
+    # the database fills in the defaulted ones an item leaves out
+    return row
+
+
+def _after_write(table: str, rows: List[Dict], created: bool = False) -> None:
+    """Keep the caches and slot index in step with rows that were just written."""
+    for row in rows:
+        if table == "patient":
+            patient_cache.invalidate(row["id"])
+        elif table == "appointment":
+            if created:
+                invalidate_appointment(row["appointment_id"], row["doctor_id"], row["date"])
+            else:
+                invalidate_appointment(row["appointment_id"])
+            slot_index.record(row)
+
+
+def _after_delete(table: str, rows: List[Dict]) -> None:
+    for row in rows:
+        if table == "patient":
+            patient_cache.invalidate(row["id"])
+        elif table == "appointment":
+            invalidate_appointment(row["appointment_id"])
+            slot_index.remove(row["appointment_id"])
+
+
+def _outcome(index: int, item_id: Optional[str], status: str, error: Optional[str] = None) -> Dict:
+    outcome = {"index": index, "id": item_id, "status": status}
+    if error:
+        outcome["error"] = error
+    return outcome
+
+
+def _report(outcomes: List[Dict]) -> Dict:
+    failed = sum(1 for outcome in outcomes if outcome["status"] in (FAILED, NOT_FOUND))
+    return {"succeeded": len(outcomes) - failed, "failed": failed, "results": outcomes}
+
+
+async def _insert_chunk(table: str, rows: List[Dict]) -> List[Tuple[Optional[Dict], Optional[str]]]:
+    """
+    Insert rows with one statement, returning (row, error) per input row.
+
+    If the statement is rejected because of the data (e.g. a duplicate key),
+    the rows are retried one at a time so only the offending ones fail. An
+    outage fails the whole chunk at once rather than once per row.
+    """
+    repository = get_repository()
+    try:
+        return [(row, None) for row in await repository.insert(table, rows)]
+    except Exception as e:
+        if len(rows) == 1 or inspect_error(e)[2]:
+            return [(None, str(e))] * len(rows)
+    outcomes = []
+    for row in rows:
+        try:
+            outcomes.append(((await repository.insert(table, [row]))[0], None))
+        except Exception as e:
+            outcomes.append((None, str(e)))
+    return outcomes
+
+
+async def _create(table: str, key: str, items: AsyncIterable[Tuple[int, Any]]) -> AsyncIterator[Dict]:
+    """Validate and insert numbered items chunk by chunk, yielding one outcome per item."""
+    pending: List[Tuple[int, Dict]] = []
+
+    async def flush() -> List[Dict]:
+        inserted = await _insert_chunk(table, [row for _, row in pending])
+        _after_write(table, [row for row, _ in inserted if row], created=True)
+        outcomes = [_outcome(index, row[key], FAILED if error else CREATED, error)
+                    for (index, row), (_, error) in zip(pending, inserted)]
+        pending.clear()
+        return outcomes
+
+    unreadable = None
+    try:
+        async for index, item in items:
+            try:
+                pending.append((index, _new_row(table, key, item)))
+            except ValueError as e:
+                yield _outcome(index, item.get(key) if isinstance(item, dict) else None, FAILED, str(e))
+                continue
+            if len(pending) >= BULK_CHUNK_SIZE:
+                for outcome in await flush():
+                    yield outcome
+    except ValueError as e:
+        # The input could not be read any further; still write what was read before that point
+        unreadable = e
+    if pending:
+        for outcome in await flush():
+            yield outcome
+    if unreadable:
+        raise unreadable
+
+
+async def _numbered(items: List) -> AsyncIterator[Tuple[int, Any]]:
+    for index, item in enumerate(items):
+        yield index, item
+
+
+async def bulk_create(resource: str, items: List) -> Dict:
+    """
+    Create many rows, BULK_CHUNK_SIZE per insert.
+
+    Args:
+        resource (str): patients, appointments or conversations
+        items (List): One object per row; the primary key may be given or is generated
+
+    Returns:
+        dict: {"succeeded", "failed", "results": [{"index", "id", "status", "error"?}] in input order}
+    """
+    table, key = _resource(resource)
+    _check_size(items)
+    outcomes = [outcome async for outcome in _create(table, key, _numbered(items))]
+    return _report(sorted(outcomes, key=lambda outcome: outcome["index"]))
+
+
+async def _ndjson(body: AsyncIterable[bytes]) -> AsyncIterator[Tuple[int, Any]]:
+    """Parse a streamed NDJSON body into (line number, object) pairs; unparsable lines carry a ValueError."""
+    buffer = b""
+    line_number = 0
+    async for chunk in body:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_number += 1
+            if line.strip():
+                yield line_number, _parse_line(line)
+        if len(buffer) > BULK_MAX_LINE_BYTES:
+            raise ValueError(f"Line {line_number + 1} is longer than {BULK_MAX_LINE_BYTES} bytes")
+    if buffer.strip():
+        yield line_number + 1, _parse_line(buffer)
+
+
+def _parse_line(line: bytes) -> Any:
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        return ValueError(f"Invalid JSON: {e}")
+
+
+async def bulk_import(resource: str, body: AsyncIterable[bytes]) -> Dict:
+    """
+    Create rows from a streamed NDJSON body, one object per line.
+
+    Lines are inserted BULK_CHUNK_SIZE at a time as they arrive, so memory use
+    does not grow with the size of the import. Rows are committed chunk by
+    chunk: if the import stops early, the rows before that point stay.
+
+    Args:
+        resource (str): patients, appointments or conversations
+        body: The request body as it is received
+
+    Returns:
+        dict: {"lines", "created", "failed", "errors": first BULK_MAX_ERRORS failures by line, "aborted"}
+    """
+    table, key = _resource(resource)
+    report = {"lines": 0, "created": 0, "failed": 0, "errors": [], "aborted": None}
+    try:
+        async for outcome in _create(table, key, _ndjson(body)):
+            report["lines"] = max(report["lines"], outcome["index"])
+            if outcome["status"] == CREATED:
+                report["created"] += 1
+                continue
+            report["failed"] += 1
+            if len(report["errors"]) < BULK_MAX_ERRORS:
+                report["errors"].append({"line": outcome["index"], "id": outcome["id"], "error": outcome["error"]})
+    except ValueError as e:
+        report["aborted"] = str(e)
+    return report
+
+
+def _unique_ids(key: str, items: List, outcomes: List[Optional[Dict]]) -> Dict[str, int]:
+    """Map each usable id to its index, failing items without one and repeats of an earlier id."""
+    indexes = {}
+    for index, item in enumerate(items):
+        item_id = item.get(key) if isinstance(item, dict) else item
+        if not isinstance(item_id, str) or not item_id:
+            outcomes[index] = _outcome(index, None, FAILED, f"Missing {key}")
+        elif item_id in indexes:
+            outcomes[index] = _outcome(index, item_id, FAILED, "Repeats an earlier item in this batch")
+        else:
+            indexes[item_id] = index
+    return indexes
+
+
+async def bulk_update(resource: str, items: List[Dict]) -> Dict:
+    """
+    Update many rows.
+
+    Items in a chunk that set the same values share one statement
+    (`UPDATE ... WHERE key IN (...)`); distinct updates run concurrently, up to
+    BULK_CONCURRENCY at a time.
+
+    Args:
+        resource (str): patients, appointments or conversations
+        items (List[Dict]): The primary key plus the fields to change, per row
+
+    Returns:
+        dict: {"succeeded", "failed", "results"}, with not_found for ids that matched no row
+    """
+    table, key = _resource(resource)
+    _check_size(items)
+    outcomes: List[Optional[Dict]] = [None] * len(items)
+    indexes = _unique_ids(key, items, outcomes)
+    changes = {}
+    for item_id, index in indexes.items():
+        updates = {column: value for column, value in items[index].items() if column != key}
+        unknown = [column for column in updates if column not in TABLES[table]]
+        if unknown or not updates or not all(isinstance(value, str) for value in updates.values()):
+            error = f"Unknown fields: {', '.join(unknown)}" if unknown else "Expected string fields to update"
+            outcomes[index] = _outcome(index, item_id, FAILED, error)
+        else:
+            changes[item_id] = updates
+
+    semaphore = asyncio.Semaphore(BULK_CONCURRENCY)
+
+    async def apply(updates: Dict, ids: List[str]) -> None:
+        async with semaphore:
+            try:
+                rows = await get_repository().update(table, [(key, "in", ids)], updates)
+            except Exception as e:
+                for item_id in ids:
+                    outcomes[indexes[item_id]] = _outcome(indexes[item_id], item_id, FAILED, str(e))
+                return
+        _after_write(table, rows)
+        updated = {row[key] for row in rows}
+        for item_id in ids:
+            outcomes[indexes[item_id]] = _outcome(indexes[item_id], item_id,
+                                                  UPDATED if item_id in updated else NOT_FOUND)
+
+    for chunk in _chunks(list(changes)):
+        groups: Dict[Tuple, List[str]] = {}
+        for item_id in chunk:
+            groups.setdefault(tuple(sorted(changes[item_id].items())), []).append(item_id)
+        await asyncio.gather(*(apply(dict(updates), ids) for updates, ids in groups.items()))
+    return _report(outcomes)
+
+
+async def bulk_delete(resource: str, ids: List[str]) -> Dict:
+    """
+    Delete many rows, BULK_CHUNK_SIZE per statement.
+
+    Args:
+        resource (str): patients, appointments or conversations
+        ids (List[str]): Primary keys of the rows to delete
+
+    Returns:
+        dict: {"succeeded", "failed", "results"}, with not_found for ids that matched no row
+    """
+    table, key = _resource(resource)
+    _check_size(ids)
+    outcomes: List[Optional[Dict]] = [None] * len(ids)
+    indexes = _unique_ids(key, ids, outcomes)
+    for chunk in _chunks(list(indexes)):
+        try:
+            rows = await get_repository().delete(table, [(key, "in", chunk)])
+        except Exception as e:
+            for item_id in chunk:
+                outcomes[indexes[item_id]] = _outcome(indexes[item_id], item_id, FAILED, str(e))
+            continue
+        _after_delete(table, rows)
+        deleted = {row[key] for row in rows}
+        for item_id in chunk:
+            outcomes[indexes[item_id]] = _outcome(indexes[item_id], item_id,
+                                                  DELETED if item_id in deleted else NOT_FOUND)
+    return _report(outcomes)
+
+
+async def bulk_read(resource: str, ids: List[str], columns: str = "*") -> Dict:
+    """
+    Read many rows by primary key, BULK_CHUNK_SIZE per query.
+
+    Args:
+        resource (str): patients, appointments or conversations
+        ids (List[str]): Primary keys to read
+        columns (str): "*" or comma-separated columns to return
+
+    Returns:
+        dict: {"rows": found rows in request order, "missing": ids that matched no row}
+    """
+    table, key = _resource(resource)
+    _check_size(ids)
+    columns = parse_fields(table, columns)
+    # The key is needed to put rows back in order even when it was not asked for
+    selected = columns if columns == "*" or key in columns.split(",") else f"{key},{columns}"
+    wanted = list(dict.fromkeys(ids))
+    found = {}
+    for chunk in _chunks(wanted):
+        for row in await get_repository().select(table, [(key, "in", chunk)], columns=selected):
+            found[row[key]] = project(row, columns)
+    return {"rows": [found[item_id] for item_id in wanted if item_id in found],
+            "missing": [item_id for item_id in wanted if item_id not in found]}
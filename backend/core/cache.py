@@ -0,0 +1,117 @@
+import copy
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Tuple
+
+# Hit/miss counting is opt-in so production can turn it on only while checking hit rates
+CACHE_STATS = os.getenv("CACHE_STATS", "false").lower() in ("1", "true", "yes")
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries also expire after a fixed TTL.
+
+    Memory is bounded by `max_entries`; the least recently used entry is evicted
+    first. Values are deep-copied on the way in and out so callers can never
+    mutate what is cached. The cache is per process, so each worker keeps and
+    invalidates its own copy.
+    """
+
+    def __init__(self, name: str, ttl: float, max_entries: int):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """Return (found, value) for `key`, dropping it if it has expired."""
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is not _MISSING and entry[0] < time.monotonic():
+                del self._entries[key]
+                entry = _MISSING
+            if entry is _MISSING:
+                if CACHE_STATS:
+                    self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            if CACHE_STATS:
+                self.hits += 1
+            return True, copy.deepcopy(entry[1])
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if self.max_entries <= 0 or self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, copy.deepcopy(value))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+            }
+
+
+def _cache(name: str, ttl: float, max_entries: int) -> TTLCache:
+    prefix = f"CACHE_{name.upper()}"
+    return TTLCache(
+        name,
+        ttl=float(os.getenv(f"{prefix}_TTL", ttl)),
+        max_entries=int(os.getenv(f"{prefix}_MAX_ENTRIES", max_entries)),
+    )
+
+
+# Per-entity caches shared by core.crud and core.async_crud
+doctors_cache = _cache("doctors", ttl=300, max_entries=1)
+patient_cache = _cache("patients", ttl=120, max_entries=1000)
+appointment_cache = _cache("appointments", ttl=60, max_entries=2000)
+# Appointments of one doctor on one day, keyed by (doctor_id, date)
+doctor_day_cache = _cache("doctor_day", ttl=30, max_entries=500)
+
+CACHES = (doctors_cache, patient_cache, appointment_cache, doctor_day_cache)
+
+
+def invalidate_appointment(appointment_id: str, doctor_id: str = None, date: str = None) -> None:
+    """
+    Drop cached data affected by an appointment write.
+
+    When the doctor and date are unknown (updates and deletes may move an
+    appointment between days) every doctor-day entry is dropped.
+    """
+    appointment_cache.invalidate(appointment_id)
+    if doctor_id and date:
+        doctor_day_cache.invalidate((doctor_id, date))
+    else:
+        doctor_day_cache.clear()
+
+
+def get_cache_stats() -> Dict:
+    """Report entry counts and, when CACHE_STATS is enabled, hit/miss counters."""
+    return {"stats_enabled": CACHE_STATS, **{c.name: c.stats() for c in CACHES}}
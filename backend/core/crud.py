@@ -1,21 +1,20 @@
-from supabase import create_client, Client
 from typing import List, Dict, Optional
-import os
-from dotenv import load_dotenv
 import uuid
+from core.db import get_supabase_client
+from core.cache import appointment_cache, doctor_day_cache, doctors_cache, invalidate_appointment, patient_cache
+from core.availability import slot_index
+from core.telemetry import span
 
-# Load environment variables from .env file
-load_dotenv()
+# Half-hour slots a doctor can be booked in
+APPOINTMENT_TIMES = ["9:00", "9:30", "10:00", "10:30", "11:00", "11:30", "12:00", "12:30", "13:00", "13:30", "14:00", "14:30", "15:00", "15:30", "16:00", "16:30", "17:00", "17:30", "18:00", "18:30"]
 
-# Initialize Supabase client with environment variables
-def get_supabase_client() -> Client:
-    url = os.getenv("SUPABASE_URL")
-    key = os.getenv("SUPABASE_KEY")
-    # service_role_key = os.getenv("SERVICE_ROLE_KEY")
-    if not url or not key:
-        raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set in .env file")
-    
-    return create_client(url, key)
+# Supabase reports each request builder's HTTP method; spans use the storage operation names
+OPERATIONS = {"GET": "select", "HEAD": "select", "POST": "insert", "PATCH": "update", "DELETE": "delete"}
+
+def _execute(query):
+    """Run a Supabase query inside an upstream span."""
+    with span("supabase", OPERATIONS.get(query.http_method, query.http_method.lower())):
+        return query.execute()
 
 # Helper function to handle errors
 def handle_error(response):
@@ -32,31 +31,45 @@ def handle_error(response):
 # 1. Doctor Operations (Read Only - get_db)
 def get_doctors() -> List[Dict]:
     """Retrieve all doctors from the database."""
+    found, doctors = doctors_cache.get("all")
+    if found:
+        return doctors
     supabase = get_supabase_client()
-    response = supabase.table("doctor").select("*").execute()
-    return handle_error(response)
+    response = _execute(supabase.table("doctor").select("*"))
+    doctors = handle_error(response)
+    doctors_cache.set("all", doctors)
+    return doctors
 
 # 2. Appointment CRUD Operations
 def create_appointment(date: str, time: str, patient_id: str, type: str, doctor_id: str) -> Dict:
     """Create a new appointment."""
     supabase = get_supabase_client()
     appointment_id = str(uuid.uuid4())
-    response = supabase.table("appointment").insert({
+    response = _execute(supabase.table("appointment").insert({
         "appointment_id": appointment_id,
         "date": date,
         "time": time,
         "patient_id": patient_id,
         "type": type,
         "doctor_id": doctor_id
-    }).execute()
-    return handle_error(response)[0]
+    }))
+    appointment = handle_error(response)[0]
+    invalidate_appointment(appointment_id, doctor_id, date)
+    slot_index.record(appointment)
+    return appointment
 
 def read_appointment(appointment_id: str) -> Optional[Dict]:
     """Read a specific appointment by ID."""
+    found, appointment = appointment_cache.get(appointment_id)
+    if found:
+        return appointment
     supabase = get_supabase_client()
-    response = supabase.table("appointment").select("*").eq("appointment_id", appointment_id).execute()
+    response = _execute(supabase.table("appointment").select("*").eq("appointment_id", appointment_id))
     data = handle_error(response)
-    return data[0] if data else None
+    if not data:
+        return None
+    appointment_cache.set(appointment_id, data[0])
+    return data[0]
 
 def update_appointment(appointment_id: str, date: Optional[str] = None, time: Optional[str] = None, 
                       patient_id: Optional[str] = None, type: Optional[str] = None, 
@@ -70,34 +83,40 @@ def update_appointment(appointment_id: str, date: Optional[str] = None, time: Op
         "type": type,
         "doctor_id": doctor_id
     }.items() if v is not None}
-    response = supabase.table("appointment").update(updates).eq("appointment_id", appointment_id).execute()
-    return handle_error(response)[0]
+    response = _execute(supabase.table("appointment").update(updates).eq("appointment_id", appointment_id))
+    appointment = handle_error(response)[0]
+    invalidate_appointment(appointment_id)
+    slot_index.record(appointment)
+    return appointment
 
 def delete_appointment(appointment_id: str) -> Dict:
     """Delete an appointment by ID."""
     supabase = get_supabase_client()
-    response = supabase.table("appointment").delete().eq("appointment_id", appointment_id).execute()
-    return handle_error(response)
+    response = _execute(supabase.table("appointment").delete().eq("appointment_id", appointment_id))
+    deleted = handle_error(response)
+    invalidate_appointment(appointment_id)
+    slot_index.remove(appointment_id)
+    return deleted
 
 # 3. Conversation CRUD Operations
 def create_conversation(doctor_id: str, patient_id: str, appointment_id: str, text: str, summary: str) -> Dict:
     """Create a new conversation."""
     supabase = get_supabase_client()
     conversation_id = str(uuid.uuid4())
-    response = supabase.table("conversation").insert({
+    response = _execute(supabase.table("conversation").insert({
         "conversation_id": conversation_id,
         "doctor_id": doctor_id,
         "patient_id": patient_id,
         "appointment_id": appointment_id,
         "text": text,
         "summary": summary
-    }).execute()
+    }))
     return handle_error(response)[0]
 
 def read_conversation(conversation_id: str) -> Optional[Dict]:
     """Read a specific conversation by ID."""
     supabase = get_supabase_client()
-    response = supabase.table("conversation").select("*").eq("conversation_id", conversation_id).execute()
+    response = _execute(supabase.table("conversation").select("*").eq("conversation_id", conversation_id))
     data = handle_error(response)
     return data[0] if data else None
 
@@ -113,13 +132,13 @@ def update_conversation(conversation_id: str, doctor_id: Optional[str] = None, p
         "text": text,
         "summary": summary
     }.items() if v is not None}
-    response = supabase.table("conversation").update(updates).eq("conversation_id", conversation_id).execute()
+    response = _execute(supabase.table("conversation").update(updates).eq("conversation_id", conversation_id))
     return handle_error(response)[0]
 
 def delete_conversation(conversation_id: str) -> Dict:
     """Delete a conversation by ID."""
     supabase = get_supabase_client()
-    response = supabase.table("conversation").delete().eq("conversation_id", conversation_id).execute()
+    response = _execute(supabase.table("conversation").delete().eq("conversation_id", conversation_id))
     return handle_error(response)
 
 # 4. Patient CRUD Operations
@@ -127,21 +146,27 @@ def create_patient(name: str, contact: str, medical_history: str, previous_proce
     """Create a new patient."""
     supabase = get_supabase_client()
     patient_id = str(uuid.uuid4())
-    response = supabase.table("patient").insert({
+    response = _execute(supabase.table("patient").insert({
         "id": patient_id,
         "name": name,
         "contact": contact,
         "medical_history": medical_history,
         "previous_procedures": previous_procedures
-    }).execute()
+    }))
     return handle_error(response)[0]
 
 def read_patient(patient_id: str) -> Optional[Dict]:
     """Read a specific patient by ID."""
+    found, patient = patient_cache.get(patient_id)
+    if found:
+        return patient
     supabase = get_supabase_client()
-    response = supabase.table("patient").select("*").eq("id", patient_id).execute()
+    response = _execute(supabase.table("patient").select("*").eq("id", patient_id))
     data = handle_error(response)
-    return data[0] if data else None
+    if not data:
+        return None
+    patient_cache.set(patient_id, data[0])
+    return data[0]
 
 def update_patient(patient_id: str, name: Optional[str] = None, contact: Optional[str] = None, 
                    medical_history: Optional[str] = None, previous_procedures: Optional[str] = None) -> Dict:
@@ -153,14 +178,18 @@ def update_patient(patient_id: str, name: Optional[str] = None, contact: Optiona
         "medical_history": medical_history,
         "previous_procedures": previous_procedures
     }.items() if v is not None}
-    response = supabase.table("patient").update(updates).eq("id", patient_id).execute()
-    return handle_error(response)[0]
+    response = _execute(supabase.table("patient").update(updates).eq("id", patient_id))
+    patient = handle_error(response)[0]
+    patient_cache.invalidate(patient_id)
+    return patient
 
 def delete_patient(patient_id: str) -> Dict:
     """Delete a patient by ID."""
     supabase = get_supabase_client()
-    response = supabase.table("patient").delete().eq("id", patient_id).execute()
-    return handle_error(response)
+    response = _execute(supabase.table("patient").delete().eq("id", patient_id))
+    deleted = handle_error(response)
+    patient_cache.invalidate(patient_id)
+    return deleted
 
 def get_doctor_appointments_by_date(doctor_id: str, date: str) -> List[Dict]:
     """
@@ -171,13 +200,17 @@ def get_doctor_appointments_by_date(doctor_id: str, date: str) -> List[Dict]:
         doctor_id (str): The ID of the doctor
         date (str): The date in format 'YYYY-MM-DD'
     """
+    found, appointments = doctor_day_cache.get((doctor_id, date))
+    if found:
+        return appointments
     supabase = get_supabase_client()
-    response = supabase.table("appointment") \
-        .select("*") \
-        .eq("doctor_id", doctor_id) \
-        .eq("date", date) \
-        .execute()
-    return handle_error(response)
+    response = _execute(supabase.table("appointment")
+                        .select("*")
+                        .eq("doctor_id", doctor_id)
+                        .eq("date", date))
+    appointments = handle_error(response)
+    doctor_day_cache.set((doctor_id, date), appointments)
+    return appointments
 
 def get_doctor_appointment_times(doctor_id: str, date: str) -> List[str]:
     """
@@ -188,17 +221,10 @@ def get_doctor_appointment_times(doctor_id: str, date: str) -> List[str]:
         doctor_id (str): The ID of the doctor
         date (str): The date in format 'YYYY-MM-DD'
     """
-    supabase = get_supabase_client()
-    response = supabase.table("appointment") \
-        .select("time") \
-        .eq("doctor_id", doctor_id) \
-        .eq("date", date) \
-        .execute()
-    
-    data = handle_error(response)
-    all_times = set(["9:00", "9:30", "10:00", "10:30", "11:00", "11:30", "12:00", "12:30", "13:00", "13:30", "14:00", "14:30", "15:00", "15:30", "16:00", "16:30", "17:00", "17:30", "18:00", "18:30"])
+    data = get_doctor_appointments_by_date(doctor_id, date)
+    booked = set([appointment["time"] for appointment in data])
     
-    return list(all_times - set([appointment["time"] for appointment in data]))
+    return [time for time in APPOINTMENT_TIMES if time not in booked]
 
 # Example usage
 if __name__ == "__main__":
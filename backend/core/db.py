@@ -0,0 +1,164 @@
+import asyncio
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+import httpx
+from dotenv import load_dotenv
+from postgrest.utils import AsyncClient as AsyncSession, SyncClient
+from supabase import acreate_client, create_client, AsyncClient, Client
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Connection pool configuration (overridable through the environment)
+POOL_MAX_CONNECTIONS = int(os.getenv("SUPABASE_POOL_MAX_CONNECTIONS", "20"))
+POOL_MAX_KEEPALIVE = int(os.getenv("SUPABASE_POOL_MAX_KEEPALIVE", "10"))
+POOL_KEEPALIVE_EXPIRY = float(os.getenv("SUPABASE_POOL_KEEPALIVE_EXPIRY", "30"))
+REQUEST_TIMEOUT = float(os.getenv("SUPABASE_TIMEOUT", "10"))
+USE_HTTP2 = os.getenv("SUPABASE_HTTP2", "true").lower() in ("1", "true", "yes")
+
+_client: Optional[Client] = None
+_transport: Optional[httpx.HTTPTransport] = None
+_lock = threading.Lock()
+
+_async_client: Optional[AsyncClient] = None
+_async_transport: Optional[httpx.AsyncHTTPTransport] = None
+_async_lock = asyncio.Lock()
+
+
+def _pool_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=POOL_MAX_CONNECTIONS,
+        max_keepalive_connections=POOL_MAX_KEEPALIVE,
+        keepalive_expiry=POOL_KEEPALIVE_EXPIRY,
+    )
+
+
+def _credentials():
+    url = os.getenv("SUPABASE_URL")
+    key = os.getenv("SUPABASE_KEY")
+    if not url or not key:
+        raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set in .env file")
+    return url, key
+
+
+def _create_pooled_client() -> Client:
+    """Create a Supabase client whose PostgREST session uses a keep-alive pool."""
+    global _transport
+    client = create_client(*_credentials())
+
+    # Swap the default PostgREST session for one backed by our own transport so
+    # connections are reused across requests and the pool can be inspected.
+    default_session = client.postgrest.session
+    _transport = httpx.HTTPTransport(limits=_pool_limits(), http2=USE_HTTP2)
+    client.postgrest.session = SyncClient(
+        base_url=default_session.base_url,
+        headers=default_session.headers,
+        timeout=REQUEST_TIMEOUT,
+        follow_redirects=True,
+        transport=_transport,
+    )
+    default_session.close()
+    return client
+
+
+def get_supabase_client() -> Client:
+    """Return the process-wide Supabase client, creating it on first use."""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = _create_pooled_client()
+    return _client
+
+
+def close_supabase_client() -> None:
+    """Close the shared client and release every pooled connection."""
+    global _client, _transport
+    with _lock:
+        if _client is not None:
+            _client.postgrest.session.close()
+        _client = None
+        _transport = None
+
+
+async def _create_pooled_async_client() -> AsyncClient:
+    """Create an async Supabase client backed by a non-blocking keep-alive pool."""
+    global _async_transport
+    client = await acreate_client(*_credentials())
+
+    default_session = client.postgrest.session
+    _async_transport = httpx.AsyncHTTPTransport(limits=_pool_limits(), http2=USE_HTTP2)
+    client.postgrest.session = AsyncSession(
+        base_url=default_session.base_url,
+        headers=default_session.headers,
+        timeout=REQUEST_TIMEOUT,
+        follow_redirects=True,
+        transport=_async_transport,
+    )
+    await default_session.aclose()
+    return client
+
+
+async def get_async_supabase_client() -> AsyncClient:
+    """Return the process-wide async Supabase client, creating it on first use."""
+    global _async_client
+    if _async_client is None:
+        async with _async_lock:
+            if _async_client is None:
+                _async_client = await _create_pooled_async_client()
+    return _async_client
+
+
+async def close_async_supabase_client() -> None:
+    """Close the shared async client and release its pooled connections."""
+    global _async_client, _async_transport
+    async with _async_lock:
+        if _async_client is not None:
+            await _async_client.postgrest.session.aclose()
+        _async_client = None
+        _async_transport = None
+
+
+def _connection_counts(transport) -> Dict:
+    if transport is None:
+        return {"open": 0, "idle": 0, "in_use": 0}
+    # httpx does not expose pool metrics, so read them from the httpcore pool.
+    connections = [c for c in transport._pool.connections if not c.is_closed()]
+    idle = sum(1 for c in connections if c.is_idle())
+    return {"open": len(connections), "idle": idle, "in_use": len(connections) - idle}
+
+
+def get_pool_stats() -> Dict:
+    """
+    Report the state of the Supabase connection pools.
+
+    Returns:
+        dict: Configured limits plus open, idle and in-use connection counts
+              for the sync and async clients
+    """
+    return {
+        "max_connections": POOL_MAX_CONNECTIONS,
+        "max_keepalive_connections": POOL_MAX_KEEPALIVE,
+        "keepalive_expiry": POOL_KEEPALIVE_EXPIRY,
+        "sync": _connection_counts(_transport),
+        "async": _connection_counts(_async_transport),
+    }
+
+
+async def check_health() -> Dict:
+    """
+    Run a lightweight query against Supabase through the shared async pool.
+
+    Returns:
+        dict: Health status and the round-trip latency in milliseconds
+    """
+    start = time.perf_counter()
+    try:
+        client = await get_async_supabase_client()
+        await client.table("doctor").select("*").limit(1).execute()
+    except Exception as e:
+        return {"status": "error", "detail": str(e)}
+    return {"status": "ok", "latency_ms": round((time.perf_counter() - start) * 1000, 2)}
@@ -0,0 +1,314 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import os
+import random
+import time
+from collections import deque
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+import httpx
+
+from core.telemetry import Gauge, add_collector, record
+
+# Lower numbers are admitted first
+INTERACTIVE = 0
+BACKGROUND = 1
+LANE_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+# Limits default to the providers' published free-tier quotas; 0 disables a rate limit
+WATSONX_MAX_CONCURRENCY = int(os.getenv("WATSONX_MAX_CONCURRENCY", "4"))
+WATSONX_REQUESTS_PER_MINUTE = float(os.getenv("WATSONX_REQUESTS_PER_MINUTE", "120"))
+WATSONX_TOKENS_PER_MINUTE = float(os.getenv("WATSONX_TOKENS_PER_MINUTE", "0"))
+GROQ_MAX_CONCURRENCY = int(os.getenv("GROQ_MAX_CONCURRENCY", "4"))
+GROQ_REQUESTS_PER_MINUTE = float(os.getenv("GROQ_REQUESTS_PER_MINUTE", "20"))
+# Retries after a 429, 5xx or connection failure, with jittered exponential backoff between them
+UPSTREAM_MAX_RETRIES = int(os.getenv("UPSTREAM_MAX_RETRIES", "4"))
+UPSTREAM_BACKOFF_BASE = float(os.getenv("UPSTREAM_BACKOFF_BASE_SECONDS", "0.5"))
+UPSTREAM_BACKOFF_MAX = float(os.getenv("UPSTREAM_BACKOFF_MAX_SECONDS", "20"))
+# A Retry-After longer than this fails the call instead of holding the request open
+UPSTREAM_MAX_RETRY_AFTER = float(os.getenv("UPSTREAM_MAX_RETRY_AFTER_SECONDS", "60"))
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+# Wait times kept per lane for the percentiles in stats()
+WAIT_SAMPLES = 1000
+
+T = TypeVar("T")
+
+_lane: contextvars.ContextVar = contextvars.ContextVar("upstream_lane", default=INTERACTIVE)
+
+
+@contextmanager
+def lane(priority: int):
+    """Run upstream calls made inside the block (and tasks started from it) in the given lane."""
+    token = _lane.set(priority)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+
+def current_lane() -> int:
+    """The lane upstream calls made here would queue in."""
+    return _lane.get()
+
+
+def _retry_after(headers) -> Optional[float]:
+    value = headers.get("retry-after") if headers else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def inspect_error(error: BaseException) -> Tuple[Optional[int], Optional[float], bool]:
+    """
+    Find the HTTP status and Retry-After behind an upstream error.
+
+    Errors from beeai wrap the litellm or httpx exception that caused them, so
+    the whole cause chain is searched.
+
+    Returns:
+        tuple: (status or None, Retry-After seconds or None, whether the call may be retried)
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        response = getattr(error, "response", None)
+        status = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+        if isinstance(status, int):
+            headers = getattr(error, "headers", None) or getattr(response, "headers", None)
+            return status, _retry_after(headers), status in RETRYABLE_STATUS
+        if isinstance(error, (httpx.TransportError, asyncio.TimeoutError)):
+            return None, None, True
+        error = error.__cause__ or error.__context__
+    return None, None, False
+
+
+class TokenBucket:
+    """Allows `per_minute` units a minute, with bursts of up to a minute's worth."""
+
+    def __init__(self, per_minute: float):
+        self.per_minute = per_minute
+        self.level = per_minute
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.per_minute, self.level + (now - self._updated) * self.per_minute / 60)
+        self._updated = now
+
+    def delay(self, amount: float) -> float:
+        """Seconds until `amount` units are available; 0 when the limit is disabled."""
+        if self.per_minute <= 0:
+            return 0.0
+        self._refill()
+        # A single request larger than the bucket only has to wait for a full one
+        missing = min(amount, self.per_minute) - self.level
+        return max(0.0, missing * 60 / self.per_minute)
+
+    def take(self, amount: float) -> None:
+        """Spend `amount` units; the level may go negative to record usage beyond an estimate."""
+        if self.per_minute > 0:
+            self._refill()
+            self.level -= amount
+
+
+class ProviderGovernor:
+    """
+    Admission control for every outbound call to one provider.
+
+    Calls wait for a concurrency slot and for room in the requests/min and
+    tokens/min buckets; waiting calls are admitted by lane, then in arrival
+    order. Failed calls are retried with jittered exponential backoff, or after
+    the provider's Retry-After. A 429 also pauses the whole provider for the
+    Retry-After period and halves the concurrency limit, which then grows back
+    by one slot per limit's worth of successful calls.
+    """
+
+    def __init__(self, name: str, max_concurrency: int, requests_per_minute: float = 0,
+                 tokens_per_minute: float = 0):
+        self.name = name
+        self.max_concurrency = max(1, max_concurrency)
+        self.limit = float(self.max_concurrency)
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.in_flight = 0
+        self._paused_until = 0.0
+        self._waiting = []
+        self._order = itertools.count()
+        self._waits = {priority: deque(maxlen=WAIT_SAMPLES) for priority in LANE_NAMES}
+        self.calls = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.failures = 0
+
+    def _wake_next(self) -> None:
+        if self._waiting:
+            future = self._waiting[0][2]
+            if future is not None and not future.done():
+                future.set_result(None)
+
+    async def acquire(self, tokens: int = 0) -> None:
+        """Wait for a slot and rate-limit budget for one call in the current lane."""
+        priority = _lane.get()
+        entry = [priority, next(self._order), None]
+        heapq.heappush(self._waiting, entry)
+        started = time.monotonic()
+        try:
+            while True:
+                timeout = None
+                if self._waiting[0] is entry and self.in_flight < int(self.limit):
+                    timeout = max(self.requests.delay(1), self.tokens.delay(tokens),
+                                  self._paused_until - time.monotonic())
+                    if timeout <= 0:
+                        break
+                entry[2] = asyncio.get_running_loop().create_future()
+                try:
+                    await asyncio.wait_for(entry[2], timeout)
+                except asyncio.TimeoutError:
+                    pass
+                entry[2] = None
+        except BaseException:
+            self._waiting.remove(entry)
+            heapq.heapify(self._waiting)
+            self._wake_next()
+            raise
+        heapq.heappop(self._waiting)
+        self.requests.take(1)
+        self.tokens.take(tokens)
+        self.in_flight += 1
+        self.calls += 1
+        waited = time.monotonic() - started
+        self._waits[priority].append(waited)
+        record(f"{self.name}-queue", waited)
+        self._wake_next()
+
+    def release(self, succeeded: bool = True, status: Optional[int] = None,
+                retry_after: Optional[float] = None) -> None:
+        """Return a slot, adapting the concurrency limit to how the call ended."""
+        self.in_flight -= 1
+        if status == 429:
+            self.rate_limited += 1
+            self.limit = max(1.0, self.limit / 2)
+            pause = retry_after if retry_after is not None else UPSTREAM_BACKOFF_BASE
+            self._paused_until = max(self._paused_until, time.monotonic() + min(pause, UPSTREAM_MAX_RETRY_AFTER))
+        elif succeeded:
+            self.limit = min(float(self.max_concurrency), self.limit + 1 / self.limit)
+        self._wake_next()
+
+    def charge(self, tokens: int) -> None:
+        """Count tokens only known after a call (e.g. the generated text) against tokens/min."""
+        self.tokens.take(tokens)
+
+    async def call(self, attempt: Callable[[], Awaitable[T]], tokens: int = 0,
+                   retries: int = UPSTREAM_MAX_RETRIES, can_retry: Optional[Callable[[], bool]] = None) -> T:
+        """
+        Run `attempt()` under this provider's limits, retrying transient failures.
+
+        Args:
+            attempt: Makes one upstream call; invoked again for each retry
+            tokens (int): Estimated tokens the call consumes, for tokens/min
+            retries (int): Retries allowed; pass 0 when the request body cannot be replayed
+            can_retry: Optional check run before retrying, e.g. that nothing was streamed yet
+        """
+        for number in itertools.count():
+            await self.acquire(tokens)
+            try:
+                result = await attempt()
+            except Exception as e:
+                status, retry_after, retryable = inspect_error(e)
+                self.release(False, status, retry_after)
+                delay = retry_after if retry_after is not None else \
+                    random.uniform(0, min(UPSTREAM_BACKOFF_MAX, UPSTREAM_BACKOFF_BASE * 2 ** number))
+                if (not retryable or number >= retries or delay > UPSTREAM_MAX_RETRY_AFTER
+                        or (can_retry is not None and not can_retry())):
+                    self.failures += 1
+                    raise
+                self.retries += 1
+                print(f"{self.name} call failed ({status or type(e).__name__}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                self.release(False)
+                raise
+            self.release()
+            return result
+
+    def stats(self) -> Dict:
+        waits = {}
+        for priority, samples in self._waits.items():
+            ordered = sorted(samples)
+            waits[LANE_NAMES[priority]] = {
+                "queued": sum(1 for entry in self._waiting if entry[0] == priority),
+                "wait_p50": round(ordered[len(ordered) // 2], 3) if ordered else 0.0,
+                "wait_p95": round(ordered[int(len(ordered) * 0.95)], 3) if ordered else 0.0,
+                "wait_max": round(ordered[-1], 3) if ordered else 0.0,
+            }
+        return {
+            "in_flight": self.in_flight,
+            "concurrency_limit": int(self.limit),
+            "max_concurrency": self.max_concurrency,
+            "paused_for": round(max(0.0, self._paused_until - time.monotonic()), 2),
+            "calls": self.calls,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "failures": self.failures,
+            "lanes": waits,
+        }
+
+
+watsonx = ProviderGovernor("watsonx", WATSONX_MAX_CONCURRENCY, WATSONX_REQUESTS_PER_MINUTE,
+                           WATSONX_TOKENS_PER_MINUTE)
+groq = ProviderGovernor("groq", GROQ_MAX_CONCURRENCY, GROQ_REQUESTS_PER_MINUTE)
+_governors: Dict[str, ProviderGovernor] = {"watsonx": watsonx, "groq": groq}
+
+
+def governor_for(provider: str) -> ProviderGovernor:
+    """
+    Return the governor shared by every call to `provider`, creating it on first use.
+
+    Providers other than watsonx and Groq read <PROVIDER>_MAX_CONCURRENCY,
+    <PROVIDER>_REQUESTS_PER_MINUTE and <PROVIDER>_TOKENS_PER_MINUTE, with no
+    rate limit by default.
+    """
+    if provider not in _governors:
+        prefix = provider.upper()
+        _governors[provider] = ProviderGovernor(
+            provider,
+            int(os.getenv(f"{prefix}_MAX_CONCURRENCY", "4")),
+            float(os.getenv(f"{prefix}_REQUESTS_PER_MINUTE", "0")),
+            float(os.getenv(f"{prefix}_TOKENS_PER_MINUTE", "0")),
+        )
+    return _governors[provider]
+
+
+def get_governor_stats() -> Dict[str, Dict]:
+    """Queue depth, wait times and retry counts for each upstream provider."""
+    return {name: governor.stats() for name, governor in _governors.items()}
+
+
+queued_gauge = Gauge("mediscribe_upstream_queued", "Calls waiting for an upstream slot or rate limit",
+                     ("upstream", "lane"))
+limit_gauge = Gauge("mediscribe_upstream_concurrency_limit", "Current adaptive concurrency limit", ("upstream",))
+retries_gauge = Gauge("mediscribe_upstream_retries", "Upstream calls retried since startup", ("upstream",))
+
+
+def _collect() -> None:
+    for name, governor in _governors.items():
+        limit_gauge.set(int(governor.limit), upstream=name)
+        retries_gauge.set(governor.retries, upstream=name)
+        for priority, lane_name in LANE_NAMES.items():
+            queued = sum(1 for entry in governor._waiting if entry[0] == priority)
+            queued_gauge.set(queued, upstream=name, lane=lane_name)
+
+
+add_collector(_collect)
@@ -0,0 +1,393 @@
+import asyncio
+import json
+import os
+import socket
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from typing import AsyncIterator, Dict, List, Optional
+
+import aiofiles
+
+from core import llm
+from core.audio import can_segment
+from core.governor import BACKGROUND, lane
+from core.llm_cache import CACHE_USE
+from core.transcribe import FILE_CHUNK_BYTES, transcribe_segmented, transcribe_stream
+
+# Job state lives in SQLite so results survive a restart, by default in backend/data. Serverless hosts
+# (Vercel sets VERCEL) only allow writing to /tmp, where jobs last as long as the instance
+_DATA_DIR = (os.path.join(tempfile.gettempdir(), "mediscribe") if os.getenv("VERCEL")
+             else os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data"))
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH") or os.path.join(_DATA_DIR, "jobs.db")
+JOBS_AUDIO_DIR = os.getenv("JOBS_AUDIO_DIR") or os.path.join(_DATA_DIR, "jobs-audio")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# Submissions are refused while this many jobs are waiting
+JOB_MAX_PENDING = int(os.getenv("JOB_MAX_PENDING", "100"))
+# A job interrupted by a restart this many times is failed instead of retried
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# Finished jobs are deleted after this many seconds
+JOB_RETENTION = float(os.getenv("JOB_RETENTION_SECONDS", str(7 * 24 * 3600)))
+# A process renews the lease on the jobs it runs every third of this; a job whose lease has run out
+# belongs to a process that died, and is taken over by another
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+TRANSCRIPTION = "transcription"
+SUMMARY = "summary"
+SOAP_NOTE = "soap_note"
+REFERRAL_LETTER = "referral_letter"
+# Steps always run in this order; each step after transcription reads its transcript
+STEP_ORDER = (TRANSCRIPTION, SUMMARY, SOAP_NOTE, REFERRAL_LETTER)
+
+
+class QueueFull(Exception):
+    """Raised when too many jobs are already waiting."""
+
+
+class JobStore:
+    """
+    SQLite table of jobs: their parameters, progress and per-step results.
+
+    Several processes can share the table (uvicorn workers, or the old and new
+    process during a restart). A running job is leased to the process running
+    it (`owner`, until `lease_expires`), and only that process may update it.
+    """
+
+    def __init__(self, path: str = JOBS_DB_PATH):
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS job ("
+            "id TEXT PRIMARY KEY, status TEXT NOT NULL, stage TEXT, steps TEXT NOT NULL, params TEXT NOT NULL, "
+            "results TEXT NOT NULL DEFAULT '{}', error TEXT, audio_path TEXT, attempts INTEGER NOT NULL DEFAULT 0, "
+            "created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS job_status ON job (status, created_at)")
+        columns = {row["name"] for row in self._db.execute("PRAGMA table_info(job)")}
+        # Tables created before jobs were leased
+        if "owner" not in columns:
+            self._db.execute("ALTER TABLE job ADD COLUMN owner TEXT")
+            self._db.execute("ALTER TABLE job ADD COLUMN lease_expires REAL")
+        self._db.commit()
+
+    @staticmethod
+    def _row(row: Optional[sqlite3.Row]) -> Optional[Dict]:
+        if row is None:
+            return None
+        job = dict(row)
+        for column in ("steps", "params", "results"):
+            job[column] = json.loads(job[column])
+        return job
+
+    def create(self, steps: List[str], params: Dict, audio_path: Optional[str] = None,
+               job_id: Optional[str] = None) -> Dict:
+        now = time.time()
+        job_id = job_id or uuid.uuid4().hex
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO job (id, status, steps, params, audio_path, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, QUEUED, json.dumps(steps), json.dumps(params), audio_path, now, now),
+            )
+            self._db.commit()
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            return self._row(self._db.execute("SELECT * FROM job WHERE id = ?", (job_id,)).fetchone())
+
+    def update(self, job_id: str, lease_owner: Optional[str] = None, **fields) -> bool:
+        """Change a job's columns; with `lease_owner`, only while that process holds its lease. Returns whether it did."""
+        for column in ("steps", "params", "results"):
+            if column in fields:
+                fields[column] = json.dumps(fields[column])
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        where, values = ("id = ? AND owner = ?", (job_id, lease_owner)) if lease_owner else ("id = ?", (job_id,))
+        with self._lock:
+            updated = self._db.execute(f"UPDATE job SET {assignments} WHERE {where}",
+                                       (*fields.values(), *values)).rowcount
+            self._db.commit()
+        return updated > 0
+
+    def count(self, status: str) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM job WHERE status = ?", (status,)).fetchone()[0]
+
+    def claimable(self) -> List[str]:
+        """Ids of jobs waiting to run, including those whose process died mid-run, oldest first."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id FROM job WHERE status = ? OR (status = ? AND COALESCE(lease_expires, 0) < ?) "
+                "ORDER BY created_at", (QUEUED, RUNNING, time.time())
+            ).fetchall()
+        return [row["id"] for row in rows]
+
+    def claim(self, job_id: str, owner: str, lease: float) -> Optional[Dict]:
+        """
+        Lease a queued job, or a running one whose lease has run out, to `owner`.
+
+        The check and the update are one statement, so when several processes
+        try to claim the same job only one of them gets it.
+
+        Returns:
+            dict: The job as it was before the claim, or None if it was not claimable
+        """
+        now = time.time()
+        with self._lock:
+            job = self._row(self._db.execute("SELECT * FROM job WHERE id = ?", (job_id,)).fetchone())
+            claimed = job is not None and self._db.execute(
+                "UPDATE job SET status = ?, owner = ?, lease_expires = ?, attempts = attempts + 1, updated_at = ? "
+                "WHERE id = ? AND (status = ? OR (status = ? AND COALESCE(lease_expires, 0) < ?))",
+                (RUNNING, owner, now + lease, now, job_id, QUEUED, RUNNING, now),
+            ).rowcount > 0
+            self._db.commit()
+        return job if claimed else None
+
+    def renew(self, owner: str, job_ids: List[str], lease: float) -> None:
+        """Extend `owner`'s lease on the given jobs."""
+        with self._lock:
+            self._db.executemany("UPDATE job SET lease_expires = ? WHERE id = ? AND owner = ? AND status = ?",
+                                 [(time.time() + lease, job_id, owner, RUNNING) for job_id in job_ids])
+            self._db.commit()
+
+    def release(self, owner: str) -> None:
+        """End `owner`'s leases now, so another process can resume its jobs without waiting for them to expire."""
+        with self._lock:
+            self._db.execute("UPDATE job SET lease_expires = 0 WHERE owner = ? AND status = ?", (owner, RUNNING))
+            self._db.commit()
+
+    def purge(self, older_than: float) -> int:
+        with self._lock:
+            deleted = self._db.execute(
+                "DELETE FROM job WHERE status IN (?, ?) AND updated_at < ?", (SUCCEEDED, FAILED, older_than)
+            ).rowcount
+            self._db.commit()
+        return deleted
+
+
+def public_job(job: Dict) -> Dict:
+    """The job as returned by the API, without internal columns."""
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "stage": job["stage"],
+        "steps": job["steps"],
+        "completed_steps": [step for step in job["steps"] if step in job["results"]],
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+    }
+
+
+async def _file_chunks(path: str) -> AsyncIterator[bytes]:
+    async with aiofiles.open(path, "rb") as file:
+        while chunk := await file.read(FILE_CHUNK_BYTES):
+            yield chunk
+
+
+async def _run_step(step: str, job: Dict) -> object:
+    params, results = job["params"], job["results"]
+    cache = params.get("cache", CACHE_USE)
+    if step == TRANSCRIPTION:
+        content_type = params["content_type"]
+        chunks = _file_chunks(job["audio_path"])
+        if params.get("segmented") and can_segment(content_type):
+            result = await transcribe_segmented(content_type, chunks, cache=cache)
+        else:
+            result = await transcribe_stream(params["filename"], content_type, chunks, cache)
+        return {"text": result["text"], "segments": result["segments"]}
+
+    text = results[TRANSCRIPTION]["text"] if TRANSCRIPTION in results else params["text"]
+    if step == SUMMARY:
+        return await llm.get_transcription_summary(text, cache)
+    if step == SOAP_NOTE:
+        return await llm.get_medical_soap_note(text, params["doctor_notes"], params["patient_information"], cache)
+    return await llm.get_medical_referral_letter(text, params["doctor_notes"], params["patient_information"], cache)
+
+
+class JobQueue:
+    """
+    In-process queue of pipeline jobs executed by a fixed number of workers.
+
+    Job state is written to the JobStore after every step, so a job interrupted
+    by a restart resumes from its first unfinished step. A job is claimed
+    before it runs and its lease renewed while it does, so processes sharing
+    the store never run the same job at once; jobs whose process died are
+    picked up once their lease runs out. Progress is announced through
+    `wait_for_change` for Server-Sent Events.
+    """
+
+    def __init__(self, store: Optional[JobStore] = None, workers: int = JOB_WORKERS,
+                 lease: float = JOB_LEASE_SECONDS):
+        # Opened by start() unless given, so importing the app does not create the database
+        self.store = store
+        self.workers = workers
+        self.lease = lease
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._queue: Optional[asyncio.Queue] = None
+        # Ids in the local queue, so a job found again while waiting is not queued twice
+        self._queued = set()
+        # Ids of the jobs the workers are running, whose leases are renewed
+        self._running = set()
+        self._tasks: List[asyncio.Task] = []
+        self._changed: Optional[asyncio.Condition] = None
+        # Incremented on every state change, so waiters cannot miss one that happens before they wait
+        self.version = 0
+
+    async def start(self) -> None:
+        """Open the store, start the workers and queue jobs left over from a previous run."""
+        if self.store is None:
+            self.store = await asyncio.to_thread(JobStore)
+        self._queue = asyncio.Queue()
+        self._queued = set()
+        self._changed = asyncio.Condition()
+        purged = await asyncio.to_thread(self.store.purge, time.time() - JOB_RETENTION)
+        if purged:
+            print(f"Deleted {purged} expired jobs")
+        await self._enqueue_claimable()
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._keep_leases()))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # Interrupted jobs can be resumed by another process straight away
+        if self.store is not None:
+            await asyncio.to_thread(self.store.release, self.owner)
+
+    def _enqueue(self, job_id: str) -> None:
+        if job_id not in self._queued:
+            self._queued.add(job_id)
+            self._queue.put_nowait(job_id)
+
+    async def _enqueue_claimable(self) -> None:
+        for job_id in await asyncio.to_thread(self.store.claimable):
+            self._enqueue(job_id)
+
+    async def _keep_leases(self) -> None:
+        # Renew this process's leases and take over jobs whose process stopped renewing them
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            try:
+                await asyncio.to_thread(self.store.renew, self.owner, list(self._running), self.lease)
+                await self._enqueue_claimable()
+            except Exception as e:
+                print(f"Renewing job leases failed: {e}")
+
+    async def submit(self, steps: List[str], params: Dict, audio_path: Optional[str] = None,
+                     job_id: Optional[str] = None) -> Dict:
+        """
+        Queue a job running `steps` (in STEP_ORDER) and return it immediately.
+
+        Raises:
+            QueueFull: If JOB_MAX_PENDING jobs are already queued
+        """
+        if self._queue is None:
+            raise RuntimeError("Job queue is not running")
+        if await asyncio.to_thread(self.store.count, QUEUED) >= JOB_MAX_PENDING:
+            raise QueueFull(f"{JOB_MAX_PENDING} jobs are already waiting")
+        ordered = [step for step in STEP_ORDER if step in steps]
+        job = await asyncio.to_thread(self.store.create, ordered, params, audio_path, job_id)
+        self._enqueue(job["id"])
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict]:
+        if self.store is None:
+            raise RuntimeError("Job queue is not running")
+        return await asyncio.to_thread(self.store.get, job_id)
+
+    async def wait_for_change(self, version: int, timeout: float) -> None:
+        """Wait until a job in this process changes after `version`, or `timeout` seconds pass."""
+        async with self._changed:
+            try:
+                await asyncio.wait_for(self._changed.wait_for(lambda: self.version != version), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _update(self, job_id: str, **fields) -> bool:
+        # Only while this process still holds the job's lease
+        updated = await asyncio.to_thread(self.store.update, job_id, self.owner, **fields)
+        async with self._changed:
+            self.version += 1
+            self._changed.notify_all()
+        return updated
+
+    async def _finish(self, job: Dict, status: str, error: Optional[str] = None) -> None:
+        if not await self._update(job["id"], status=status, stage=None, error=error, owner=None, lease_expires=None):
+            return
+        # The recording is only needed until the job is done
+        if job["audio_path"] and os.path.exists(job["audio_path"]):
+            os.remove(job["audio_path"])
+
+    async def _work(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            self._queued.discard(job_id)
+            try:
+                # Queued work yields to interactive requests for the same upstream capacity
+                with lane(BACKGROUND):
+                    self._running.add(job_id)
+                    await self._run(job_id)
+            except Exception as e:
+                print(f"Job {job_id} crashed: {e}")
+            finally:
+                # A crashed job's lease runs out and it is retried, here or elsewhere
+                self._running.discard(job_id)
+                self._queue.task_done()
+
+    async def _run(self, job_id: str) -> None:
+        # Another process may have claimed or finished it since it was queued here
+        job = await asyncio.to_thread(self.store.claim, job_id, self.owner, self.lease)
+        if job is None:
+            return
+        if job["status"] == RUNNING and job["attempts"] >= JOB_MAX_ATTEMPTS:
+            await self._finish(job, FAILED, "Job was interrupted too many times")
+            return
+        results = job["results"]
+        for step in job["steps"]:
+            if step in results:
+                continue
+            if not await self._update(job_id, stage=step):
+                print(f"Job {job_id} lost its lease; leaving it to the process that took it over")
+                return
+            try:
+                results[step] = await _run_step(step, job)
+            except Exception as e:
+                await self._finish(job, FAILED, f"{step} failed: {e}")
+                return
+            if not await self._update(job_id, results=results):
+                print(f"Job {job_id} lost its lease; leaving it to the process that took it over")
+                return
+        await self._finish(job, SUCCEEDED)
+
+
+job_queue = JobQueue()
+
+
+async def save_audio(chunks: AsyncIterator[bytes], suffix: str) -> str:
+    """Write an uploaded recording to JOBS_AUDIO_DIR for a job to pick up, returning its path."""
+    os.makedirs(JOBS_AUDIO_DIR, exist_ok=True)
+    path = os.path.join(JOBS_AUDIO_DIR, uuid.uuid4().hex + suffix)
+    try:
+        async with aiofiles.open(path, "wb") as file:
+            async for chunk in chunks:
+                await file.write(chunk)
+    except BaseException:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    return path
@@ -1,37 +1,85 @@
-from beeai_framework.backend.chat import ChatModel, ChatModelInput, ChatModelOutput
-from beeai_framework.backend.message import UserMessage
-from beeai_framework.agents.bee import BeeAgent
-from beeai_framework.agents.types import BeeInput, BeeRunInput
-from beeai_framework.memory import UnconstrainedMemory
-from beeai_framework.tools.search.duckduckgo import DuckDuckGoSearchTool
+from typing import TYPE_CHECKING, AsyncIterator, Callable, Dict, List, Optional
 import os
+import threading
+import time
 from dotenv import load_dotenv
 import asyncio
+from core.llm_cache import CACHE_BYPASS, CACHE_USE, cache_key, result_cache
+from core.singleflight import SingleFlight
+from core.summarize import PROMPT_TOKEN_BUDGET, condense_transcript
+from core.tokens import count_tokens
+
+# beeai and litellm take seconds to import, so they are only loaded when the first model is needed
+if TYPE_CHECKING:
+    from beeai_framework.backend.chat import ChatModel
+    from core.model_router import ModelRoute, ModelRouter
 
 WATSONX_API_KEY = os.getenv("WATSONX_API_KEY")
 WATSONX_API_URL = os.getenv("WATSONX_URL")
 WATSONX_PROJECT_ID = os.getenv("WATSONX_PROJECT_ID")
-# Create a ChatModel to interface with ibm/granite-3-8b-instruct from watsonx
-
-model = ChatModel.from_name(
-    "watsonx:ibm/granite-3-8b-instruct",
-    options={
-        "project_id": WATSONX_PROJECT_ID,
-        "api_key": WATSONX_API_KEY,
-        "api_base": WATSONX_API_URL,
-        "stream": False,
-    }
-)
-
-class Result:
-    def __init__(self, text):
-        self.text = text
-
-class SearchResult:
-    def __init__(self, result):
-        self.result = result
-
-
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+# Comma-separated models in order of preference, each "provider:model" with an optional "@base_url",
+# e.g. "watsonx:ibm/granite-3-8b-instruct,ollama:granite3.1-dense:2b"
+LLM_PROVIDERS = [name.strip() for name in os.getenv("LLM_PROVIDERS", "watsonx:ibm/granite-3-8b-instruct").split(",")
+                 if name.strip()]
+# The preferred model, "provider:model"; cached results are keyed by it, and only its answers are stored
+PRIMARY_MODEL = LLM_PROVIDERS[0].partition("@")[0] if LLM_PROVIDERS else ""
+# Load the models in the background at startup; turn off where cold start matters more than the first LLM call
+WARM_UP_LLM = os.getenv("WARM_UP_LLM", "true").lower() in ("1", "true", "yes")
+
+
+def load_model(spec: str) -> "ChatModel":
+    """Create the ChatModel for an LLM_PROVIDERS entry, "provider:model[@base_url]"."""
+    from beeai_framework.backend.chat import ChatModel
+
+    name, _, base_url = spec.partition("@")
+    provider = name.split(":", 1)[0]
+    if provider == "watsonx":
+        options = {"project_id": WATSONX_PROJECT_ID, "api_key": WATSONX_API_KEY, "api_base": WATSONX_API_URL}
+    elif provider == "ollama":
+        options = {"base_url": OLLAMA_BASE_URL}
+    else:
+        options = {}
+    if base_url:
+        options["base_url"] = base_url
+    chat_model = ChatModel.from_name(name, options)
+    if provider == "ollama":
+        # beeai's Ollama adapter nests its settings one level down, where litellm never sees them
+        chat_model.settings = {**chat_model.settings.pop("settings", {}), **chat_model.settings}
+    return chat_model
+
+
+_router: Optional["ModelRouter"] = None
+_router_lock = threading.Lock()
+
+
+def get_router() -> "ModelRouter":
+    """Return the model router, importing the LLM stack and creating the models on first use."""
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                from core.model_router import ModelRouter
+
+                started = time.perf_counter()
+                _router = ModelRouter([load_model(spec) for spec in LLM_PROVIDERS])
+                print(f"LLM stack loaded in {time.perf_counter() - started:.1f}s")
+    return _router
+
+
+async def load_router() -> "ModelRouter":
+    """get_router() for async code; a first load runs on a worker thread so the event loop keeps serving."""
+    if _router is not None:
+        return _router
+    return await asyncio.to_thread(get_router)
+
+
+async def warm_up() -> None:
+    """Load the LLM stack ahead of the first request that needs it."""
+    try:
+        await load_router()
+    except Exception as e:
+        print(f"LLM warm-up failed: {e}")
 
 
 # model = ChatModel.from_name("ollama:granite3.1-dense:2b")
@@ -43,18 +91,140 @@ class SearchResult:
 #     return output.get_text_content()
 
 
+# Bump a template's version whenever its prompt changes so cached results are not reused
+PROMPT_VERSIONS = {
+    "soap_note": "1",
+    "referral_letter": "1",
+    "transcription_summary": "1",
+    "consultation_artifacts": "1",
+    "transcript_chunk": "1",
+}
+
 
-async def get_medical_soap_note(conversation_text: str, doctor_notes: str, patient_information: str) -> str:
+async def generate(prompt: str, on_winner: Optional[Callable[["ModelRoute"], None]] = None) -> str:
     """
-    Convert conversation text into a SOAP note format for medical use cases.
-    
+    Run a single prompt through the model router and return the full response text.
+
+    The response is streamed internally so that a hedged duplicate request can
+    be aborted as soon as one model starts answering. `on_winner` is called
+    with the route that answered.
+    """
+    router = await load_router()
+    return "".join([token async for token in router.stream(prompt, on_winner)])
+
+
+async def stream_generate(prompt: str,
+                          on_winner: Optional[Callable[["ModelRoute"], None]] = None) -> AsyncIterator[str]:
+    """
+    Run a single prompt through the model router and yield text as it is generated.
+
+    Closing the iterator early (e.g. when the HTTP client disconnects) aborts the
+    upstream generation instead of letting it run to completion.
+    """
+    tokens = (await load_router()).stream(prompt, on_winner)
+    try:
+        async for token in tokens:
+            yield token
+    finally:
+        await tokens.aclose()
+
+
+def _result_key(kind: str, inputs: Dict) -> str:
+    return cache_key(PRIMARY_MODEL, kind, PROMPT_VERSIONS[kind], inputs)
+
+
+def _by_primary(winners: List["ModelRoute"]) -> bool:
+    # Results are keyed by the primary model, so an answer from a hedge or failover model is not stored
+    return bool(winners) and winners[0].model is get_router().primary
+
+
+# Identical generations that overlap, e.g. a double-clicked "Generate SOAP note", share one model call
+generations = SingleFlight("llm")
+
+
+async def cached_generate(kind: str, inputs: Dict, prompt: str, cache: str = CACHE_USE) -> str:
+    """
+    Generate text for a prompt template, reusing an earlier result for identical inputs.
+
+    A request identical to one still being generated waits for that
+    generation instead of starting another, unless the cache is bypassed:
+    a bypass asks for a fresh generation, so it always gets its own.
+
     Args:
-        conversation_text (str): The medical conversation/text to be summarized
-        
-    Returns:
-        str: Formatted SOAP note
+        kind (str): Template name, a key of PROMPT_VERSIONS
+        inputs (dict): Values the prompt was built from
+        prompt (str): The rendered prompt
+        cache (str): "use", "refresh" (regenerate and store) or "bypass"
+    """
+    if cache == CACHE_BYPASS:
+        return await generate(prompt)
+    key = _result_key(kind, inputs)
+    return await generations.run((cache, key), lambda: _cached_generate(key, prompt, cache))
+
+
+async def _cached_generate(key: str, prompt: str, cache: str) -> str:
+    if cache == CACHE_USE:
+        cached = await asyncio.to_thread(result_cache.get, key)
+        if cached is not None:
+            return cached
+    winners = []
+    text = await generate(prompt, winners.append)
+    if text and _by_primary(winners):
+        await asyncio.to_thread(result_cache.set, key, text)
+    return text
+
+
+async def cached_stream_generate(kind: str, inputs: Dict, prompt: str, cache: str = CACHE_USE) -> AsyncIterator[str]:
+    """Streaming counterpart of cached_generate; a cache hit is sent as a single chunk."""
+    key = _result_key(kind, inputs)
+    if cache == CACHE_USE:
+        cached = await asyncio.to_thread(result_cache.get, key)
+        if cached is not None:
+            yield cached
+            return
+    winners = []
+    tokens = stream_generate(prompt, winners.append)
+    parts = []
+    try:
+        async for token in tokens:
+            parts.append(token)
+            yield token
+    finally:
+        await tokens.aclose()
+    # Only complete generations reach this point, so partial text is never stored
+    if cache != CACHE_BYPASS and parts and _by_primary(winners):
+        await asyncio.to_thread(result_cache.set, key, "".join(parts))
+
+
+async def fit_prompt(build_prompt: Callable[[str], str], conversation_text: str, cache: str = CACHE_USE) -> str:
     """
-    prompt = f"""Please analyze the following medical conversation and convert it into a SOAP note format.
+    Render a prompt, condensing the transcript first if the prompt would exceed PROMPT_TOKEN_BUDGET.
+
+    Short transcripts take the single-prompt path unchanged. Long ones are
+    map-reduced into a summary that leaves room for the rest of the prompt;
+    the partial summaries are cached, so other documents built from the same
+    transcript reuse them.
+
+    Args:
+        build_prompt (callable): Renders the full prompt from a transcript
+        conversation_text (str): The transcript
+        cache (str): Result cache mode applied to the partial summaries
+    """
+    prompt = build_prompt(conversation_text)
+    if count_tokens(prompt) <= PROMPT_TOKEN_BUDGET:
+        return prompt
+
+    async def summarize_part(part_prompt: str) -> str:
+        return await cached_generate("transcript_chunk", {"prompt": part_prompt}, part_prompt, cache)
+
+    target = max(PROMPT_TOKEN_BUDGET - count_tokens(build_prompt("")), PROMPT_TOKEN_BUDGET // 4)
+    condensed = await condense_transcript(conversation_text, target, summarize_part)
+    return build_prompt(condensed)
+
+
+def soap_note_prompt(conversation_text: str, doctor_notes: str, patient_information: str) -> str:
+    """Build the SOAP note prompt."""
+    return f"""Please analyze the following medical conversation and convert it into a SOAP note format.
     Follow this structure strictly:
     
     Subjective (S): Patient's symptoms, complaints, and relevant history
@@ -67,23 +237,27 @@ async def get_medical_soap_note(conversation_text: str, doctor_notes: str, patie
     
     Format the response maintaining clear SOAP sections."""
 
-    message = UserMessage(content=prompt)
-    output: ChatModelOutput = await model.create(ChatModelInput(messages=[message]))
-    return output.get_text_content()
-
-async def get_medical_referral_letter(conversation_text: str, doctor_notes: str, patient_information: str) -> str:
+async def get_medical_soap_note(conversation_text: str, doctor_notes: str, patient_information: str,
+                                cache: str = CACHE_USE) -> str:
     """
-    Generate a medical referral letter from a doctor to another healthcare provider.
+    Convert conversation text into a SOAP note format for medical use cases.
     
     Args:
-        conversation_text (str): The medical conversation/text to reference
-        doctor_notes (str): Additional notes from the referring doctor
-        patient_information (str): Patient's demographic and medical history
+        conversation_text (str): The medical conversation/text to be summarized
+        cache (str): Result cache mode, "use", "refresh" or "bypass"
         
     Returns:
-        str: Formatted referral letter
+        str: Formatted SOAP note
     """
-    prompt = f"""Please generate a professional medical referral letter using the following information. Add no misinformation. If any information is not available, ignore it.
+    inputs = {"text": conversation_text, "doctor_notes": doctor_notes, "patient_information": patient_information}
+    prompt = await fit_prompt(
+        lambda text: soap_note_prompt(text, doctor_notes, patient_information), conversation_text, cache
+    )
+    return await cached_generate("soap_note", inputs, prompt, cache)
+
+def referral_letter_prompt(conversation_text: str, doctor_notes: str, patient_information: str) -> str:
+    """Build the referral letter prompt."""
+    return f"""Please generate a professional medical referral letter using the following information. Add no misinformation. If any information is not available, ignore it.
     The letter should follow this structure:
 
     [Today's Date]
@@ -120,99 +294,30 @@ async def get_medical_referral_letter(conversation_text: str, doctor_notes: str,
 
     Please maintain a professional and formal tone throughout the letter."""
 
-    message = UserMessage(content=prompt)
-    output: ChatModelOutput = await model.create(ChatModelInput(messages=[message]))
-    return output.get_text_content()
-
-
-async def get_appointment_prerequisites(condition: str) -> str:
+async def get_medical_referral_letter(conversation_text: str, doctor_notes: str, patient_information: str,
+                                      cache: str = CACHE_USE) -> str:
     """
-    Get pre-appointment information and prerequisites based on medical condition.
-    Uses DuckDuckGo search combined with LLM knowledge.
+    Generate a medical referral letter from a doctor to another healthcare provider.
     
     Args:
-        condition (str): Primary medical condition or symptoms
+        conversation_text (str): The medical conversation/text to reference
+        doctor_notes (str): Additional notes from the referring doctor
+        patient_information (str): Patient's demographic and medical history
+        cache (str): Result cache mode, "use", "refresh" or "bypass"
         
     Returns:
-        str: Formatted prerequisites and precautions
+        str: Formatted referral letter
     """
-    # Create initial welcome message if this is the first message
-    if condition.lower() in ["hi", "hello", "hey"]:
-        return """Hello! I'm here to help you prepare for your appointment. 
-        Please tell me about your condition or symptoms, and I'll provide specific 
-        preparation guidelines and prerequisites for your visit."""
-
-    # Setup BeeAgent with search capability
-    agent = BeeAgent(
-        BeeInput(
-            llm=model, 
-            tools=[DuckDuckGoSearchTool()], 
-            memory=UnconstrainedMemory()
-        )
+    inputs = {"text": conversation_text, "doctor_notes": doctor_notes, "patient_information": patient_information}
+    prompt = await fit_prompt(
+        lambda text: referral_letter_prompt(text, doctor_notes, patient_information), conversation_text, cache
     )
-    
-    # Create search query
-    search_prompt = f"""
-    What are the pre-appointment preparations and precautions for a patient with {condition}. Include information about:
-    1. Required fasting or dietary restrictions before the appointment
-    2. Medical tests that might be needed
-    3. Documents or medical history to bring
-    4. Any specific preparations needed
-    """
-    # Get search results
-    flag = True
-    search_result = None
-    try:
-        search_result = await agent.run(BeeRunInput(prompt=search_prompt))
-    except Exception as e:
-        print(f"An error occurred by searching: {e}")
-        flag = False
-    if not flag:
-        # Creating an instance
-        result_obj = Result("No search results found for the given condition.")
-        search_result = SearchResult(result_obj)
-    
-    # Create final prompt combining search results with LLM analysis
-    try :
-        final_prompt = f"""
-        Based on the following search results and your medical knowledge, provide a friendly and clear 
-        response about preparations and precautions for a patient with {condition}
-        before their doctor's appointment.
-
-        Search findings:
-        {search_result.result.text}
-
-        Please format the response in a conversational way, but make sure to cover:
-        1. Any pre-appointment testing requirements
-        2. Dietary restrictions (if any)
-        3. Required documents
-        4. Specific preparations
-        5. Additional precautions
-
-        Make the response friendly and reassuring, but maintain professionalism.
-        Highlight any critical timing requirements (like fasting duration) 
-        and essential items to bring to the appointment. Keep it short and concise.
-        """
-        print(final_prompt)
-        message = UserMessage(content=final_prompt)
-        output: ChatModelOutput = await model.create(ChatModelInput(messages=[message]))
-        return output.get_text_content()
-    except Exception as e:
-        print(f"An error occurred: {e}")
-        return "An error occurred while retrieving the appointment prerequisites. Please try again later."
+    return await cached_generate("referral_letter", inputs, prompt, cache)
 
 
-async def get_transcription_summary(conversation_text) -> str:
-    """
-    Generate a concise summary of a medical conversation or transcription.
-    
-    Args:
-        conversation_text (str): The medical conversation/transcription to be summarized
-        
-    Returns:
-        str: A clear summary highlighting key medical information and discussion points
-    """
-    prompt = f"""Please provide a clear and concise summary of the following medical conversation.
+def transcription_summary_prompt(conversation_text: str) -> str:
+    """Build the transcription summary prompt."""
+    return f"""Please provide a clear and concise summary of the following medical conversation.
     Focus on capturing:
     - Main symptoms or health concerns discussed
     - Key findings or observations mentioned
@@ -224,9 +329,19 @@ async def get_transcription_summary(conversation_text) -> str:
     
     Please provide a structured summary that highlights the most relevant medical information."""
 
-    message = UserMessage(content=prompt)
-    output: ChatModelOutput = await model.create(ChatModelInput(messages=[message]))
-    return output.get_text_content()
+async def get_transcription_summary(conversation_text, cache: str = CACHE_USE) -> str:
+    """
+    Generate a concise summary of a medical conversation or transcription.
+    
+    Args:
+        conversation_text (str): The medical conversation/transcription to be summarized
+        cache (str): Result cache mode, "use", "refresh" or "bypass"
+        
+    Returns:
+        str: A clear summary highlighting key medical information and discussion points
+    """
+    prompt = await fit_prompt(transcription_summary_prompt, conversation_text, cache)
+    return await cached_generate("transcription_summary", {"text": conversation_text}, prompt, cache)
 
 if __name__ == "__main__":
     load_dotenv()
@@ -0,0 +1,154 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+# Cache modes accepted by the generation endpoints
+CACHE_USE = "use"          # read and write the cache
+CACHE_REFRESH = "refresh"  # skip the lookup but store the fresh result
+CACHE_BYPASS = "bypass"    # neither read nor write
+CACHE_MODES = (CACHE_USE, CACHE_REFRESH, CACHE_BYPASS)
+
+MEMORY_MAX_BYTES = int(os.getenv("LLM_CACHE_MEMORY_BYTES", str(32 * 1024 * 1024)))
+# Set LLM_CACHE_PATH to keep results in SQLite across restarts
+DISK_PATH = os.getenv("LLM_CACHE_PATH")
+DISK_MAX_BYTES = int(os.getenv("LLM_CACHE_DISK_BYTES", str(512 * 1024 * 1024)))
+
+
+def cache_key(model_id: str, kind: str, template_version: str, inputs: Dict) -> str:
+    """Hash everything that determines a generation into a stable key."""
+    payload = json.dumps(
+        {"model": model_id, "kind": kind, "template": template_version, "inputs": inputs},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMResultCache:
+    """
+    Two-tier cache of generated text keyed by content hash.
+
+    The memory tier is an LRU bounded by the total size of stored text. The
+    optional SQLite tier survives restarts and is trimmed back under its size
+    budget by dropping the least recently used rows. Results found only on
+    disk are promoted into memory.
+    """
+
+    def __init__(self, memory_max_bytes: int = MEMORY_MAX_BYTES, disk_path: Optional[str] = DISK_PATH,
+                 disk_max_bytes: int = DISK_MAX_BYTES):
+        self.memory_max_bytes = memory_max_bytes
+        self.disk_max_bytes = disk_max_bytes
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        # Running totals of the disk tier, so a write never has to sum the whole table
+        self._disk_entries = 0
+        self._disk_bytes = 0
+        self.hits = {"memory": 0, "disk": 0}
+        self.misses = 0
+        if disk_path:
+            self._db = sqlite3.connect(disk_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_result ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS llm_result_last_used ON llm_result (last_used)")
+            self._db.commit()
+            self._disk_entries, self._disk_bytes = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_result").fetchone()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                self.hits["memory"] += 1
+                return value
+            if self._db is not None:
+                row = self._db.execute("SELECT value FROM llm_result WHERE key = ?", (key,)).fetchone()
+                if row:
+                    self._db.execute("UPDATE llm_result SET last_used = ? WHERE key = ?", (time.time(), key))
+                    self._db.commit()
+                    self._remember(key, row[0])
+                    self.hits["disk"] += 1
+                    return row[0]
+            self.misses += 1
+            return None
+
+    def set(self, key: str, value: str) -> None:
+        with self._lock:
+            self._remember(key, value)
+            if self._db is not None:
+                size = len(value.encode("utf-8"))
+                replaced = self._db.execute("SELECT size FROM llm_result WHERE key = ?", (key,)).fetchone()
+                self._db.execute(
+                    "INSERT OR REPLACE INTO llm_result (key, value, size, last_used) VALUES (?, ?, ?, ?)",
+                    (key, value, size, time.time()),
+                )
+                if replaced:
+                    self._disk_bytes -= replaced[0]
+                else:
+                    self._disk_entries += 1
+                self._disk_bytes += size
+                self._trim_disk()
+                self._db.commit()
+
+    def _remember(self, key: str, value: str) -> None:
+        size = len(value.encode("utf-8"))
+        if size > self.memory_max_bytes:
+            return
+        if key in self._memory:
+            self._memory_bytes -= len(self._memory.pop(key).encode("utf-8"))
+        self._memory[key] = value
+        self._memory_bytes += size
+        while self._memory_bytes > self.memory_max_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted.encode("utf-8"))
+
+    def _trim_disk(self) -> None:
+        while self._disk_bytes > self.disk_max_bytes and self._disk_entries:
+            # Enough of the least recently used rows to cover the excess at the average row size,
+            # so trimming usually takes a single statement
+            excess = self._disk_bytes - self.disk_max_bytes
+            batch = max(1, -(-excess * self._disk_entries // self._disk_bytes))
+            sizes = self._db.execute(
+                "DELETE FROM llm_result WHERE key IN (SELECT key FROM llm_result ORDER BY last_used LIMIT ?) "
+                "RETURNING size", (batch,)).fetchall()
+            if not sizes:
+                break
+            self._disk_entries -= len(sizes)
+            self._disk_bytes -= sum(size for size, in sizes)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            if self._db is not None:
+                self._db.execute("DELETE FROM llm_result")
+                self._db.commit()
+                self._disk_entries = self._disk_bytes = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = {
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "memory_max_bytes": self.memory_max_bytes,
+                "hits": dict(self.hits),
+                "misses": self.misses,
+                "disk_enabled": self._db is not None,
+            }
+            if self._db is not None:
+                stats.update(disk_entries=self._disk_entries, disk_bytes=self._disk_bytes,
+                             disk_max_bytes=self.disk_max_bytes)
+            return stats
+
+
+result_cache = LLMResultCache()
@@ -0,0 +1,244 @@
+import asyncio
+import os
+import time
+from collections import deque
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+from beeai_framework.backend.chat import ChatModel, ChatModelInput
+from beeai_framework.backend.message import UserMessage
+
+from core.governor import UPSTREAM_MAX_RETRIES, governor_for
+from core.telemetry import llm_first_token_seconds, llm_tokens, span
+from core.tokens import count_tokens
+
+# Seconds to wait for the preferred provider's first token before also asking the next one
+LLM_HEDGE_AFTER_SECONDS = float(os.getenv("LLM_HEDGE_AFTER_SECONDS", "5"))
+# Once a provider has LATENCY_MIN_SAMPLES, it is hedged after its p90 time to first token, but never sooner than this
+LLM_HEDGE_MIN_SECONDS = float(os.getenv("LLM_HEDGE_MIN_SECONDS", "0.5"))
+# A provider that fails or loses a hedged race this many times in a row is tried last for LLM_DEMOTE_SECONDS
+LLM_DEMOTE_AFTER = int(os.getenv("LLM_DEMOTE_AFTER", "3"))
+LLM_DEMOTE_SECONDS = float(os.getenv("LLM_DEMOTE_SECONDS", "60"))
+LATENCY_SAMPLES = 200
+LATENCY_MIN_SAMPLES = 20
+
+# Strong references to in-flight generations that are no longer awaited
+_background_tasks = set()
+
+
+class ModelRoute:
+    """One configured model, with its time-to-first-token history and health."""
+
+    def __init__(self, model: ChatModel):
+        self.model = model
+        self.name = f"{model.provider_id}:{model.model_id}"
+        self.governor = governor_for(model.provider_id)
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.strikes = 0
+        self.demoted_until = 0.0
+        self.wins = 0
+        self.losses = 0
+        self.failures = 0
+
+    @property
+    def demoted(self) -> bool:
+        return self.demoted_until > time.monotonic()
+
+    def hedge_delay(self) -> float:
+        """Seconds to wait for this model's first token before hedging."""
+        if len(self.latencies) < LATENCY_MIN_SAMPLES:
+            return LLM_HEDGE_AFTER_SECONDS
+        p90 = sorted(self.latencies)[int(len(self.latencies) * 0.9)]
+        return min(LLM_HEDGE_AFTER_SECONDS, max(LLM_HEDGE_MIN_SECONDS, p90))
+
+    def answered(self, latency: float) -> None:
+        self.latencies.append(latency)
+        llm_first_token_seconds.observe(latency, model=self.name)
+        self.wins += 1
+        self.strikes = 0
+
+    def strike(self, failed: bool) -> None:
+        if failed:
+            self.failures += 1
+        else:
+            self.losses += 1
+        self.strikes += 1
+        if self.strikes >= LLM_DEMOTE_AFTER:
+            print(f"Model {self.name} demoted for {LLM_DEMOTE_SECONDS:.0f}s")
+            self.demoted_until = time.monotonic() + LLM_DEMOTE_SECONDS
+            self.strikes = 0
+
+    async def stream(self, prompt: str, retries: int = UPSTREAM_MAX_RETRIES) -> AsyncIterator[str]:
+        """
+        Run a single prompt through this model and yield text as it is generated.
+
+        Closing the iterator early aborts the upstream generation instead of
+        letting it run to completion.
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        message = UserMessage(content=prompt)
+        done = object()
+        cancelled = False
+        streamed = False
+        # Each newToken event carries about one token, counted towards tokens/min
+        generated = 0
+
+        def on_token(data, event):
+            nonlocal streamed, generated
+            chunk, abort = data
+            if cancelled:
+                abort()
+                return
+            text = chunk.get_text_content()
+            streamed = streamed or bool(text)
+            generated += 1
+            queue.put_nowait(text)
+
+        async def attempt():
+            with span(self.model.provider_id, "chat"):
+                return await self.model.create(ChatModelInput(messages=[message], stream=True)) \
+                    .observe(lambda emitter: emitter.on("newToken", on_token))
+
+        async def run():
+            prompt_tokens = count_tokens(prompt)
+            try:
+                # A failed attempt is only retried while nothing has been sent to the client
+                await self.governor.call(attempt, prompt_tokens, retries, can_retry=lambda: not streamed)
+                queue.put_nowait(done)
+            except Exception as e:
+                queue.put_nowait(e)
+            finally:
+                self.governor.charge(generated)
+                llm_tokens.inc(prompt_tokens, model=self.name, kind="prompt")
+                llm_tokens.inc(generated, model=self.name, kind="completion")
+
+        # Cancelling the task would tear down the run's emitter while the inner
+        # generation keeps going, so flag it and abort from the next token instead.
+        task = asyncio.create_task(run())
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+        try:
+            while (item := await queue.get()) is not done:
+                if isinstance(item, Exception):
+                    raise item
+                if item:
+                    yield item
+        finally:
+            cancelled = True
+
+    def stats(self) -> Dict:
+        ordered = sorted(self.latencies)
+        return {
+            "first_token_p50": round(ordered[len(ordered) // 2], 3) if ordered else None,
+            "first_token_p90": round(ordered[int(len(ordered) * 0.9)], 3) if ordered else None,
+            "hedge_after": round(self.hedge_delay(), 3),
+            "wins": self.wins,
+            "hedges_lost": self.losses,
+            "failures": self.failures,
+            "demoted_for": round(max(0.0, self.demoted_until - time.monotonic()), 1),
+        }
+
+
+async def _first_token(tokens: AsyncIterator[str]) -> Optional[str]:
+    try:
+        return await tokens.__anext__()
+    except StopAsyncIteration:
+        return None
+
+
+class ModelRouter:
+    """
+    Sends each generation to an ordered list of models, hedging slow ones.
+
+    The first model that is not demoted is asked first. If it has not produced
+    a token within its hedge delay, the next model is asked as well; the first
+    to produce a token wins and the others are aborted. A model that fails is
+    replaced by the next one straight away rather than retried. With a single
+    model configured this is a plain call.
+    """
+
+    def __init__(self, models: List[ChatModel]):
+        if not models:
+            raise ValueError("At least one model must be configured")
+        self.routes = [ModelRoute(model) for model in models]
+        self.hedges = 0
+
+    @property
+    def primary(self) -> ChatModel:
+        """The preferred model, whatever its current health."""
+        return self.routes[0].model
+
+    def ordered(self) -> List[ModelRoute]:
+        """Routes in preference order, demoted ones last."""
+        return [r for r in self.routes if not r.demoted] + [r for r in self.routes if r.demoted]
+
+    async def stream(self, prompt: str,
+                     on_winner: Optional[Callable[[ModelRoute], None]] = None) -> AsyncIterator[str]:
+        """
+        Yield the winning model's text as it is generated.
+
+        Args:
+            prompt (str): The prompt
+            on_winner: Called with the route that answered, before its first token is yielded
+        """
+        routes = self.ordered()
+        racing = {}
+        errors = []
+        winner = None
+        launched = 0
+
+        def launch() -> None:
+            nonlocal launched
+            route = routes[launched]
+            launched += 1
+            # Only the last model retries; the others fail over to the next one instead
+            tokens = route.stream(prompt, UPSTREAM_MAX_RETRIES if launched == len(routes) else 0)
+            racing[asyncio.ensure_future(_first_token(tokens))] = (route, tokens, time.monotonic())
+
+        launch()
+        try:
+            while racing and winner is None:
+                timeout = None
+                if launched < len(routes):
+                    route, _, started = list(racing.values())[-1]
+                    timeout = max(0.0, started + route.hedge_delay() - time.monotonic())
+                done, _ = await asyncio.wait(racing, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    self.hedges += 1
+                    launch()
+                    continue
+                for task in done:
+                    route, tokens, started = racing.pop(task)
+                    if task.exception() is not None:
+                        route.strike(failed=True)
+                        errors.append(task.exception())
+                        print(f"Model {route.name} failed: {task.exception()}")
+                    elif winner is None:
+                        route.answered(time.monotonic() - started)
+                        winner = (route, tokens, task.result())
+                    else:
+                        await tokens.aclose()
+                if winner is None and not racing and launched < len(routes):
+                    launch()
+        finally:
+            # Abort the losers; each stops its upstream generation at its next token
+            for task, (route, tokens, _) in racing.items():
+                task.cancel()
+                if winner is not None:
+                    route.strike(failed=False)
+            await asyncio.gather(*racing, return_exceptions=True)
+        if winner is None:
+            raise errors[-1]
+
+        route, tokens, first = winner
+        if on_winner is not None:
+            on_winner(route)
+        try:
+            if first is not None:
+                yield first
+            async for token in tokens:
+                yield token
+        finally:
+            await tokens.aclose()
+
+    def stats(self) -> Dict:
+        return {"hedges": self.hedges, "models": {route.name: route.stats() for route in self.routes}}
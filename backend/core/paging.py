@@ -0,0 +1,126 @@
+import base64
+import binascii
+import os
+from typing import Awaitable, AsyncIterator, Callable, Dict, List, Optional, Sequence, Tuple
+
+from fastapi import Request, Response
+from fastapi.responses import StreamingResponse
+
+from core.async_crud import parse_fields, project
+from core.responses import dumps, json_response
+from core.storage import PRIMARY_KEYS, Filter, get_repository
+
+# Keyset pagination: rows are read in primary-key order and each page starts after the last key
+# of the previous one, so page 1000 costs the same as page 1 (no OFFSET scan), and rows written
+# while a client pages through a table do not shift it onto duplicates.
+
+# Rows per page when the client does not ask for a size
+PAGE_SIZE = int(os.getenv("PAGE_SIZE", "100"))
+# Largest page a client may ask for; NDJSON streams are read from the database in pages this size
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "1000"))
+
+NDJSON = "application/x-ndjson"
+# Carries the cursor of the next page on paged list responses; absent after the last page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(key: str) -> str:
+    return base64.urlsafe_b64encode(str(key).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> str:
+    try:
+        key = base64.b64decode(cursor + "=" * (-len(cursor) % 4), altchars=b"-_", validate=True).decode()
+    except (binascii.Error, UnicodeDecodeError):
+        key = ""
+    if not key:
+        raise ValueError("Invalid cursor")
+    return key
+
+
+async def fetch_page(table: str, filters: Sequence[Filter] = (), columns: str = "*",
+                     limit: int = PAGE_SIZE, cursor: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+    """
+    Read one page of rows in primary-key order.
+
+    Args:
+        table (str): Table name
+        filters: (column, operator, value) tuples, as for Repository.select
+        columns (str): "*" or comma-separated columns, selected by the database
+        limit (int): Rows per page, at most MAX_PAGE_SIZE
+        cursor (str): The cursor returned with the previous page, or None for the first
+
+    Returns:
+        tuple: (rows, cursor for the next page or None after the last)
+    """
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    key = PRIMARY_KEYS[table]
+    columns = parse_fields(table, columns)
+    # The key is needed for the next cursor even when it was not asked for
+    selected = columns if columns == "*" or key in columns.split(",") else f"{key},{columns}"
+    where = [*filters, (key, "gt", decode_cursor(cursor))] if cursor else list(filters)
+    # One row past the page tells whether another page follows without a count query
+    rows = await get_repository().select(table, where, columns=selected, order=key, limit=limit + 1)
+    next_cursor = encode_cursor(rows[limit - 1][key]) if len(rows) > limit else None
+    return [project(row, columns) for row in rows[:limit]], next_cursor
+
+
+async def scan(table: str, filters: Sequence[Filter] = (), columns: str = "*",
+               page_size: int = MAX_PAGE_SIZE) -> AsyncIterator[List[Dict]]:
+    """Yield every matching row, one page at a time."""
+    cursor = None
+    while True:
+        rows, cursor = await fetch_page(table, filters, columns, page_size, cursor)
+        yield rows
+        if cursor is None:
+            return
+
+
+async def ndjson_response(pages: AsyncIterator[List[Dict]]) -> StreamingResponse:
+    """
+    Stream rows as NDJSON, one JSON object per line.
+
+    The first page is read before the response starts, so a bad query still
+    gets an error status; after that, only one page is held in memory at a time.
+    """
+    first = await pages.__anext__()
+
+    async def body():
+        page = first
+        while True:
+            if page:
+                yield b"".join(dumps(row) + b"\n" for row in page)
+            try:
+                page = await pages.__anext__()
+            except StopAsyncIteration:
+                return
+
+    return StreamingResponse(body(), media_type=NDJSON)
+
+
+async def list_response(request: Request, table: str, filters: Sequence[Filter] = (), columns: str = "*",
+                        limit: Optional[int] = None, cursor: Optional[str] = None, format: str = "json",
+                        unpaged: Optional[Callable[[], Awaitable[List[Dict]]]] = None) -> Response:
+    """
+    Answer a list endpoint in the form the client asked for.
+
+    - format=ndjson: every matching row, streamed
+    - limit or cursor given: one page as a JSON array, with the next page's
+      cursor in the X-Next-Cursor header
+    - neither: `unpaged()` (e.g. a cached full list) when given, else the first page
+
+    JSON answers carry an ETag, so an unchanged list is answered with 304.
+
+    Args:
+        request (Request): The request, for its If-None-Match header
+        unpaged: Loads the whole list, for endpoints that returned everything before paging existed
+    """
+    if format == "ndjson":
+        return await ndjson_response(scan(table, filters, columns))
+    if format != "json":
+        raise ValueError("format must be json or ndjson")
+    if unpaged is not None and limit is None and cursor is None:
+        return json_response(request, await unpaged())
+    rows, next_cursor = await fetch_page(table, filters, columns, PAGE_SIZE if limit is None else limit, cursor)
+    return json_response(request, rows, {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None)
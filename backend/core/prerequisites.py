@@ -0,0 +1,180 @@
+from typing import TYPE_CHECKING, List, Optional
+import asyncio
+import os
+import re
+from core import llm
+from core.governor import BACKGROUND, governor_for, lane
+from core.cache import TTLCache
+from core.singleflight import SingleFlight
+
+# The agent and search stacks are imported with the first agent, keeping them out of startup
+if TYPE_CHECKING:
+    from beeai_framework.agents.bee import BeeAgent
+
+# Final answers are reused for a day, raw search findings for six hours
+ANSWER_TTL = float(os.getenv("PREREQ_ANSWER_TTL", str(24 * 3600)))
+ANSWER_MAX_ENTRIES = int(os.getenv("PREREQ_ANSWER_MAX_ENTRIES", "500"))
+SEARCH_TTL = float(os.getenv("PREREQ_SEARCH_TTL", str(6 * 3600)))
+SEARCH_MAX_ENTRIES = int(os.getenv("PREREQ_SEARCH_MAX_ENTRIES", "500"))
+# Agents are stateful (memory), so concurrent requests each borrow their own
+AGENT_POOL_SIZE = int(os.getenv("PREREQ_AGENT_POOL_SIZE", "2"))
+# Comma-separated conditions answered in the background at startup, e.g. "diabetes,hypertension"
+WARMUP_CONDITIONS = [c for c in os.getenv("PREREQ_WARMUP_CONDITIONS", "").split(",") if c.strip()]
+
+GREETINGS = ["hi", "hello", "hey"]
+GREETING_RESPONSE = """Hello! I'm here to help you prepare for your appointment.
+        Please tell me about your condition or symptoms, and I'll provide specific
+        preparation guidelines and prerequisites for your visit."""
+NO_FINDINGS = "No search results found for the given condition."
+ERROR_RESPONSE = "An error occurred while retrieving the appointment prerequisites. Please try again later."
+
+answer_cache = TTLCache("prerequisite_answers", ttl=ANSWER_TTL, max_entries=ANSWER_MAX_ENTRIES)
+findings_cache = TTLCache("prerequisite_findings", ttl=SEARCH_TTL, max_entries=SEARCH_MAX_ENTRIES)
+# Patients asking about the same condition at once share one search and generation
+answers = SingleFlight("prerequisites")
+
+
+def normalize_condition(condition: str) -> str:
+    """Reduce a condition to a cache key, e.g. " Type-2  Diabetes! " -> "type 2 diabetes"."""
+    return " ".join(re.sub(r"[^\w\s]", " ", condition.lower()).split())
+
+
+class AgentPool:
+    """Fixed set of search agents sharing one search tool, reused across requests."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self._idle: Optional[asyncio.Queue] = None
+        self._search_tool = None
+
+    def _create_agent(self, model) -> "BeeAgent":
+        from beeai_framework.agents.bee import BeeAgent
+        from beeai_framework.agents.types import BeeInput
+        from beeai_framework.memory import UnconstrainedMemory
+        from beeai_framework.tools.search.duckduckgo import DuckDuckGoSearchTool
+
+        if self._search_tool is None:
+            self._search_tool = DuckDuckGoSearchTool()
+        return BeeAgent(BeeInput(llm=model, tools=[self._search_tool], memory=UnconstrainedMemory()))
+
+    def _create_agents(self, model) -> List["BeeAgent"]:
+        return [self._create_agent(model) for _ in range(self.size)]
+
+    async def run(self, prompt: str) -> str:
+        from beeai_framework.agents.types import BeeRunInput
+
+        # Agents run on the preferred model, whatever its current health
+        model = (await llm.load_router()).primary
+        if self._idle is None:
+            # The first agents import the search stack, so they are built off the event loop
+            agents = await asyncio.to_thread(self._create_agents, model)
+            if self._idle is None:
+                self._idle = asyncio.Queue()
+                for agent in agents:
+                    self._idle.put_nowait(agent)
+        agent = await self._idle.get()
+        try:
+            # Start from an empty memory so one patient's question never leaks into another's
+            agent.memory.reset()
+            # The agent makes several model calls in turn; they share one slot with its provider
+            output = await governor_for(model.provider_id).call(
+                lambda: agent.run(BeeRunInput(prompt=prompt)), retries=0
+            )
+            return output.result.text
+        finally:
+            self._idle.put_nowait(agent)
+
+
+agent_pool = AgentPool(AGENT_POOL_SIZE)
+
+
+async def search_findings(condition: str) -> Optional[str]:
+    """
+    Run the web-search agent for a normalized condition.
+
+    Returns:
+        str: The agent's findings, or None if the search failed
+    """
+    found, findings = findings_cache.get(condition)
+    if found:
+        return findings
+
+    search_prompt = f"""
+    What are the pre-appointment preparations and precautions for a patient with {condition}. Include information about:
+    1. Required fasting or dietary restrictions before the appointment
+    2. Medical tests that might be needed
+    3. Documents or medical history to bring
+    4. Any specific preparations needed
+    """
+    try:
+        findings = await agent_pool.run(search_prompt)
+    except Exception as e:
+        print(f"An error occurred by searching: {e}")
+        return None
+    findings_cache.set(condition, findings)
+    return findings
+
+
+async def get_appointment_prerequisites(condition: str) -> str:
+    """
+    Get pre-appointment information and prerequisites based on medical condition.
+    Uses DuckDuckGo search combined with LLM knowledge.
+
+    Args:
+        condition (str): Primary medical condition or symptoms
+
+    Returns:
+        str: Formatted prerequisites and precautions
+    """
+    if condition.lower() in GREETINGS:
+        return GREETING_RESPONSE
+
+    key = normalize_condition(condition)
+    found, answer = answer_cache.get(key)
+    if found:
+        return answer
+    return await answers.run(key, lambda: _answer(key))
+
+
+async def _answer(key: str) -> str:
+    findings = await search_findings(key)
+    try:
+        final_prompt = f"""
+        Based on the following search results and your medical knowledge, provide a friendly and clear
+        response about preparations and precautions for a patient with {key}
+        before their doctor's appointment.
+
+        Search findings:
+        {findings or NO_FINDINGS}
+
+        Please format the response in a conversational way, but make sure to cover:
+        1. Any pre-appointment testing requirements
+        2. Dietary restrictions (if any)
+        3. Required documents
+        4. Specific preparations
+        5. Additional precautions
+
+        Make the response friendly and reassuring, but maintain professionalism.
+        Highlight any critical timing requirements (like fasting duration)
+        and essential items to bring to the appointment. Keep it short and concise.
+        """
+        answer = await llm.generate(final_prompt)
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        return ERROR_RESPONSE
+
+    # Answers built without search findings are not cached so the next request retries the search
+    if findings is not None:
+        answer_cache.set(key, answer)
+    return answer
+
+
+async def warm_up(conditions: List[str] = WARMUP_CONDITIONS) -> None:
+    """Precompute answers for common conditions one at a time, leaving agents free for live traffic."""
+    for condition in conditions:
+        try:
+            with lane(BACKGROUND):
+                await get_appointment_prerequisites(condition)
+            print(f"Prerequisites warmed up for: {normalize_condition(condition)}")
+        except Exception as e:
+            print(f"Prerequisites warm-up failed for {condition}: {e}")
@@ -0,0 +1,138 @@
+import asyncio
+import gzip
+import hashlib
+import os
+from typing import Any, Dict, Optional
+
+import brotli
+import orjson
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers, MutableHeaders
+
+# Bodies smaller than this are sent as they are; compressing them saves less than the headers cost
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+# Brotli 5 and gzip 6 compress a typical JSON reply in under a millisecond
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+# Bodies at least this large are compressed in a worker thread so the event loop keeps serving
+COMPRESS_THREAD_BYTES = 64 * 1024
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "application/javascript", "text/", "image/svg+xml")
+
+
+def dumps(content: Any) -> bytes:
+    """Serialize to compact JSON; values orjson does not know are written as strings."""
+    return orjson.dumps(content, default=str, option=orjson.OPT_NON_STR_KEYS)
+
+
+class FastJSONResponse(JSONResponse):
+    """The API's default response class: same JSON as JSONResponse, encoded by orjson."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    # If-None-Match uses weak comparison, so W/"x" and "x" are the same tag
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag.removeprefix("W/") in tags
+
+
+def json_response(request: Request, content: Any, headers: Optional[Dict[str, str]] = None) -> Response:
+    """
+    Serialize `content` with an ETag, answering 304 Not Modified when the client already has it.
+
+    Meant for data the frontend polls, such as the doctor list and
+    availability: the browser revalidates with If-None-Match on every fetch,
+    and an unchanged answer costs only the headers. Returning a Response also
+    skips FastAPI's response_model validation and jsonable_encoder pass.
+
+    Args:
+        request (Request): The request, for its If-None-Match header
+        content: JSON-serializable content
+        headers (dict): Extra response headers, e.g. a pagination cursor
+    """
+    body = dumps(content)
+    # Weak, because the compression middleware may change the bytes on the wire
+    etag = f'W/"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+    headers = {**(headers or {}), "ETag": etag, "Cache-Control": "private, no-cache"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+
+def _pick_encoding(accept_encoding: str) -> Optional[str]:
+    weights = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        weights[name.strip()] = quality
+    for encoding in ("br", "gzip"):
+        if weights.get(encoding, weights.get("*", 0)) > 0:
+            return encoding
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+class CompressionMiddleware:
+    """
+    Compresses responses with brotli or gzip, whichever the client accepts (brotli first).
+
+    Only responses sent as a single body are compressed. Streamed responses
+    (SSE tokens, NDJSON, audio) pass through untouched so every chunk still
+    reaches the client as soon as it is written; Starlette's GZipMiddleware
+    would hold them in its compressor instead.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        encoding = _pick_encoding(Headers(scope=scope).get("accept-encoding", "")) if scope["type"] == "http" else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        start = None
+
+        async def send_compressed(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if start is None:
+                await send(message)
+                return
+            initial, start = start, None
+            headers = MutableHeaders(scope=initial)
+            body = message.get("body", b"")
+            if (not message.get("more_body", False) and len(body) >= self.minimum_size
+                    and "content-encoding" not in headers
+                    and headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)):
+                if len(body) >= COMPRESS_THREAD_BYTES:
+                    body = await asyncio.to_thread(compress, body, encoding)
+                else:
+                    body = compress(body, encoding)
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(len(body))
+                headers.add_vary_header("Accept-Encoding")
+                message = {**message, "body": body}
+            await send(initial)
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
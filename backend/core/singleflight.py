@@ -0,0 +1,120 @@
+import asyncio
+import contextvars
+import os
+import time
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional, TypeVar
+
+from core.governor import current_lane, lane
+from core.telemetry import Counter, Trace, current_trace, record, tracing
+
+# Set to false to send every call upstream, e.g. to measure what coalescing saves
+SINGLE_FLIGHT = os.getenv("SINGLE_FLIGHT", "true").lower() in ("1", "true", "yes")
+
+T = TypeVar("T")
+
+singleflight_calls = Counter("mediscribe_singleflight_calls_total",
+                             "Calls through a single-flight group: executed upstream, coalesced into one already "
+                             "running, or abandoned because every caller went away", ("group", "outcome"))
+
+
+class _Flight:
+    def __init__(self, task: asyncio.Task, trace: Trace):
+        self.task = task
+        self.trace = trace
+        self.waiters = 0
+
+
+async def _alone(call: Callable[[], Awaitable[T]], priority: int, trace: Trace) -> T:
+    with lane(priority), tracing(trace):
+        return await call()
+
+
+class SingleFlight:
+    """
+    Lets concurrent identical calls share one execution.
+
+    The first caller for a key starts the call in a task of its own; callers
+    that arrive while it runs wait for the same result or exception. Nothing
+    is kept after the call finishes, so only overlapping calls are merged; it
+    is not a cache. A cancelled caller stops waiting without disturbing the
+    others, and the call itself is cancelled only once nobody is waiting.
+
+    The call runs in a context of its own rather than the first caller's: it
+    keeps that caller's governor lane, and calls in different lanes are never
+    merged, so an interactive request does not queue behind a background one.
+    Its upstream time is added to the Server-Timing of every caller that
+    waited for it.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._flights: Dict[Hashable, _Flight] = {}
+        self.executed = 0
+        self.coalesced = 0
+        self.abandoned = 0
+        GROUPS.append(self)
+
+    async def run(self, key: Hashable, call: Callable[[], Awaitable[T]],
+                  share: Optional[Callable[[T], T]] = None) -> T:
+        """
+        Run `call`, or wait for the identical call already running under `key`.
+
+        Args:
+            key: Equal for calls that would return the same result
+            call: Starts the call; only invoked when no identical call is running
+            share: Copies the result for callers that joined, when it is mutable
+        """
+        if not SINGLE_FLIGHT:
+            return await call()
+        priority = current_lane()
+        key = (priority, key)
+        flight = self._flights.get(key)
+        joined = flight is not None
+        if joined:
+            self.coalesced += 1
+            singleflight_calls.inc(group=self.name, outcome="coalesced")
+        else:
+            trace = Trace()
+            # An empty context, so the task copies neither this caller's lane nor its request trace
+            task = contextvars.Context().run(asyncio.ensure_future, _alone(call, priority, trace))
+            flight = self._flights[key] = _Flight(task, trace)
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+            self.executed += 1
+            singleflight_calls.inc(group=self.name, outcome="executed")
+        started = time.perf_counter()
+        flight.waiters += 1
+        try:
+            result = await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # Every caller has gone (e.g. their clients disconnected), so stop the upstream call too.
+                # It is forgotten first so a new caller starts afresh instead of joining a cancelled call.
+                self._forget(key, flight)
+                flight.task.cancel()
+                self.abandoned += 1
+                singleflight_calls.inc(group=self.name, outcome="abandoned")
+            trace = current_trace()
+            if trace is not None and flight.task.done():
+                trace.merge(flight.trace)
+        if joined:
+            record(f"{self.name}-coalesced", time.perf_counter() - started)
+            if share is not None:
+                result = share(result)
+        return result
+
+    def _forget(self, key: Hashable, flight: _Flight) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def stats(self) -> Dict:
+        return {"in_flight": len(self._flights), "executed": self.executed,
+                "coalesced": self.coalesced, "abandoned": self.abandoned}
+
+
+GROUPS: List[SingleFlight] = []
+
+
+def get_singleflight_stats() -> Dict[str, Dict]:
+    """Executed, coalesced and abandoned call counts for each single-flight group."""
+    return {group.name: group.stats() for group in GROUPS}
@@ -0,0 +1,414 @@
+import asyncio
+import os
+import queue
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from core import db
+from core.crud import handle_error
+from core.singleflight import SingleFlight
+from core.telemetry import span
+
+# "supabase" (PostgREST over the network) or "sqlite" (a local file, for single-clinic and offline use)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "supabase").lower()
+SQLITE_PATH = os.getenv("SQLITE_PATH", "mediscribe.db")
+SQLITE_POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", "8"))
+# Milliseconds a writer waits for another connection's write lock before failing
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+# A filter is (column, operator, value); operators follow PostgREST's names
+Filter = Tuple[str, str, Any]
+
+# Column types per table, matching the Supabase schema
+TABLES = {
+    "doctor": {
+        "doctor_id": "TEXT PRIMARY KEY", "name": "TEXT",
+        "work_start": "TEXT", "work_end": "TEXT", "slot_minutes": "INTEGER",
+    },
+    "patient": {
+        "id": "TEXT PRIMARY KEY", "name": "TEXT", "contact": "TEXT",
+        "medical_history": "TEXT", "previous_procedures": "TEXT",
+    },
+    "appointment": {
+        "appointment_id": "TEXT PRIMARY KEY", "date": "TEXT", "time": "TEXT",
+        "patient_id": "TEXT", "type": "TEXT", "doctor_id": "TEXT",
+    },
+    "conversation": {
+        "conversation_id": "TEXT PRIMARY KEY", "doctor_id": "TEXT", "patient_id": "TEXT",
+        "appointment_id": "TEXT", "text": "TEXT", "summary": "TEXT",
+        # ISO 8601 in UTC to the millisecond, so rows created in the same second still sort in order
+        "created_at": "TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now'))",
+    },
+}
+# Columns the database fills in when an insert leaves them out. On Supabase, conversation.created_at
+# has to be added to projects set up before it existed:
+#   alter table conversation add column created_at timestamptz not null default now();
+SERVER_DEFAULTS = {table: {column for column, kind in columns.items() if "DEFAULT" in kind}
+                   for table, columns in TABLES.items()}
+PRIMARY_KEYS = {table: next(column for column, kind in columns.items() if "PRIMARY KEY" in kind)
+                for table, columns in TABLES.items()}
+# One per lookup the API makes by something other than a primary key
+INDEXES = {
+    "appointment_doctor_date": ("appointment", "doctor_id, date"),
+    "appointment_patient": ("appointment", "patient_id"),
+    "conversation_appointment": ("conversation", "appointment_id"),
+    "conversation_patient": ("conversation", "patient_id"),
+}
+OPERATORS = {"eq": "=", "neq": "!=", "gt": ">", "gte": ">=", "lt": "<", "lte": "<="}
+
+
+def is_missing_column(error: BaseException) -> bool:
+    """Whether a query failed because the table lacks a column it named."""
+    # 42703 is Postgres's undefined_column, which PostgREST passes through
+    return getattr(error, "code", None) == "42703" or "no such column" in str(error)
+
+
+class Repository(ABC):
+    """
+    Storage for the doctor, patient, appointment and conversation tables.
+
+    The operations mirror the subset of PostgREST that core.async_crud uses,
+    so each backend only has to translate them, by implementing _select,
+    _insert, _update and _delete. Every method returns rows as plain dicts.
+    """
+
+    name = "base"
+
+    def __init__(self):
+        # Bumped after every write to a table, so reads that start afterwards never join a read from before it
+        self._generations: Dict[str, int] = {}
+
+    async def select(self, table: str, filters: Sequence[Filter] = (), columns: str = "*",
+                     order: Optional[str] = None, descending: bool = False,
+                     limit: Optional[int] = None) -> List[Dict]:
+        """
+        Return the rows of `table` matching every filter.
+
+        Identical selects that overlap share one query; see core.singleflight.
+
+        Args:
+            table (str): Table name
+            filters: (column, operator, value) tuples; operators are eq, neq, gt, gte, lt, lte and in
+            columns (str): "*" or comma-separated column names
+            order (str): Column to sort by
+            descending (bool): Sort from the highest value
+            limit (int): Most rows to return
+        """
+        frozen = tuple((column, op, tuple(value) if isinstance(value, (list, tuple)) else value)
+                       for column, op, value in filters)
+        key = (id(self), table, self._generations.get(table, 0), frozen, columns, order, descending, limit)
+        return await reads.run(key, lambda: self._select(table, filters, columns, order, descending, limit),
+                               share=lambda rows: [dict(row) for row in rows])
+
+    async def insert(self, table: str, rows: List[Dict]) -> List[Dict]:
+        """Insert rows and return them as stored."""
+        try:
+            return await self._insert(table, rows)
+        finally:
+            self._written(table)
+
+    async def update(self, table: str, filters: Sequence[Filter], updates: Dict) -> List[Dict]:
+        """Apply `updates` to the matching rows and return them as updated."""
+        try:
+            return await self._update(table, filters, updates)
+        finally:
+            self._written(table)
+
+    async def delete(self, table: str, filters: Sequence[Filter]) -> List[Dict]:
+        """Delete the matching rows and return them."""
+        try:
+            return await self._delete(table, filters)
+        finally:
+            self._written(table)
+
+    def _written(self, table: str) -> None:
+        # Also after a failed write, which may still have been applied
+        self._generations[table] = self._generations.get(table, 0) + 1
+
+    @abstractmethod
+    async def _select(self, table: str, filters: Sequence[Filter], columns: str, order: Optional[str],
+                      descending: bool, limit: Optional[int]) -> List[Dict]:
+        ...
+
+    @abstractmethod
+    async def _insert(self, table: str, rows: List[Dict]) -> List[Dict]:
+        ...
+
+    @abstractmethod
+    async def _update(self, table: str, filters: Sequence[Filter], updates: Dict) -> List[Dict]:
+        ...
+
+    @abstractmethod
+    async def _delete(self, table: str, filters: Sequence[Filter]) -> List[Dict]:
+        ...
+
+    async def check_health(self) -> Dict:
+        """Run a lightweight query and report its latency."""
+        start = time.perf_counter()
+        try:
+            await self.select("doctor", limit=1)
+        except Exception as e:
+            return {"backend": self.name, "status": "error", "detail": str(e)}
+        return {"backend": self.name, "status": "ok", "latency_ms": round((time.perf_counter() - start) * 1000, 2)}
+
+    def pool_stats(self) -> Dict:
+        return {}
+
+    async def close(self) -> None:
+        pass
+
+
+class SupabaseRepository(Repository):
+    """Tables served by Supabase's PostgREST API through the shared async pool."""
+
+    name = "supabase"
+
+    @staticmethod
+    def _filtered(query, filters: Iterable[Filter]):
+        for column, op, value in filters:
+            query = query.in_(column, value) if op == "in" else getattr(query, op)(column, value)
+        return query
+
+    @staticmethod
+    async def _execute(operation: str, query) -> List[Dict]:
+        with span("supabase", operation):
+            return handle_error(await query.execute())
+
+    async def _select(self, table: str, filters: Sequence[Filter], columns: str, order: Optional[str],
+                      descending: bool, limit: Optional[int]) -> List[Dict]:
+        supabase = await db.get_async_supabase_client()
+        query = self._filtered(supabase.table(table).select(columns), filters)
+        if order:
+            query = query.order(order, desc=descending)
+        if limit is not None:
+            query = query.limit(limit)
+        return await self._execute("select", query)
+
+    async def _insert(self, table: str, rows: List[Dict]) -> List[Dict]:
+        supabase = await db.get_async_supabase_client()
+        # Columns a row leaves out take their default, as in SQLite, rather than null
+        return await self._execute("insert", supabase.table(table).insert(rows, default_to_null=False))
+
+    async def _update(self, table: str, filters: Sequence[Filter], updates: Dict) -> List[Dict]:
+        supabase = await db.get_async_supabase_client()
+        return await self._execute("update", self._filtered(supabase.table(table).update(updates), filters))
+
+    async def _delete(self, table: str, filters: Sequence[Filter]) -> List[Dict]:
+        supabase = await db.get_async_supabase_client()
+        return await self._execute("delete", self._filtered(supabase.table(table).delete(), filters))
+
+    async def check_health(self) -> Dict:
+        return {"backend": self.name, **await db.check_health()}
+
+    def pool_stats(self) -> Dict:
+        return db.get_pool_stats()
+
+    async def close(self) -> None:
+        await db.close_async_supabase_client()
+
+
+class SQLiteRepository(Repository):
+    """
+    Tables in a local SQLite file, for single-clinic deployments and offline benchmarks.
+
+    The database runs in WAL mode so readers never wait for the writer, and
+    queries run on worker threads over a fixed pool of connections.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str = SQLITE_PATH, pool_size: int = SQLITE_POOL_SIZE):
+        super().__init__()
+        self.path = path
+        self.pool_size = pool_size
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        connection.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+        connection.execute("PRAGMA journal_mode = WAL")
+        # WAL makes NORMAL safe against corruption; only the last commits can be lost on power failure
+        connection.execute("PRAGMA synchronous = NORMAL")
+        if self._opened == 0:
+            for table, columns in TABLES.items():
+                definition = ", ".join(f"{column} {kind}" for column, kind in columns.items())
+                connection.execute(f"CREATE TABLE IF NOT EXISTS {table} ({definition})")
+                existing = {row["name"]: row["dflt_value"]
+                            for row in connection.execute(f"PRAGMA table_info({table})")}
+                if any(column not in existing or (column in SERVER_DEFAULTS[table] and existing[column] is None)
+                       for column in columns):
+                    self._rebuild(connection, table, definition, [c for c in existing if c in columns])
+            for index, (table, columns) in INDEXES.items():
+                connection.execute(f"CREATE INDEX IF NOT EXISTS {index} ON {table} ({columns})")
+        return connection
+
+    @staticmethod
+    def _rebuild(connection: sqlite3.Connection, table: str, definition: str, kept: List[str]) -> None:
+        # For files created before a column, or its default, was added to TABLES. ALTER TABLE cannot add a column
+        # whose default is an expression, so the table is recreated and its rows copied across.
+        # Its indexes go with the old table and are created again by the caller. New columns are
+        # null in the copied rows rather than defaulted, e.g. old conversations have no created_at.
+        columns = list(TABLES[table])
+        values = ", ".join(column if column in kept else "NULL" for column in columns)
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute(f"ALTER TABLE {table} RENAME TO {table}_old")
+            connection.execute(f"CREATE TABLE {table} ({definition})")
+            connection.execute(f"INSERT INTO {table} ({', '.join(columns)}) SELECT {values} FROM {table}_old")
+            connection.execute(f"DROP TABLE {table}_old")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    def _with_connection(self, work: Callable[[sqlite3.Connection], Any]) -> Any:
+        try:
+            connection = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                create = self._opened < self.pool_size
+                if create:
+                    connection = self._connect()
+                    self._opened += 1
+            if not create:
+                connection = self._idle.get()
+        try:
+            return work(connection)
+        finally:
+            self._idle.put(connection)
+
+    async def _execute(self, operation: str, statement: str, parameters: Sequence = ()) -> List[Dict]:
+        def work(connection: sqlite3.Connection) -> List[Dict]:
+            return [dict(row) for row in connection.execute(statement, parameters).fetchall()]
+
+        with span("sqlite", operation):
+            return await asyncio.to_thread(self._with_connection, work)
+
+    @staticmethod
+    def _column(table: str, column: str) -> str:
+        # Names are interpolated into SQL, so only schema columns are accepted
+        if column not in TABLES[table]:
+            raise ValueError(f"Unknown column {table}.{column}")
+        return column
+
+    def _where(self, table: str, filters: Iterable[Filter]) -> Tuple[str, List]:
+        clauses, parameters = [], []
+        for column, op, value in filters:
+            column = self._column(table, column)
+            if op == "in":
+                values = list(value)
+                clauses.append(f"{column} IN ({', '.join('?' for _ in values)})")
+                parameters.extend(values)
+            elif op in OPERATORS:
+                clauses.append(f"{column} {OPERATORS[op]} ?")
+                parameters.append(value)
+            else:
+                raise ValueError(f"Unsupported filter operator: {op}")
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), parameters
+
+    def _table(self, table: str) -> str:
+        if table not in TABLES:
+            raise ValueError(f"Unknown table {table}")
+        return table
+
+    async def _select(self, table: str, filters: Sequence[Filter], columns: str, order: Optional[str],
+                      descending: bool, limit: Optional[int]) -> List[Dict]:
+        table = self._table(table)
+        selected = "*" if columns == "*" else ", ".join(self._column(table, c.strip()) for c in columns.split(","))
+        where, parameters = self._where(table, filters)
+        statement = f"SELECT {selected} FROM {table}{where}"
+        if order:
+            statement += f" ORDER BY {self._column(table, order)} {'DESC' if descending else 'ASC'}"
+        if limit is not None:
+            statement += " LIMIT ?"
+            parameters.append(limit)
+        return await self._execute("select", statement, parameters)
+
+    async def _insert(self, table: str, rows: List[Dict]) -> List[Dict]:
+        table = self._table(table)
+        statements = []
+        for row in rows:
+            columns = [self._column(table, column) for column in row]
+            statements.append((f"INSERT INTO {table} ({', '.join(columns)}) "
+                               f"VALUES ({', '.join('?' for _ in columns)}) RETURNING *", list(row.values())))
+
+        # All rows go in one transaction, so a failure leaves none of them behind
+        def work(connection: sqlite3.Connection) -> List[Dict]:
+            inserted = []
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                for statement, parameters in statements:
+                    inserted.extend(dict(row) for row in connection.execute(statement, parameters).fetchall())
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+            return inserted
+
+        with span("sqlite", "insert"):
+            return await asyncio.to_thread(self._with_connection, work)
+
+    async def _update(self, table: str, filters: Sequence[Filter], updates: Dict) -> List[Dict]:
+        table = self._table(table)
+        if not updates:
+            return await self._select(table, filters, "*", None, False, None)
+        assignments = ", ".join(f"{self._column(table, column)} = ?" for column in updates)
+        where, parameters = self._where(table, filters)
+        statement = f"UPDATE {table} SET {assignments}{where} RETURNING *"
+        return await self._execute("update", statement, [*updates.values(), *parameters])
+
+    async def _delete(self, table: str, filters: Sequence[Filter]) -> List[Dict]:
+        table = self._table(table)
+        where, parameters = self._where(table, filters)
+        return await self._execute("delete", f"DELETE FROM {table}{where} RETURNING *", parameters)
+
+    def pool_stats(self) -> Dict:
+        idle = self._idle.qsize()
+        return {"path": self.path, "max_connections": self.pool_size, "open": self._opened,
+                "idle": idle, "in_use": self._opened - idle}
+
+    async def close(self) -> None:
+        with self._lock:
+            while True:
+                try:
+                    self._idle.get_nowait().close()
+                except queue.Empty:
+                    break
+            self._opened = 0
+
+
+reads = SingleFlight("storage")
+_repository: Optional[Repository] = None
+
+
+def get_repository() -> Repository:
+    """Return the storage backend selected by STORAGE_BACKEND, creating it on first use."""
+    global _repository
+    if _repository is None:
+        if STORAGE_BACKEND == "sqlite":
+            _repository = SQLiteRepository()
+        elif STORAGE_BACKEND == "supabase":
+            _repository = SupabaseRepository()
+        else:
+            raise ValueError(f"Unknown STORAGE_BACKEND {STORAGE_BACKEND!r}; expected 'supabase' or 'sqlite'")
+    return _repository
+
+
+def set_repository(repository: Optional[Repository]) -> None:
+    """Replace the storage backend, e.g. with a SQLiteRepository for a benchmark or test."""
+    global _repository
+    _repository = repository
+
+
+async def close_repository() -> None:
+    """Release the storage backend's connections."""
+    global _repository
+    if _repository is not None:
+        await _repository.close()
+        _repository = None
@@ -0,0 +1,179 @@
+import importlib
+import os
+import uuid
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional
+
+from core.audio import PCMAudio, find_silences
+from core.cache import TTLCache
+from core.transcribe import drop_repeated_words, parse_segments, transcribe_wav
+
+# Pending audio is re-transcribed for a partial result every STEP seconds of new audio
+STREAM_STEP_SECONDS = float(os.getenv("STREAM_STEP_SECONDS", "3"))
+# Once this much audio is pending it is committed at the next pause
+STREAM_COMMIT_SECONDS = float(os.getenv("STREAM_COMMIT_SECONDS", "12"))
+# Pending audio is committed regardless of pauses at this length
+STREAM_WINDOW_SECONDS = float(os.getenv("STREAM_WINDOW_SECONDS", "30"))
+STREAM_OVERLAP_SECONDS = 1.0
+STREAM_MAX_SECONDS = float(os.getenv("STREAM_MAX_SECONDS", str(3 * 3600)))
+# Finished transcripts stay available for note generation for this long
+SESSION_TTL = float(os.getenv("STREAM_SESSION_TTL", "3600"))
+SESSION_MAX_ENTRIES = int(os.getenv("STREAM_SESSION_MAX_ENTRIES", "200"))
+# "groq" or "package.module:attribute" naming a TranscriptionBackend (or a factory for one)
+TRANSCRIPTION_BACKEND = os.getenv("TRANSCRIPTION_BACKEND", "groq")
+
+transcripts = TTLCache("transcription_sessions", ttl=SESSION_TTL, max_entries=SESSION_MAX_ENTRIES)
+
+
+class TranscriptionBackend(ABC):
+    """Turns a WAV file into a verbose_json-style result: {"text", "segments": [{"start", "end", "text"}]}."""
+
+    @abstractmethod
+    async def transcribe(self, wav: bytes) -> Dict:
+        ...
+
+
+class GroqBackend(TranscriptionBackend):
+    async def transcribe(self, wav: bytes) -> Dict:
+        return await transcribe_wav(wav, "stream.wav")
+
+
+_backend: Optional[TranscriptionBackend] = None
+
+
+def get_backend() -> TranscriptionBackend:
+    """Return the configured streaming transcription backend."""
+    global _backend
+    if _backend is None:
+        if TRANSCRIPTION_BACKEND == "groq":
+            _backend = GroqBackend()
+        else:
+            module, _, attribute = TRANSCRIPTION_BACKEND.partition(":")
+            backend = getattr(importlib.import_module(module), attribute)
+            backend = backend() if callable(backend) else backend
+            if not isinstance(backend, TranscriptionBackend):
+                raise TypeError(f"{TRANSCRIPTION_BACKEND} is not a TranscriptionBackend")
+            _backend = backend
+    return _backend
+
+
+def set_backend(backend: Optional[TranscriptionBackend]) -> None:
+    """Replace the streaming backend, e.g. with a local stand-in; None restores the configured one."""
+    global _backend
+    _backend = backend
+
+
+class StreamingSession:
+    """
+    Incremental transcription of one live recording.
+
+    Audio (16-bit mono PCM) is appended as it arrives. Each `step()` either
+    re-transcribes the pending audio for a partial result, or commits it: the
+    pending audio up to a pause is transcribed one last time, its segments
+    become final and that audio is dropped. Only pending audio is kept, so
+    memory is bounded by the window length rather than the visit length.
+    """
+
+    def __init__(self, sample_rate: int = 16000, backend: Optional[TranscriptionBackend] = None,
+                 session_id: Optional[str] = None):
+        self.session_id = session_id or uuid.uuid4().hex
+        self.sample_rate = sample_rate
+        self.backend = backend or get_backend()
+        self.segments: List[Dict] = []
+        self._buffer = bytearray()
+        self._buffer_start = 0.0  # recording time of the first buffered sample
+        self._partial_until = 0.0
+        self._overlapping = False
+
+    @property
+    def duration(self) -> float:
+        return self._buffer_start + len(self._buffer) / (2 * self.sample_rate)
+
+    def append(self, pcm: bytes) -> None:
+        if len(pcm) % 2:
+            raise ValueError("Audio must be 16-bit PCM")
+        self._buffer.extend(pcm)
+        if self.duration > STREAM_MAX_SECONDS:
+            raise ValueError(f"Recording exceeds {STREAM_MAX_SECONDS:.0f} seconds")
+
+    def ready(self) -> bool:
+        """Whether enough new audio has arrived to be worth another step."""
+        return self.duration - self._partial_until >= STREAM_STEP_SECONDS
+
+    def _pending(self) -> PCMAudio:
+        return PCMAudio(bytes(self._buffer), self.sample_rate, 1, 2)
+
+    def _commit_point(self, audio: PCMAudio) -> Optional[float]:
+        """Seconds into the pending audio at which to commit, or None to keep waiting."""
+        if audio.duration < STREAM_COMMIT_SECONDS:
+            return None
+        # Leave a second after the pause so the cut is not right at the live edge
+        pauses = [p for p in find_silences(audio) if 1.0 < (p[0] + p[1]) / 2 < audio.duration - 1.0]
+        if pauses:
+            return (pauses[-1][0] + pauses[-1][1]) / 2
+        if audio.duration >= STREAM_WINDOW_SECONDS:
+            return audio.duration
+        return None
+
+    async def step(self, final: bool = False) -> List[Dict]:
+        """
+        Transcribe pending audio.
+
+        Returns:
+            list: Events, {"type": "final", "segments": [...]} for committed audio
+                  and {"type": "partial", "start", "end", "text"} for the rest
+        """
+        audio = self._pending()
+        if audio.duration <= 0:
+            return []
+        cut = audio.duration if final else self._commit_point(audio)
+        if cut is None:
+            result = await self.backend.transcribe(audio.wav(0, audio.duration))
+            self._partial_until = self.duration
+            return [{"type": "partial", "start": round(self._buffer_start, 2), "end": round(self.duration, 2),
+                     "text": result["text"].strip()}]
+
+        result = await self.backend.transcribe(audio.wav(0, cut))
+        segments = parse_segments(result, self._buffer_start) or [
+            {"start": round(self._buffer_start, 2), "end": round(self._buffer_start + cut, 2),
+             "text": result["text"].strip()}
+        ]
+        if self._overlapping and self.segments and segments:
+            segments[0]["text"] = drop_repeated_words(self.segments[-1]["text"], segments[0]["text"])
+        segments = [s for s in segments if s["text"]]
+        self.segments.extend(segments)
+
+        # A cut without a pause may split a word, so the next window re-hears the last second
+        self._overlapping = not final and cut >= audio.duration
+        keep_from = max(0.0, cut - STREAM_OVERLAP_SECONDS) if self._overlapping else cut
+        drop = int(keep_from * self.sample_rate) * 2
+        del self._buffer[:drop]
+        self._buffer_start += drop / (2 * self.sample_rate)
+        self._partial_until = self.duration if final else self._buffer_start
+        return [{"type": "final", "segments": segments}]
+
+    def transcript(self) -> Dict:
+        return {
+            "session_id": self.session_id,
+            "text": " ".join(s["text"] for s in self.segments),
+            "segments": self.segments,
+            "duration": round(self.duration, 2),
+        }
+
+    async def finish(self) -> List[Dict]:
+        """
+        Commit whatever audio is left and store the transcript for later retrieval.
+
+        Returns:
+            list: The last events, ending with {"type": "transcript", "session_id", "text", "segments", "duration"}
+        """
+        events = await self.step(final=True)
+        transcript = self.transcript()
+        transcripts.set(self.session_id, transcript)
+        return events + [{"type": "transcript", **transcript}]
+
+
+def get_transcript(session_id: str) -> Optional[Dict]:
+    """Return the stored transcript of a finished session, if it has not expired."""
+    found, transcript = transcripts.get(session_id)
+    return transcript if found else None
@@ -0,0 +1,131 @@
+import asyncio
+import os
+import re
+from typing import Awaitable, Callable, List, Tuple
+
+from core.tokens import count_tokens
+
+# Largest prompt sent to the model in one call; longer transcripts are condensed first
+PROMPT_TOKEN_BUDGET = int(os.getenv("LLM_PROMPT_TOKEN_BUDGET", "6000"))
+CHUNK_TOKENS = int(os.getenv("SUMMARY_CHUNK_TOKENS", "1500"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("SUMMARY_CHUNK_OVERLAP_TOKENS", "150"))
+MAP_CONCURRENCY = int(os.getenv("SUMMARY_MAP_CONCURRENCY", "4"))
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+CHUNK_PROMPT = """Summarize part {index} of {total} of a medical consultation transcript.
+    Keep every symptom, finding, measurement, medication, decision and follow-up item, and note who said it.
+    Do not add any information that is not in the transcript.
+
+    Transcript part:
+    {chunk}"""
+
+REDUCE_PROMPT = """Combine these consecutive partial summaries of one medical consultation into a single summary.
+    The parts overlap slightly, so remove repetition, but keep every clinically relevant detail.
+
+    Partial summaries:
+    {summaries}"""
+
+
+def _split_oversized(unit: str, max_tokens: int) -> List[str]:
+    """Break a unit that is too long on its own, first at sentences and then at words."""
+    pieces = []
+    for sentence in _SENTENCE_END.split(unit):
+        if count_tokens(sentence) <= max_tokens:
+            pieces.append(sentence)
+            continue
+        current, current_tokens = [], 0
+        for word in sentence.split():
+            tokens = count_tokens(" " + word)
+            if current and current_tokens + tokens > max_tokens:
+                pieces.append(" ".join(current))
+                current, current_tokens = [], 0
+            current.append(word)
+            current_tokens += tokens
+        if current:
+            pieces.append(" ".join(current))
+    return pieces
+
+
+def _units(text: str, max_tokens: int) -> List[Tuple[str, int]]:
+    # Speaker turns are on their own lines, so lines are the natural unit
+    units = []
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        parts = [line] if count_tokens(line) <= max_tokens else _split_oversized(line, max_tokens)
+        units.extend((part, count_tokens(part)) for part in parts)
+    return units
+
+
+def chunk_transcript(text: str, chunk_tokens: int = CHUNK_TOKENS,
+                     overlap_tokens: int = CHUNK_OVERLAP_TOKENS) -> List[str]:
+    """
+    Split a transcript into chunks of at most about `chunk_tokens` tokens.
+
+    Chunks break at speaker turns (lines), falling back to sentence and word
+    boundaries for very long turns. Each chunk repeats the trailing turns of the
+    previous one, up to `overlap_tokens`, so context is not lost at the seams.
+    """
+    overlap_tokens = min(overlap_tokens, chunk_tokens // 2)
+    chunks, current, current_tokens = [], [], 0
+    for unit, tokens in _units(text, chunk_tokens):
+        if current and current_tokens + tokens > chunk_tokens:
+            chunks.append("\n".join(u for u, _ in current))
+            carried, carried_tokens = [], 0
+            for previous in reversed(current):
+                if carried_tokens + previous[1] > overlap_tokens:
+                    break
+                carried.insert(0, previous)
+                carried_tokens += previous[1]
+            current, current_tokens = carried, carried_tokens
+        current.append((unit, tokens))
+        current_tokens += tokens
+    if current:
+        chunks.append("\n".join(u for u, _ in current))
+    return chunks
+
+
+async def _gather_bounded(prompts: List[str], generate: Callable[[str], Awaitable[str]]) -> List[str]:
+    semaphore = asyncio.Semaphore(MAP_CONCURRENCY)
+
+    async def run(prompt: str) -> str:
+        async with semaphore:
+            return await generate(prompt)
+
+    return await asyncio.gather(*(run(prompt) for prompt in prompts))
+
+
+async def condense_transcript(text: str, target_tokens: int, generate: Callable[[str], Awaitable[str]]) -> str:
+    """
+    Map-reduce a long transcript down to roughly `target_tokens` tokens.
+
+    Chunks are summarized concurrently, then neighbouring summaries are merged
+    group by group until the result fits the target.
+
+    Args:
+        text (str): The full transcript
+        target_tokens (int): Token budget the condensed text must fit into
+        generate (callable): Async function running one prompt through the model
+    """
+    chunks = chunk_transcript(text)
+    summaries = await _gather_bounded(
+        [CHUNK_PROMPT.format(index=i + 1, total=len(chunks), chunk=chunk) for i, chunk in enumerate(chunks)],
+        generate,
+    )
+
+    while len(summaries) > 1 and count_tokens("\n\n".join(summaries)) > target_tokens:
+        groups, current = [], []
+        for summary in summaries:
+            if len(current) >= 2 and count_tokens("\n\n".join(current + [summary])) > CHUNK_TOKENS:
+                groups.append(current)
+                current = []
+            current.append(summary)
+        groups.append(current)
+        merged = await _gather_bounded(
+            [REDUCE_PROMPT.format(summaries="\n\n".join(group)) for group in groups if len(group) > 1],
+            generate,
+        )
+        # A trailing group of one is carried into the next round unchanged
+        summaries = merged + groups[-1] if len(groups[-1]) == 1 else merged
+    return "\n\n".join(summaries)
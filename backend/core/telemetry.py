@@ -0,0 +1,357 @@
+import asyncio
+import contextvars
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter as Tally
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from starlette.datastructures import MutableHeaders
+
+# Requests slower than this have their event-loop stack samples written to PROFILE_DIR; 0 turns the profiler off
+PROFILE_SLOW_REQUEST_MS = float(os.getenv("PROFILE_SLOW_REQUEST_MS", "0"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv("PROFILE_DIR") or os.path.join(tempfile.gettempdir(), "mediscribe-profiles")
+# Histogram buckets in seconds, from a cache hit to a long generation
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Metric:
+    """A named family of samples, one per combination of label values."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, description: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self._values: Dict[Labels, float] = {}
+        REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Labels:
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"
+                for key, value in sorted(self._values.items())]
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}", *self.samples()]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def clear(self) -> None:
+        self._values.clear()
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, description: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self._counts: Dict[Labels, List[int]] = {}
+        self._sums: Dict[Labels, float] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        counts = self._counts.setdefault(key, [0] * len(self.buckets))
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[index] += 1
+                break
+        self._sums[key] = self._sums.get(key, 0.0) + value
+
+    def samples(self) -> List[str]:
+        lines = []
+        for key, counts in sorted(self._counts.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {round(self._sums[key], 6)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+REGISTRY: List[Metric] = []
+# Called before each scrape to refresh gauges owned by other modules
+_collectors: List[Callable[[], None]] = []
+
+http_request_seconds = Histogram("mediscribe_http_request_duration_seconds",
+                                 "Time to serve a request, until its last byte is sent", ("method", "route", "status"))
+http_in_flight = Gauge("mediscribe_http_requests_in_flight", "Requests currently being served")
+upstream_seconds = Histogram("mediscribe_upstream_request_duration_seconds",
+                             "Time of each call to Supabase, watsonx, Groq or the local database",
+                             ("upstream", "operation"))
+upstream_errors = Counter("mediscribe_upstream_errors_total", "Upstream calls that failed, by HTTP status or error",
+                          ("upstream", "operation", "error"))
+upstream_in_flight = Gauge("mediscribe_upstream_requests_in_flight", "Upstream calls currently running", ("upstream",))
+llm_tokens = Counter("mediscribe_llm_tokens_total", "Tokens sent to and generated by each model", ("model", "kind"))
+llm_first_token_seconds = Histogram("mediscribe_llm_first_token_seconds",
+                                    "Time from asking a model to its first token, for the model that answered",
+                                    ("model",))
+
+
+def add_collector(collector: Callable[[], None]) -> None:
+    """Run `collector` before every scrape, e.g. to copy another module's counts into gauges."""
+    _collectors.append(collector)
+
+
+def render_metrics() -> str:
+    """Every metric in the Prometheus text exposition format."""
+    for collector in _collectors:
+        collector()
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
+
+
+class Trace:
+    """Time spent per upstream while serving one request, for its Server-Timing header."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans: Dict[str, List[float]] = {}
+
+    def add(self, name: str, seconds: float) -> None:
+        span = self.spans.setdefault(name, [0, 0.0])
+        span[0] += 1
+        span[1] += seconds
+
+    def merge(self, other: "Trace") -> None:
+        for name, (count, total) in other.spans.items():
+            span = self.spans.setdefault(name, [0, 0.0])
+            span[0] += count
+            span[1] += total
+
+    def server_timing(self) -> str:
+        # Concurrent calls overlap, so the upstream totals can add up to more than "app"
+        entries = [f'{name};dur={total * 1000:.1f};desc="{count} call{"s" if count > 1 else ""}"'
+                   for name, (count, total) in self.spans.items()]
+        entries.append(f"app;dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ", ".join(entries)
+
+
+_trace: contextvars.ContextVar = contextvars.ContextVar("request_trace", default=None)
+
+
+def record(name: str, seconds: float) -> None:
+    """Add time spent on `name` to the current request's Server-Timing header, if there is one."""
+    trace = _trace.get()
+    if trace is not None:
+        trace.add(name, seconds)
+
+
+def current_trace() -> Optional[Trace]:
+    """The trace of the request being served, or None outside one."""
+    return _trace.get()
+
+
+@contextmanager
+def tracing(trace: Trace):
+    """Record the upstream time spent inside the block (and tasks started from it) into `trace`."""
+    token = _trace.set(trace)
+    try:
+        yield
+    finally:
+        _trace.reset(token)
+
+
+@contextmanager
+def span(upstream: str, operation: str):
+    """
+    Time one outbound call.
+
+    The duration goes to the upstream latency histogram and to the current
+    request's Server-Timing header; a failure is counted by its HTTP status,
+    or its exception type when there is none.
+    """
+    upstream_in_flight.inc(upstream=upstream)
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        # Imported here because core.governor reports its own waits through this module
+        from core.governor import inspect_error
+
+        status = inspect_error(e)[0]
+        upstream_errors.inc(upstream=upstream, operation=operation, error=str(status or type(e).__name__))
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        upstream_in_flight.dec(upstream=upstream)
+        upstream_seconds.observe(elapsed, upstream=upstream, operation=operation)
+        record(upstream, elapsed)
+
+
+class SlowRequestProfiler:
+    """
+    Samples the event loop's stack while requests run, and keeps the samples of slow ones.
+
+    A sample is credited to the request whose task is running at that moment,
+    so the report shows where a request spent CPU time in this process; time
+    spent awaiting upstreams is covered by the spans instead. Reports are in
+    folded-stack format, one "outer;...;inner count" line per stack, ready for
+    flamegraph.pl or speedscope.
+    """
+
+    def __init__(self, threshold_ms: float = PROFILE_SLOW_REQUEST_MS, interval_ms: float = PROFILE_INTERVAL_MS,
+                 directory: str = PROFILE_DIR):
+        self.threshold = threshold_ms / 1000
+        self.interval = interval_ms / 1000
+        self.directory = directory
+        self._samples: Dict[asyncio.Task, Tally] = {}
+        self._lock = threading.Lock()
+        self._active = threading.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self.reports = 0
+
+    def begin(self) -> None:
+        """Start collecting samples for the request running in the current task."""
+        task = asyncio.current_task()
+        if task is None:
+            return
+        with self._lock:
+            if self._loop is None:
+                self._loop = task.get_loop()
+                self._loop_thread = threading.get_ident()
+                threading.Thread(target=self._sample, name="request-profiler", daemon=True).start()
+            self._samples[task] = Tally()
+            self._active.set()
+
+    def end(self, label: str, elapsed: float) -> Optional[str]:
+        """Stop sampling the current task's request; write a report if it was slow and return its path."""
+        with self._lock:
+            samples = self._samples.pop(asyncio.current_task(), None)
+            if not self._samples:
+                self._active.clear()
+        if not samples or elapsed < self.threshold:
+            return None
+        os.makedirs(self.directory, exist_ok=True)
+        name = re.sub(r"[^A-Za-z0-9]+", "-", label).strip("-")
+        path = os.path.join(self.directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{name}-{elapsed * 1000:.0f}ms.folded")
+        with open(path, "w") as report:
+            report.writelines(f"{stack} {count}\n" for stack, count in samples.most_common())
+        self.reports += 1
+        hottest = samples.most_common(1)[0][0].rsplit(";", 1)[-1]
+        print(f"Slow request {label} took {elapsed * 1000:.0f}ms; {sum(samples.values())} samples "
+              f"(hottest {hottest}) written to {path}")
+        return path
+
+    def _sample(self) -> None:
+        current_tasks = getattr(asyncio.tasks, "_current_tasks", {})
+        while True:
+            self._active.wait()
+            time.sleep(self.interval)
+            frame = sys._current_frames().get(self._loop_thread)
+            task = current_tasks.get(self._loop)
+            if frame is None or task is None:
+                continue
+            with self._lock:
+                samples = self._samples.get(task)
+                if samples is None:
+                    continue
+            stack = []
+            while frame is not None:
+                stack.append(f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}")
+                frame = frame.f_back
+            samples[";".join(reversed(stack))] += 1
+
+
+profiler = SlowRequestProfiler() if PROFILE_SLOW_REQUEST_MS > 0 else None
+
+
+def _route_name(scope) -> str:
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    # Plain Starlette routes such as /docs have fixed paths; anything else would add a series per URL
+    return scope["path"] if "endpoint" in scope else "unmatched"
+
+
+class TelemetryMiddleware:
+    """
+    Times every HTTP request and reports where the time went.
+
+    Adds a Server-Timing header with the time spent per upstream plus the
+    total so far. For a streamed response the header is sent before the body,
+    so it only covers the work done before streaming started. The full
+    duration, labelled by route template, goes to the request histogram.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        trace = Trace()
+        token = _trace.set(trace)
+        status = 500
+        http_in_flight.inc()
+        if profiler is not None:
+            profiler.begin()
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                MutableHeaders(scope=message).append("Server-Timing", trace.server_timing())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            elapsed = time.perf_counter() - trace.started
+            route = _route_name(scope)
+            http_in_flight.dec()
+            http_request_seconds.observe(elapsed, method=scope["method"], route=route, status=str(status))
+            if profiler is not None:
+                profiler.end(f"{scope['method']} {route}", elapsed)
+            _trace.reset(token)
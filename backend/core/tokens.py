@@ -0,0 +1,39 @@
+import os
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    import tiktoken
+
+# Granite ships its own tokenizer; cl100k_base is close enough for budgeting and
+# avoids loading model weights. Override with TOKENIZER_ENCODING if needed.
+ENCODING_NAME = os.getenv("TOKENIZER_ENCODING", "cl100k_base")
+# Rough characters-per-token ratio used when the encoding cannot be loaded
+FALLBACK_CHARS_PER_TOKEN = 4
+
+_encoding = None
+_encoding_failed = False
+
+
+def get_encoding() -> Optional["tiktoken.Encoding"]:
+    """Load the tiktoken encoding once; returns None if it is unavailable (e.g. offline)."""
+    global _encoding, _encoding_failed
+    if _encoding is None and not _encoding_failed:
+        try:
+            # Imported here so modules that only might count tokens start quickly
+            import tiktoken
+
+            _encoding = tiktoken.get_encoding(ENCODING_NAME)
+        except Exception as e:
+            print(f"Tokenizer {ENCODING_NAME} unavailable, estimating token counts: {e}")
+            _encoding_failed = True
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    """Count the tokens in `text`."""
+    if not text:
+        return 0
+    encoding = get_encoding()
+    if encoding is None:
+        return -(-len(text) // FALLBACK_CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
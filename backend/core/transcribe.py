@@ -1,20 +1,293 @@
+import asyncio
+import hashlib
+import json
 import os
-from groq import Groq
+import re
+import uuid
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+import aiofiles
+import httpx
+
+from core.audio import find_silences, load_audio, plan_pieces
+from core.governor import groq
+from core.llm_cache import CACHE_BYPASS, CACHE_USE, LLMResultCache, cache_key
+from core.telemetry import span
+
+# Groq's OpenAI-compatible API; point GROQ_BASE_URL at a stand-in server for benchmarks
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL", "https://api.groq.com/openai/v1")
+TRANSCRIPTION_MODEL = os.getenv("TRANSCRIPTION_MODEL", "whisper-large-v3")
+TRANSCRIPTION_TIMEOUT = float(os.getenv("TRANSCRIPTION_TIMEOUT", "300"))
+# Groq rejects files over 25MB, so larger uploads are refused before they are forwarded
+MAX_UPLOAD_BYTES = int(float(os.getenv("TRANSCRIPTION_MAX_UPLOAD_MB", "25")) * 1024 * 1024)
+FILE_CHUNK_BYTES = 256 * 1024
+ALLOWED_TYPES = ["audio/wav", "audio/mp3", "audio/mpeg", "audio/webm"]
+# Segmented mode: recordings are split into pieces of at most this length and transcribed concurrently
+SEGMENT_MAX_SECONDS = float(os.getenv("TRANSCRIPTION_SEGMENT_SECONDS", "120"))
+SEGMENT_OVERLAP_SECONDS = float(os.getenv("TRANSCRIPTION_SEGMENT_OVERLAP_SECONDS", "1.0"))
+SEGMENT_WORKERS = int(os.getenv("TRANSCRIPTION_WORKERS", "4"))
+SEGMENTED_MAX_UPLOAD_BYTES = int(float(os.getenv("TRANSCRIPTION_SEGMENTED_MAX_UPLOAD_MB", "200")) * 1024 * 1024)
+# Longest run of words repeated across a seam that is treated as a duplicate
+SEAM_MAX_WORDS = 12
+# Bump when a change alters transcripts for the same audio, so cached ones are not reused
+TRANSCRIPT_VERSION = "1"
+
+_client: Optional[httpx.AsyncClient] = None
+
+# Transcripts keyed by the SHA-256 of the audio; set TRANSCRIPTION_CACHE_PATH to keep them across restarts
+transcript_cache = LLMResultCache(
+    memory_max_bytes=int(os.getenv("TRANSCRIPTION_CACHE_MEMORY_BYTES", str(16 * 1024 * 1024))),
+    disk_path=os.getenv("TRANSCRIPTION_CACHE_PATH"),
+    disk_max_bytes=int(os.getenv("TRANSCRIPTION_CACHE_DISK_BYTES", str(256 * 1024 * 1024))),
+)
+
+
+def get_transcription_client() -> httpx.AsyncClient:
+    """Return the process-wide client used for transcription requests, creating it on first use."""
+    global _client
+    if _client is None:
+        api_key = os.getenv("GROQ_API_KEY")
+        if not api_key:
+            raise ValueError("GROQ_API_KEY must be set")
+        _client = httpx.AsyncClient(
+            base_url=GROQ_BASE_URL,
+            headers={"Authorization": f"Bearer {api_key}"},
+            timeout=httpx.Timeout(TRANSCRIPTION_TIMEOUT, connect=10.0),
+        )
+    return _client
+
+
+async def close_transcription_client() -> None:
+    """Close the shared transcription client."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
 
-def transcribe_audio(file_path: str) -> str:
-    """Transcribe an audio file using Groq API."""
-    client = Groq()
 
-    with open(file_path, "rb") as file:
-        transcription = client.audio.transcriptions.create(
-            file=(os.path.basename(file_path), file.read()),
-            model="whisper-large-v3",
-            response_format="verbose_json",
+async def _multipart_body(boundary: str, filename: str, content_type: str,
+                          chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    fields = {"model": TRANSCRIPTION_MODEL, "response_format": "verbose_json"}
+    for name, value in fields.items():
+        yield (f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n').encode()
+    safe_name = filename.replace('"', "").replace("\r", "").replace("\n", "")
+    yield (
+        f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{safe_name}"\r\n'
+        f"Content-Type: {content_type}\r\n\r\n"
+    ).encode()
+    async for chunk in chunks:
+        yield chunk
+    yield f"\r\n--{boundary}--\r\n".encode()
+
+
+async def _request(filename: str, content_type: str, chunks: AsyncIterator[bytes]) -> Dict:
+    boundary = uuid.uuid4().hex
+    with span("groq", "transcription"):
+        response = await get_transcription_client().post(
+            "/audio/transcriptions",
+            content=_multipart_body(boundary, filename, content_type, chunks),
+            headers={"Content-Type": f"multipart/form-data; boundary={boundary}"},
         )
-        print(transcription.text)
-        return transcription.text
+        response.raise_for_status()
+        return response.json()
+
+
+def parse_segments(result: Dict, offset: float = 0.0) -> List[Dict]:
+    """Reduce Groq's verbose segments to start/end/text, shifted by `offset` seconds."""
+    return [
+        {"start": round(offset + s["start"], 2), "end": round(offset + s["end"], 2), "text": s["text"].strip()}
+        for s in result.get("segments") or []
+        if s.get("text", "").strip()
+    ]
+
+
+def _transcript_key(digest: str, segmented: bool) -> str:
+    kind = "transcription_segmented" if segmented else "transcription"
+    return cache_key(TRANSCRIPTION_MODEL, kind, TRANSCRIPT_VERSION, {"sha256": digest.lower()})
+
+
+async def get_cached_transcript(digest: str, segmented: bool = False) -> Optional[Dict]:
+    """Return the stored transcript for audio with this SHA-256 hex digest, if any."""
+    cached = await asyncio.to_thread(transcript_cache.get, _transcript_key(digest, segmented))
+    return json.loads(cached) if cached is not None else None
+
+
+async def _store_transcript(digest: str, segmented: bool, transcript: Dict) -> None:
+    if transcript["text"]:
+        await asyncio.to_thread(transcript_cache.set, _transcript_key(digest, segmented), json.dumps(transcript))
+
+
+async def _hashed(chunks: AsyncIterator[bytes], hasher) -> AsyncIterator[bytes]:
+    async for chunk in chunks:
+        hasher.update(chunk)
+        yield chunk
+
+
+async def _replay(data: bytearray) -> AsyncIterator[memoryview]:
+    # Slices of a view share the buffer, so replaying does not copy the audio
+    view = memoryview(data)
+    for offset in range(0, len(view), FILE_CHUNK_BYTES):
+        yield view[offset:offset + FILE_CHUNK_BYTES]
+
+
+async def transcribe_stream(filename: str, content_type: str, chunks: AsyncIterator[bytes],
+                            cache: str = CACHE_USE, expected_sha256: Optional[str] = None) -> Dict:
+    """
+    Transcribe audio using Groq API while it is still being received.
+
+    The audio is forwarded chunk by chunk as a streamed multipart request, so
+    it is never written to disk or held in memory as a whole. It is hashed on
+    the way through and the transcript stored under that hash.
+
+    A repeat upload can only be recognised once all of it has been hashed, by
+    which time it has already been sent. So the cache is checked first only
+    when the client states the hash it expects (`expected_sha256`) and a
+    transcript is stored under it: the upload is then read and hashed in full,
+    and the stored transcript returned only if the digest matches. Otherwise
+    the buffered audio is transcribed, and unlike a streamed upload it can be
+    sent again if the request fails.
+
+    Args:
+        filename (str): Original file name; its extension tells Groq the format
+        content_type (str): MIME type of the audio
+        chunks: Async iterator over the audio bytes
+        cache (str): "use" or "refresh" store the transcript, "bypass" does not
+        expected_sha256 (str): Hex SHA-256 the client computed for the audio, if any
+
+    Returns:
+        dict: {"text": str, "segments": [{"start", "end", "text"}], "sha256": str, "cached": bool}
+    """
+    hasher = hashlib.sha256()
+    data = None
+    if cache == CACHE_USE and expected_sha256 and await get_cached_transcript(expected_sha256) is not None:
+        data = bytearray()
+        async for chunk in chunks:
+            hasher.update(chunk)
+            data.extend(chunk)
+        if hasher.hexdigest() == expected_sha256.lower():
+            cached = await get_cached_transcript(hasher.hexdigest())
+            if cached is not None:
+                return {**cached, "sha256": hasher.hexdigest(), "cached": True}
+    if data is None:
+        # The upload is forwarded as it arrives and cannot be replayed, so it is never retried
+        result = await groq.call(lambda: _request(filename, content_type, _hashed(chunks, hasher)), retries=0)
+    else:
+        # Already held in memory and hashed, so each retry sends it again from the start
+        result = await groq.call(lambda: _request(filename, content_type, _replay(data)))
+    transcript = {"text": result["text"].strip(), "segments": parse_segments(result)}
+    if cache != CACHE_BYPASS:
+        await _store_transcript(hasher.hexdigest(), False, transcript)
+    return {**transcript, "sha256": hasher.hexdigest(), "cached": False}
+
+
+async def transcribe_wav(wav: bytes, filename: str = "audio.wav") -> Dict:
+    """Transcribe an in-memory WAV file, returning Groq's verbose_json result."""
+    async def body():
+        yield wav
+
+    return await groq.call(lambda: _request(filename, "audio/wav", body()))
+
+
+def _words(text: str) -> List[str]:
+    return re.sub(r"[^\w\s']", "", text.lower()).split()
+
+
+def drop_repeated_words(previous: str, text: str) -> str:
+    """Remove words at the start of `text` that repeat the end of `previous`."""
+    before, after = _words(previous), _words(text)
+    for size in range(min(SEAM_MAX_WORDS, len(before), len(after)), 1, -1):
+        if before[-size:] == after[:size]:
+            return " ".join(text.split()[size:])
+    return text
+
+
+def stitch(pieces: List[Tuple[float, float]], results: List[Dict]) -> Dict:
+    """
+    Merge per-piece transcriptions into one, on the recording's timeline.
+
+    Where two pieces overlap, each segment is kept from the piece whose half of
+    the overlap contains its midpoint, and words repeated across the seam are
+    dropped.
+    """
+    segments = []
+    for index, ((start, end), result) in enumerate(zip(pieces, results)):
+        overlap_before = index > 0 and start < pieces[index - 1][1]
+        lower = (start + pieces[index - 1][1]) / 2 if overlap_before else float("-inf")
+        upper = (end + pieces[index + 1][0]) / 2 if index + 1 < len(pieces) else float("inf")
+        piece_segments = parse_segments(result, start) or [{"start": round(start, 2), "end": round(end, 2),
+                                                       "text": result["text"].strip()}]
+        first = True
+        for segment in piece_segments:
+            if not lower <= (segment["start"] + segment["end"]) / 2 < upper:
+                continue
+            if first and overlap_before and segments:
+                segment["text"] = drop_repeated_words(segments[-1]["text"], segment["text"])
+            first = False
+            if segment["text"]:
+                segments.append(segment)
+    return {"text": " ".join(segment["text"] for segment in segments), "segments": segments}
+
+
+async def transcribe_segmented(content_type: str, chunks: AsyncIterator[bytes],
+                               workers: int = SEGMENT_WORKERS, cache: str = CACHE_USE) -> Dict:
+    """
+    Transcribe a long recording in pieces split at pauses, several pieces at a time.
+
+    The whole recording is decoded before any piece is sent, so a recording
+    transcribed before is answered from the cache without calling Groq.
+
+    Args:
+        content_type (str): MIME type of the audio; formats other than WAV need ffmpeg
+        chunks: Async iterator over the audio bytes
+        workers (int): Pieces transcribed concurrently
+        cache (str): "use", "refresh" (transcribe again and store) or "bypass"
+
+    Returns:
+        dict: {"text", "segments": [{"start", "end", "text"}], "duration", "pieces", "sha256", "cached"}
+    """
+    hasher = hashlib.sha256()
+    audio = await load_audio(content_type, _hashed(chunks, hasher))
+    digest = hasher.hexdigest()
+    if cache == CACHE_USE:
+        cached = await get_cached_transcript(digest, segmented=True)
+        if cached is not None:
+            return {**cached, "sha256": digest, "cached": True}
+
+    # Keep every piece comfortably under the upstream upload limit
+    max_seconds = min(SEGMENT_MAX_SECONDS, 0.9 * MAX_UPLOAD_BYTES / audio.bytes_per_second)
+    # Measuring loudness is CPU-bound, so keep it off the event loop
+    silences = await asyncio.to_thread(find_silences, audio)
+    pieces = plan_pieces(audio.duration, silences, max_seconds, SEGMENT_OVERLAP_SECONDS)
+    semaphore = asyncio.Semaphore(workers)
+
+    async def transcribe_piece(index: int, start: float, end: float) -> Dict:
+        async with semaphore:
+            return await transcribe_wav(audio.wav(start, end), f"piece-{index}.wav")
+
+    results = await asyncio.gather(*(transcribe_piece(i, start, end) for i, (start, end) in enumerate(pieces)))
+    merged = stitch(pieces, results)
+    merged.update(duration=round(audio.duration, 2), pieces=len(pieces))
+    if cache != CACHE_BYPASS:
+        await _store_transcript(digest, True, merged)
+    return {**merged, "sha256": digest, "cached": False}
+
+
+async def _file_chunks(file_path: str) -> AsyncIterator[bytes]:
+    async with aiofiles.open(file_path, "rb") as file:
+        while chunk := await file.read(FILE_CHUNK_BYTES):
+            yield chunk
+
+
+async def transcribe_audio(file_path: str) -> str:
+    """Transcribe an audio file using Groq API."""
+    result = await transcribe_stream(os.path.basename(file_path), "application/octet-stream", _file_chunks(file_path))
+    return result["text"]
+
 
 if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    load_dotenv()
     filename = os.path.join(os.path.dirname(__file__), "audio.m4a")  # Replace with your audio file path
-    transcription = transcribe_audio(filename)
+    transcription = asyncio.run(transcribe_audio(filename))
     print("Transcription:", transcription)
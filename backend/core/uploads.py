@@ -0,0 +1,163 @@
+from typing import AsyncIterator, Dict, List, Mapping, Optional
+
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+
+# Largest plain (non-file) form field kept in memory
+MAX_FIELD_BYTES = 1024 * 1024
+
+
+class UploadTooLarge(Exception):
+    """Raised when an upload exceeds its size limit."""
+
+    def __init__(self, max_bytes: int):
+        super().__init__(f"Upload exceeds the maximum size of {max_bytes} bytes")
+        self.max_bytes = max_bytes
+
+
+class InvalidUpload(Exception):
+    """Raised when a multipart body is malformed or lacks the expected file field."""
+
+
+class StreamingUpload:
+    """
+    One file field read straight from a multipart request body.
+
+    Unlike FastAPI's UploadFile, the file is never spooled to memory or disk:
+    `chunks()` yields its bytes as they arrive from the client, so the caller
+    can forward them upstream while the upload is still in progress. Plain
+    form fields are collected into `fields` as they are parsed; call `finish()`
+    after the file to read fields that follow it.
+    """
+
+    def __init__(self, stream: AsyncIterator[bytes], boundary: bytes, field: str, max_bytes: int):
+        self.field = field
+        self.max_bytes = max_bytes
+        self.filename: Optional[str] = None
+        self.content_type: Optional[str] = None
+        self.size = 0
+        self.fields: Dict[str, str] = {}
+        self._stream = stream
+        self._pending: List[bytes] = []
+        self._in_field = False
+        self._field_done = False
+        self._header_name = b""
+        self._header_value = b""
+        self._headers = {}
+        self._form_field: Optional[str] = None
+        self._form_data = bytearray()
+        self._parser = MultipartParser(boundary, {
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+        })
+
+    def _on_part_begin(self) -> None:
+        self._headers = {}
+
+    def _on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_name += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def _on_header_end(self) -> None:
+        self._headers[self._header_name.lower()] = self._header_value
+        self._header_name = self._header_value = b""
+
+    def _on_headers_finished(self) -> None:
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        name = options.get(b"name", b"").decode("latin-1")
+        if b"filename" not in options:
+            self._form_field = name
+            self._form_data = bytearray()
+            return
+        if name != self.field or self._field_done:
+            return
+        self._in_field = True
+        self.filename = options[b"filename"].decode("utf-8", errors="replace")
+        self.content_type = self._headers.get(b"content-type", b"application/octet-stream").decode("latin-1")
+
+    def _on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if self._form_field is not None:
+            self._form_data.extend(data[start:end])
+            if len(self._form_data) > MAX_FIELD_BYTES:
+                raise InvalidUpload(f"Form field '{self._form_field}' is too large")
+            return
+        if not self._in_field:
+            return
+        self.size += end - start
+        if self.size > self.max_bytes:
+            raise UploadTooLarge(self.max_bytes)
+        self._pending.append(data[start:end])
+
+    def _on_part_end(self) -> None:
+        if self._form_field is not None:
+            self.fields[self._form_field] = self._form_data.decode("utf-8", errors="replace")
+            self._form_field = None
+        if self._in_field:
+            self._in_field = False
+            self._field_done = True
+
+    async def _feed(self) -> bool:
+        """Parse the next chunk of the request body; returns False once the body is exhausted."""
+        async for chunk in self._stream:
+            self._parser.write(chunk)
+            return True
+        self._parser.finalize()
+        return False
+
+    async def start(self) -> "StreamingUpload":
+        """Read the body until the file field's headers have been parsed."""
+        while self.filename is None:
+            if not await self._feed():
+                raise InvalidUpload(f"Missing file field '{self.field}'")
+        return self
+
+    async def chunks(self) -> AsyncIterator[bytes]:
+        """Yield the file's bytes as they are received."""
+        while True:
+            pending, self._pending = self._pending, []
+            for data in pending:
+                yield data
+            if self._field_done:
+                return
+            if not await self._feed():
+                raise InvalidUpload("Upload ended before the file was complete")
+
+    async def finish(self) -> Dict[str, str]:
+        """Read the rest of the body, returning every plain form field."""
+        while await self._feed():
+            pass
+        return self.fields
+
+
+async def open_upload(headers: Mapping[str, str], stream: AsyncIterator[bytes], field: str,
+                      max_bytes: int) -> StreamingUpload:
+    """
+    Start reading file field `field` from a streamed multipart/form-data body.
+
+    Args:
+        headers: The request headers
+        stream: The request body, e.g. `request.stream()`
+        field (str): Name of the form field holding the file
+        max_bytes (int): Largest accepted file size
+
+    Raises:
+        UploadTooLarge: If Content-Length or the received file exceeds `max_bytes`
+        InvalidUpload: If the body is not multipart or lacks the field
+    """
+    content_type, params = parse_options_header(headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise InvalidUpload("Expected a multipart/form-data body")
+    # Reject obviously oversized bodies before reading any of them; the form
+    # framing adds well under 64KB on top of the file itself
+    content_length = headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes + 64 * 1024:
+        raise UploadTooLarge(max_bytes)
+    upload = StreamingUpload(stream, params[b"boundary"], field, max_bytes)
+    return await upload.start()
@@ -1,10 +1,51 @@
+from contextlib import asynccontextmanager
+import asyncio
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from app.routers import appointments, conversations, doctors, llm, patients, transcribe
+from app.routers import appointments, bulk, conversations, doctors, jobs, llm, patients, transcribe
+from core import db, prerequisites, streaming
+from core.cache import get_cache_stats
+from core.governor import get_governor_stats
+from core.jobs import job_queue
+from core.llm import WARM_UP_LLM, warm_up as warm_up_llm
+from core.storage import STORAGE_BACKEND, close_repository, get_repository
+from core.responses import CompressionMiddleware, FastJSONResponse
+from core.singleflight import get_singleflight_stats
+from core.telemetry import TelemetryMiddleware, render_metrics
+from core.transcribe import close_transcription_client
 from dotenv import load_dotenv
 
 load_dotenv()
-app = FastAPI(title="Medical API", version="1.0.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Open the shared Supabase pools up front and release them on shutdown
+    if STORAGE_BACKEND == "supabase":
+        try:
+            db.get_supabase_client()
+            await db.get_async_supabase_client()
+        except ValueError as e:
+            print(f"Supabase client not initialised: {e}")
+    # Load the LLM stack and answer common prerequisite questions in the background so startup is not delayed
+    background = []
+    if WARM_UP_LLM:
+        background.append(asyncio.create_task(warm_up_llm()))
+    if prerequisites.WARMUP_CONDITIONS:
+        background.append(asyncio.create_task(prerequisites.warm_up()))
+    # Load the live transcription backend now, so a misconfigured plugin fails startup rather than the first session
+    streaming.get_backend()
+    # Resume jobs left unfinished by the previous process
+    await job_queue.start()
+    yield
+    for task in background:
+        task.cancel()
+    await job_queue.stop()
+    await close_transcription_client()
+    await close_repository()
+    db.close_supabase_client()
+
+app = FastAPI(title="Medical API", version="1.0.0", lifespan=lifespan, default_response_class=FastJSONResponse)
 
 # Configure CORS
 origins = [
@@ -15,13 +56,18 @@ origins = [
     "https://mediscribe-v92j.vercel.app"
 ]
 
+# Innermost, so CORS and timing headers are added to the compressed response
+app.add_middleware(CompressionMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
+# Added last so it is outermost and times everything, including CORS handling
+app.add_middleware(TelemetryMiddleware)
 
 # Include routers
 app.include_router(doctors.router, prefix="/api/doctors", tags=["doctors"])
@@ -30,7 +76,26 @@ app.include_router(conversations.router, prefix="/api/conversations", tags=["con
 app.include_router(patients.router, prefix="/api/patients", tags=["patients"])
 app.include_router(llm.router, prefix="/api/llm", tags=["llm"])
 app.include_router(transcribe.router, prefix="/api/transcribe", tags=["transcribe"])
+app.include_router(jobs.router, prefix="/api/jobs", tags=["jobs"])
+app.include_router(bulk.router, prefix="/api/bulk", tags=["bulk"])
 
 @app.get("/")
 async def root():
-    return {"message": "Welcome to Medical API"} 
\ No newline at end of file
+    return {"message": "Welcome to Medical API"}
+
+@app.get("/health")
+async def health():
+    """Check storage connectivity and report connection pool, cache, coalescing and upstream provider usage."""
+    repository = get_repository()
+    return {
+        "storage": await repository.check_health(),
+        "pool": repository.pool_stats(),
+        "cache": get_cache_stats(),
+        "coalescing": get_singleflight_stats(),
+        "upstream": get_governor_stats(),
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Request, upstream and token metrics in the Prometheus text format."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,42 @@
+import time
+
+from core.availability import SlotIndex
+
+
+def appointment(appointment_id: str, doctor_id: str, day: str, time_value: str):
+    return {"appointment_id": appointment_id, "doctor_id": doctor_id, "date": day, "time": time_value}
+
+
+def test_loaded_day_answers_until_it_expires():
+    index = SlotIndex(ttl=60)
+    assert index.missing(["DR001"], ["2030-01-07"]) == [("DR001", "2030-01-07")]
+    index.load(["DR001"], ["2030-01-07"], [appointment("a1", "DR001", "2030-01-07", "9:00")], {})
+    assert index.missing(["DR001"], ["2030-01-07"]) == []
+    assert "9:00" not in index.free_slots("DR001", "2030-01-07")
+    index.remove("a1")
+    assert "9:00" in index.free_slots("DR001", "2030-01-07")
+
+
+def test_days_long_expired_are_evicted_on_the_next_load():
+    index = SlotIndex(ttl=0.05)
+    index.load(["DR001"], ["2030-01-07"], [appointment("a1", "DR001", "2030-01-07", "9:00")], {})
+    time.sleep(0.06)
+    # Expired, but kept for another TTL in case a query is still reading it
+    index.load(["DR002"], ["2030-01-07"], [], {})
+    assert ("DR001", "2030-01-07") in index._bitmaps
+    time.sleep(0.06)
+    index.load(["DR002"], ["2030-01-08"], [], {})
+    assert ("DR001", "2030-01-07") not in index._bitmaps
+    assert ("DR001", "2030-01-07") not in index._day_appointments
+    assert "a1" not in index._locations
+    assert list(index._loaded_at) == [("DR002", "2030-01-07"), ("DR002", "2030-01-08")]
+
+
+def test_reloading_a_day_keeps_it():
+    index = SlotIndex(ttl=0.05)
+    index.load(["DR001"], ["2030-01-07"], [], {})
+    time.sleep(0.06)
+    index.load(["DR001"], ["2030-01-07"], [], {})
+    time.sleep(0.06)
+    index.load(["DR002"], ["2030-01-07"], [], {})
+    assert ("DR001", "2030-01-07") in index._bitmaps
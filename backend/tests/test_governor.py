@@ -0,0 +1,151 @@
+import asyncio
+
+import httpx
+import pytest
+
+from core import governor
+from core.governor import BACKGROUND, INTERACTIVE, ProviderGovernor, TokenBucket, inspect_error, lane
+
+
+class Upstream429(Exception):
+    status_code = 429
+
+    def __init__(self, retry_after: str):
+        super().__init__("rate limited")
+        self.headers = {"retry-after": retry_after}
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(governor, "UPSTREAM_BACKOFF_BASE", 0.001)
+
+
+def test_waiting_calls_are_admitted_by_lane_then_arrival():
+    async def main():
+        upstream = ProviderGovernor("test", max_concurrency=1)
+        admitted = []
+        await upstream.acquire()
+
+        async def call(name, priority):
+            with lane(priority):
+                await upstream.acquire()
+            admitted.append(name)
+            upstream.release()
+
+        waiting = [asyncio.create_task(call("background", BACKGROUND)),
+                   asyncio.create_task(call("first", INTERACTIVE)),
+                   asyncio.create_task(call("second", INTERACTIVE))]
+        await asyncio.sleep(0.01)
+        assert admitted == []
+        assert upstream.stats()["lanes"]["background"]["queued"] == 1
+        upstream.release()
+        await asyncio.gather(*waiting)
+        return admitted, upstream
+
+    admitted, upstream = asyncio.run(main())
+    assert admitted == ["first", "second", "background"]
+    assert upstream.in_flight == 0
+    assert upstream.calls == 4
+
+
+def test_cancelled_waiter_leaves_the_queue_and_wakes_the_next():
+    async def main():
+        upstream = ProviderGovernor("test", max_concurrency=1)
+        await upstream.acquire()
+        first = asyncio.create_task(upstream.acquire())
+        second = asyncio.create_task(upstream.acquire())
+        await asyncio.sleep(0.01)
+        first.cancel()
+        upstream.release()
+        await asyncio.wait_for(second, 1)
+        return upstream
+
+    upstream = asyncio.run(main())
+    assert upstream.in_flight == 1
+    assert upstream._waiting == []
+
+
+def test_transient_failures_are_retried():
+    attempts = []
+
+    async def attempt():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise httpx.ConnectError("connection refused")
+        return "ok"
+
+    upstream = ProviderGovernor("test", max_concurrency=2)
+    assert asyncio.run(upstream.call(attempt, retries=4)) == "ok"
+    assert len(attempts) == 3
+    assert upstream.retries == 2
+    assert upstream.failures == 0
+    assert upstream.in_flight == 0
+
+
+@pytest.mark.parametrize("error, retries, can_retry", [
+    (ValueError("bad request"), 4, None),
+    (httpx.ConnectError("connection refused"), 0, None),
+    (httpx.ConnectError("connection refused"), 4, lambda: False),
+])
+def test_calls_that_cannot_be_retried_fail_at_once(error, retries, can_retry):
+    attempts = []
+
+    async def attempt():
+        attempts.append(1)
+        raise error
+
+    upstream = ProviderGovernor("test", max_concurrency=2)
+    with pytest.raises(type(error)):
+        asyncio.run(upstream.call(attempt, retries=retries, can_retry=can_retry))
+    assert len(attempts) == 1
+    assert upstream.failures == 1
+    assert upstream.in_flight == 0
+
+
+def test_rate_limit_halves_the_limit_and_pauses_the_provider():
+    attempts = []
+
+    async def attempt():
+        attempts.append(asyncio.get_running_loop().time())
+        if len(attempts) == 1:
+            raise Upstream429("0.05")
+        return "ok"
+
+    upstream = ProviderGovernor("test", max_concurrency=4)
+    assert asyncio.run(upstream.call(attempt)) == "ok"
+    assert upstream.rate_limited == 1
+    assert attempts[1] - attempts[0] >= 0.05
+    # Halved to 2, then grown back by half a slot for the successful retry
+    assert upstream.limit == 2.5
+
+
+def test_retry_after_beyond_the_cap_fails_the_call():
+    async def attempt():
+        raise Upstream429(str(governor.UPSTREAM_MAX_RETRY_AFTER + 1))
+
+    upstream = ProviderGovernor("test", max_concurrency=4)
+    with pytest.raises(Upstream429):
+        asyncio.run(upstream.call(attempt))
+    assert upstream.retries == 0
+    assert upstream.failures == 1
+
+
+def test_inspect_error_follows_the_cause_chain():
+    try:
+        try:
+            raise Upstream429("7")
+        except Upstream429 as e:
+            raise RuntimeError("provider error") from e
+    except RuntimeError as e:
+        assert inspect_error(e) == (429, 7.0, True)
+    assert inspect_error(ValueError("bad request")) == (None, None, False)
+
+
+def test_token_bucket_delays_once_the_minute_is_spent():
+    bucket = TokenBucket(60)
+    assert bucket.delay(60) == 0
+    bucket.take(60)
+    assert bucket.delay(1) == pytest.approx(1, abs=0.01)
+    # A request larger than the bucket only waits for a full one
+    assert bucket.delay(1000) == pytest.approx(60, abs=0.01)
+    assert TokenBucket(0).delay(1000) == 0
@@ -0,0 +1,62 @@
+import asyncio
+import json
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sse_starlette.sse import AppStatus
+
+from app.routers import llm as llm_routes
+
+CONVERSATION = {"text": "patient reports a cough", "doctor_notes": "", "patient_information": ""}
+
+
+def events(response):
+    parsed = []
+    for block in response.text.replace("\r\n", "\n").strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.split("\n") if ": " in line)
+        parsed.append((fields.get("event"), json.loads(fields["data"])))
+    return parsed
+
+
+def client() -> TestClient:
+    # sse-starlette keeps one shutdown event per process, bound to the first event loop that used it
+    AppStatus.should_exit_event = None
+    app = FastAPI()
+    app.include_router(llm_routes.router)
+    return TestClient(app)
+
+
+def test_prompt_is_fitted_inside_the_stream(monkeypatch):
+    calls = []
+
+    async def fit_prompt(build_prompt, text, cache):
+        calls.append(("fit", text))
+        await asyncio.sleep(0)
+        return build_prompt("condensed")
+
+    async def cached_stream_generate(kind, inputs, prompt, cache):
+        calls.append(("generate", kind))
+        assert "condensed" in prompt
+        for token in ("S: ", "cough"):
+            yield token
+
+    monkeypatch.setattr(llm_routes, "fit_prompt", fit_prompt)
+    monkeypatch.setattr(llm_routes, "cached_stream_generate", cached_stream_generate)
+
+    response = client().post("/soap-note/stream", json=CONVERSATION)
+    assert response.status_code == 200
+    received = events(response)
+    assert [data["text"] for event, data in received if event == "token"] == ["S: ", "cough"]
+    assert received[-1][0] == "done"
+    assert calls == [("fit", "patient reports a cough"), ("generate", "soap_note")]
+
+
+def test_failed_condensing_is_sent_as_an_error_event(monkeypatch):
+    async def fit_prompt(build_prompt, text, cache):
+        raise RuntimeError("chunk summary failed")
+
+    monkeypatch.setattr(llm_routes, "fit_prompt", fit_prompt)
+
+    response = client().post("/transcription-summary/stream", json={"text": "long transcript"})
+    assert response.status_code == 200
+    assert events(response) == [("error", {"detail": "chunk summary failed"})]
@@ -0,0 +1,182 @@
+import asyncio
+import time
+from typing import List, Optional
+
+import pytest
+
+from core import model_router
+from core.model_router import LATENCY_MIN_SAMPLES, ModelRoute, ModelRouter
+
+
+class FakeChunk:
+    def __init__(self, text: str):
+        self.text = text
+
+    def get_text_content(self) -> str:
+        return self.text
+
+
+class FakeModel:
+    """
+    Stands in for a beeai ChatModel in ModelRoute.
+
+    Each call emits `tokens` newToken events, the first after
+    `first_token_latency` seconds, or raises `error` after that delay.
+    """
+
+    def __init__(self, name: str, first_token_latency: float = 0.0, tokens: int = 3,
+                 token_delay: float = 0.01, error: Optional[Exception] = None):
+        self.provider_id = "fake"
+        self.model_id = name
+        self.first_token_latency = first_token_latency
+        self.tokens = tokens
+        self.token_delay = token_delay
+        self.error = error
+        self.calls = 0
+        self.sent = 0
+        self.aborted = False
+
+    def create(self, _input) -> "_FakeRun":
+        self.calls += 1
+        return _FakeRun(self)
+
+
+class _FakeRun:
+    def __init__(self, model: FakeModel):
+        self.model = model
+        self.handlers = []
+
+    def on(self, _event: str, handler) -> None:
+        self.handlers.append(handler)
+
+    def observe(self, observer) -> "_FakeRun":
+        observer(self)
+        return self
+
+    def __await__(self):
+        return self._run().__await__()
+
+    async def _run(self) -> None:
+        model = self.model
+        await asyncio.sleep(model.first_token_latency)
+        if model.error is not None:
+            raise model.error
+
+        def abort():
+            model.aborted = True
+
+        for index in range(model.tokens):
+            if index:
+                await asyncio.sleep(model.token_delay)
+            for handler in self.handlers:
+                handler((FakeChunk(f"{model.model_id}{index} "), abort), None)
+            if model.aborted:
+                return
+            model.sent += 1
+
+
+async def generate(router: ModelRouter, winners: List[ModelRoute]) -> str:
+    return "".join([token async for token in router.stream("prompt", winners.append)])
+
+
+@pytest.fixture(autouse=True)
+def quick_hedge(monkeypatch):
+    monkeypatch.setattr(model_router, "LLM_HEDGE_AFTER_SECONDS", 0.05)
+
+
+def test_primary_answers_alone_when_it_is_fast():
+    primary, backup = FakeModel("a"), FakeModel("b")
+    router = ModelRouter([primary, backup])
+    winners = []
+
+    assert asyncio.run(generate(router, winners)) == "a0 a1 a2 "
+    assert [route.model for route in winners] == [primary]
+    assert backup.calls == 0
+    assert router.hedges == 0
+    assert router.routes[0].wins == 1
+
+
+def test_slow_primary_is_hedged_and_the_loser_aborted():
+    primary, backup = FakeModel("a", first_token_latency=0.2), FakeModel("b")
+    router = ModelRouter([primary, backup])
+    winners = []
+
+    async def main():
+        text = await generate(router, winners)
+        # The loser stops at its first token after the race
+        await asyncio.sleep(0.3)
+        return text
+
+    assert asyncio.run(main()) == "b0 b1 b2 "
+    assert [route.model for route in winners] == [backup]
+    assert router.hedges == 1
+    assert primary.aborted
+    assert primary.sent == 0
+    slow, fast = router.routes
+    assert (slow.losses, slow.strikes, slow.wins) == (1, 1, 0)
+    assert (fast.wins, fast.strikes) == (1, 0)
+
+
+def test_failed_route_fails_over_without_waiting_for_the_hedge(monkeypatch):
+    monkeypatch.setattr(model_router, "LLM_HEDGE_AFTER_SECONDS", 5.0)
+    primary, backup = FakeModel("a", error=RuntimeError("model unavailable")), FakeModel("b")
+    router = ModelRouter([primary, backup])
+    winners = []
+
+    started = time.monotonic()
+    assert asyncio.run(generate(router, winners)) == "b0 b1 b2 "
+    assert time.monotonic() - started < 1
+    assert [route.model for route in winners] == [backup]
+    assert router.hedges == 0
+    assert router.routes[0].failures == 1
+
+
+def test_last_error_is_raised_when_every_route_fails():
+    router = ModelRouter([FakeModel("a", error=RuntimeError("first")),
+                          FakeModel("b", error=ValueError("second"))])
+    with pytest.raises(ValueError, match="second"):
+        asyncio.run(generate(router, []))
+
+
+def test_route_is_demoted_after_repeated_strikes(monkeypatch):
+    monkeypatch.setattr(model_router, "LLM_DEMOTE_AFTER", 2)
+    primary, backup = FakeModel("a", error=RuntimeError("model unavailable")), FakeModel("b")
+    router = ModelRouter([primary, backup])
+    failing = router.routes[0]
+
+    asyncio.run(generate(router, []))
+    assert not failing.demoted
+    asyncio.run(generate(router, []))
+    assert failing.demoted
+    assert failing.strikes == 0
+    assert [route.model for route in router.ordered()] == [backup, primary]
+    assert router.primary is primary
+
+    winners = []
+    asyncio.run(generate(router, winners))
+    assert primary.calls == 2
+    assert [route.model for route in winners] == [backup]
+
+
+def test_a_win_clears_earlier_strikes(monkeypatch):
+    monkeypatch.setattr(model_router, "LLM_DEMOTE_AFTER", 2)
+    route = ModelRoute(FakeModel("a"))
+    route.strike(failed=True)
+    route.answered(0.1)
+    route.strike(failed=False)
+    assert not route.demoted
+    assert (route.failures, route.losses, route.strikes) == (1, 1, 1)
+
+
+def test_hedge_delay_follows_the_p90_once_there_are_enough_samples(monkeypatch):
+    monkeypatch.setattr(model_router, "LLM_HEDGE_AFTER_SECONDS", 5.0)
+    monkeypatch.setattr(model_router, "LLM_HEDGE_MIN_SECONDS", 0.5)
+    route = ModelRoute(FakeModel("a"))
+    route.latencies.extend([2.0] * (LATENCY_MIN_SAMPLES - 1))
+    assert route.hedge_delay() == 5.0
+    route.latencies.append(2.0)
+    assert route.hedge_delay() == 2.0
+    route.latencies.extend([0.01] * 200)
+    assert route.hedge_delay() == 0.5
+    route.latencies.extend([60.0] * 200)
+    assert route.hedge_delay() == 5.0
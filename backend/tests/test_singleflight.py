@@ -0,0 +1,233 @@
+import asyncio
+
+import pytest
+
+from core import llm, singleflight
+from core.governor import BACKGROUND, INTERACTIVE, current_lane, lane
+from core.llm_cache import CACHE_BYPASS, CACHE_USE
+from core.singleflight import SingleFlight
+from core.storage import Repository
+from core.telemetry import Trace, record, tracing
+
+
+class Upstream:
+    """A call that blocks until released, counting how often it starts and how it ends."""
+
+    def __init__(self, result=None, error=None):
+        self.result = result
+        self.error = error
+        self.started = 0
+        self.cancelled = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.started += 1
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class GatedRepository(Repository):
+    """Keeps rows in memory; each select snapshots them, then waits for the gate."""
+
+    def __init__(self):
+        super().__init__()
+        self.rows = []
+        self.selects = 0
+        self.gate = asyncio.Event()
+
+    async def _select(self, table, filters, columns, order, descending, limit):
+        self.selects += 1
+        rows = [dict(row) for row in self.rows]
+        await self.gate.wait()
+        return rows
+
+    async def _insert(self, table, rows):
+        self.rows.extend(rows)
+        return rows
+
+    async def _update(self, table, filters, updates):
+        return []
+
+    async def _delete(self, table, filters):
+        return []
+
+
+def test_overlapping_calls_share_one_execution():
+    async def main():
+        group = SingleFlight("test")
+        upstream = Upstream(result=[{"id": 1}])
+        callers = [asyncio.create_task(group.run("key", upstream, share=lambda rows: [dict(r) for r in rows]))
+                   for _ in range(3)]
+        await asyncio.sleep(0.01)
+        upstream.release.set()
+        results = await asyncio.gather(*callers)
+        return group, upstream, results
+
+    group, upstream, results = asyncio.run(main())
+    assert upstream.started == 1
+    assert results == [[{"id": 1}]] * 3
+    # Joined callers get copies they can change without affecting each other
+    assert results[0] is upstream.result
+    assert results[1] is not results[0] and results[2] is not results[1]
+    assert group.stats() == {"in_flight": 0, "executed": 1, "coalesced": 2, "abandoned": 0}
+
+
+def test_cancelled_joiner_leaves_the_others_waiting():
+    async def main():
+        group = SingleFlight("test")
+        upstream = Upstream(result="done")
+        first = asyncio.create_task(group.run("key", upstream))
+        joiner = asyncio.create_task(group.run("key", upstream))
+        await asyncio.sleep(0.01)
+        joiner.cancel()
+        await asyncio.sleep(0.01)
+        upstream.release.set()
+        return group, upstream, await first, joiner
+
+    group, upstream, result, joiner = asyncio.run(main())
+    assert result == "done"
+    assert joiner.cancelled()
+    assert (upstream.started, upstream.cancelled) == (1, 0)
+    assert group.abandoned == 0
+
+
+def test_call_is_cancelled_once_every_caller_is_gone():
+    async def main():
+        group = SingleFlight("test")
+        upstream = Upstream(result="done")
+        callers = [asyncio.create_task(group.run("key", upstream)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.sleep(0.01)
+        cancelled = upstream.cancelled
+        # A later caller starts a new call instead of joining the cancelled one
+        upstream.release.set()
+        return group, upstream, cancelled, await group.run("key", upstream)
+
+    group, upstream, cancelled, result = asyncio.run(main())
+    assert cancelled == 1
+    assert result == "done"
+    assert upstream.started == 2
+    assert group.stats() == {"in_flight": 0, "executed": 2, "coalesced": 1, "abandoned": 1}
+
+
+def test_exception_reaches_every_waiter():
+    async def main():
+        group = SingleFlight("test")
+        upstream = Upstream(error=ValueError("upstream failed"))
+        callers = [asyncio.create_task(group.run("key", upstream)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        upstream.release.set()
+        return group, upstream, await asyncio.gather(*callers, return_exceptions=True)
+
+    group, upstream, results = asyncio.run(main())
+    assert upstream.started == 1
+    assert all(result is upstream.error for result in results)
+    assert group.stats()["in_flight"] == 0
+
+
+def test_read_after_a_write_does_not_join_an_earlier_read():
+    async def main():
+        repository = GatedRepository()
+        before = asyncio.create_task(repository.select("patient"))
+        joined = asyncio.create_task(repository.select("patient"))
+        await asyncio.sleep(0.01)
+        await repository.insert("patient", [{"id": "p1"}])
+        after = asyncio.create_task(repository.select("patient"))
+        await asyncio.sleep(0.01)
+        repository.gate.set()
+        return repository, await before, await joined, await after
+
+    repository, before, joined, after = asyncio.run(main())
+    assert repository.selects == 2
+    assert before == joined == []
+    assert after == [{"id": "p1"}]
+
+
+def test_calls_in_different_lanes_are_not_merged():
+    lanes = []
+
+    async def call():
+        lanes.append(current_lane())
+        await asyncio.sleep(0.01)
+        return "done"
+
+    async def caller(group, priority):
+        with lane(priority):
+            return await group.run("key", call)
+
+    async def main():
+        group = SingleFlight("test")
+        await asyncio.gather(caller(group, BACKGROUND), caller(group, INTERACTIVE), caller(group, INTERACTIVE))
+        return group
+
+    group = asyncio.run(main())
+    assert sorted(lanes) == [INTERACTIVE, BACKGROUND]
+    assert (group.executed, group.coalesced) == (2, 1)
+
+
+def test_upstream_time_goes_to_every_waiter_trace():
+    async def call():
+        record("upstream", 0.5)
+        await asyncio.sleep(0.01)
+        return "done"
+
+    async def caller(group):
+        trace = Trace()
+        with tracing(trace):
+            await group.run("key", call)
+        return trace.spans
+
+    async def main():
+        group = SingleFlight("test")
+        return await asyncio.gather(caller(group), caller(group))
+
+    first, joined = asyncio.run(main())
+    assert first == {"upstream": [1, 0.5]}
+    assert joined["upstream"] == [1, 0.5]
+    assert joined["test-coalesced"][0] == 1
+
+
+def test_disabled_single_flight_runs_every_call(monkeypatch):
+    monkeypatch.setattr(singleflight, "SINGLE_FLIGHT", False)
+
+    async def main():
+        group = SingleFlight("test")
+        upstream = Upstream(result="done")
+        callers = [asyncio.create_task(group.run("key", upstream)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        upstream.release.set()
+        await asyncio.gather(*callers)
+        return upstream
+
+    assert asyncio.run(main()).started == 2
+
+
+@pytest.mark.parametrize("cache, generations", [(CACHE_USE, 1), (CACHE_BYPASS, 2)])
+def test_only_cached_generations_are_coalesced(monkeypatch, cache, generations):
+    prompts = []
+
+    async def generate(prompt, on_winner=None):
+        prompts.append(prompt)
+        await asyncio.sleep(0.01)
+        return "note"
+
+    monkeypatch.setattr(llm, "generate", generate)
+    monkeypatch.setattr(llm.result_cache, "get", lambda key: None)
+    monkeypatch.setattr(llm.result_cache, "set", lambda key, value: None)
+
+    async def main():
+        inputs = {"transcript": "patient reports a cough"}
+        return await asyncio.gather(*(llm.cached_generate("soap_note", inputs, "prompt", cache)
+                                      for _ in range(2)))
+
+    assert asyncio.run(main()) == ["note", "note"]
+    assert len(prompts) == generations
@@ -0,0 +1,91 @@
+import asyncio
+import sqlite3
+
+import pytest
+from postgrest.exceptions import APIError
+
+from core import async_crud
+from core.storage import INDEXES, SQLiteRepository
+
+CONVERSATION = {"doctor_id": "DR001", "patient_id": "p1", "appointment_id": "a1", "text": "t", "summary": "s"}
+
+
+def test_sqlite_fills_in_created_at(tmp_path):
+    async def main(path):
+        repository = SQLiteRepository(path)
+        try:
+            first = await repository.insert("conversation", [{**CONVERSATION, "conversation_id": "zzz"}])
+            await asyncio.sleep(0.01)
+            second = await repository.insert("conversation", [{**CONVERSATION, "conversation_id": "aaa"}])
+            latest = await repository.select("conversation", order="created_at", descending=True, limit=1)
+        finally:
+            await repository.close()
+        return first[0], second[0], latest
+
+    first, second, latest = asyncio.run(main(str(tmp_path / "mediscribe.db")))
+    assert first["created_at"] < second["created_at"]
+    assert second["created_at"].endswith("Z")
+    assert [row["conversation_id"] for row in latest] == ["aaa"]
+
+
+def test_old_sqlite_files_gain_the_column_and_its_default(tmp_path):
+    path = str(tmp_path / "old.db")
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE conversation (conversation_id TEXT PRIMARY KEY, doctor_id TEXT, "
+                       "patient_id TEXT, appointment_id TEXT, text TEXT, summary TEXT)")
+    connection.execute("INSERT INTO conversation VALUES ('legacy', 'DR001', 'p1', 'a1', 't', 's')")
+    connection.commit()
+    connection.close()
+
+    async def main():
+        repository = SQLiteRepository(path)
+        try:
+            await repository.insert("conversation", [{**CONVERSATION, "conversation_id": "new"}])
+            return await repository.select("conversation", order="created_at", descending=True)
+        finally:
+            await repository.close()
+
+    rows = asyncio.run(main())
+    assert [row["conversation_id"] for row in rows] == ["new", "legacy"]
+    assert rows[1]["created_at"] is None
+    connection = sqlite3.connect(path)
+    indexes = {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    tables = {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    connection.close()
+    assert set(INDEXES) <= indexes
+    assert "conversation_old" not in tables
+
+
+class UndatedRepository:
+    """A conversation table without created_at, as on a Supabase project that has not added it."""
+
+    def __init__(self):
+        self.selects = []
+
+    async def select(self, table, filters=(), columns="*", order=None, descending=False, limit=None):
+        self.selects.append(order)
+        if order == "created_at":
+            raise APIError({"message": "column conversation.created_at does not exist", "code": "42703"})
+        return [{"conversation_id": "first"}, {"conversation_id": "second"}]
+
+
+def test_latest_conversation_falls_back_without_created_at(monkeypatch):
+    repository = UndatedRepository()
+    monkeypatch.setattr(async_crud, "get_repository", lambda: repository)
+    monkeypatch.setattr(async_crud, "_conversations_dated", True)
+
+    assert asyncio.run(async_crud.get_latest_conversation("a1")) == {"conversation_id": "second"}
+    assert asyncio.run(async_crud.get_latest_conversation("a1")) == {"conversation_id": "second"}
+    # The failing ordered query is only tried once
+    assert repository.selects == ["created_at", None, None]
+
+
+def test_other_errors_are_not_mistaken_for_a_missing_column(monkeypatch):
+    class Failing(UndatedRepository):
+        async def select(self, *args, **kwargs):
+            raise APIError({"message": "permission denied", "code": "42501"})
+
+    monkeypatch.setattr(async_crud, "get_repository", lambda: Failing())
+    monkeypatch.setattr(async_crud, "_conversations_dated", True)
+    with pytest.raises(APIError):
+        asyncio.run(async_crud.get_latest_conversation("a1"))
@@ -0,0 +1,82 @@
+import asyncio
+import hashlib
+
+import httpx
+import pytest
+
+from core import governor, transcribe
+
+AUDIO = bytes(range(256)) * 4096
+
+
+async def upload(data: bytes, size: int = 65536):
+    for offset in range(0, len(data), size):
+        yield data[offset:offset + size]
+
+
+@pytest.fixture
+def groq(monkeypatch):
+    """Records the audio each transcription request sends; the first `failures` requests fail."""
+    sent = []
+    state = {"failures": 0}
+
+    async def request(filename, content_type, chunks):
+        audio = bytearray()
+        async for chunk in chunks:
+            audio.extend(chunk)
+        sent.append(bytes(audio))
+        if state["failures"]:
+            state["failures"] -= 1
+            raise httpx.ConnectError("connection reset")
+        return {"text": f" {len(audio)} bytes ", "segments": []}
+
+    stored = {}
+
+    async def get_cached_transcript(digest, segmented=False):
+        return stored.get(digest)
+
+    async def store_transcript(digest, segmented, transcript):
+        stored[digest] = transcript
+
+    monkeypatch.setattr(transcribe, "_request", request)
+    monkeypatch.setattr(transcribe, "get_cached_transcript", get_cached_transcript)
+    monkeypatch.setattr(transcribe, "_store_transcript", store_transcript)
+    monkeypatch.setattr(governor, "UPSTREAM_BACKOFF_BASE", 0.001)
+    return sent, stored, state
+
+
+def test_claimed_hash_is_served_only_when_the_upload_matches(groq):
+    sent, stored, _ = groq
+    digest = hashlib.sha256(AUDIO).hexdigest()
+    stored[digest] = {"text": "cached", "segments": []}
+
+    result = asyncio.run(transcribe.transcribe_stream("a.wav", "audio/wav", upload(AUDIO), expected_sha256=digest))
+    assert (result["text"], result["cached"]) == ("cached", True)
+    assert sent == []
+
+    other = AUDIO[::-1]
+    result = asyncio.run(transcribe.transcribe_stream("a.wav", "audio/wav", upload(other), expected_sha256=digest))
+    assert result["cached"] is False
+    assert result["sha256"] == hashlib.sha256(other).hexdigest()
+    assert sent == [other]
+
+
+def test_buffered_upload_is_replayed_on_retry(groq):
+    sent, stored, state = groq
+    digest = hashlib.sha256(AUDIO).hexdigest()
+    stored[digest] = {"text": "cached", "segments": []}
+    state["failures"] = 1
+
+    other = AUDIO[::-1]
+    result = asyncio.run(transcribe.transcribe_stream("a.wav", "audio/wav", upload(other), expected_sha256=digest))
+    assert result["text"] == f"{len(other)} bytes"
+    assert sent == [other, other]
+
+
+def test_streamed_upload_is_not_retried(groq):
+    sent, _, state = groq
+    state["failures"] = 1
+
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(transcribe.transcribe_stream("a.wav", "audio/wav", upload(AUDIO)))
+    assert sent == [AUDIO]
@@ -1,7 +1,7 @@
 "use client"
 
 import { useState, useEffect, useRef } from "react"
-import { format } from "date-fns"
+import { addDays, format } from "date-fns"
 import { Calendar } from "@/components/ui/calendar"
 import { Button } from "@/components/ui/button"
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from "@/components/ui/card"
@@ -42,6 +42,8 @@ export default function BookingPage() {
   const chatContainerRef = useRef<HTMLDivElement>(null)
   const [typingContent, setTypingContent] = useState("")
   const [typingIndex, setTypingIndex] = useState(0)
+  // Free times keyed by `${doctorId}:${yyyy-MM-dd}`, prefetched two weeks at a time
+  const availabilityRef = useRef<Record<string, string[]>>({})
 
   // Fetch doctors on component mount
   useEffect(() => {
@@ -69,12 +71,21 @@ export default function BookingPage() {
   useEffect(() => {
     const fetchAvailableTimes = async () => {
       if (date && selectedDoctor) {
+        const key = `${selectedDoctor}:${format(date, 'yyyy-MM-dd')}`
+        if (availabilityRef.current[key]) {
+          setAvailableTimes(availabilityRef.current[key])
+          return
+        }
         try {
-          const times = await api.getDoctorAvailableTimes(
-            selectedDoctor,
-            format(date, 'yyyy-MM-dd')
+          const availability = await api.getDoctorAvailability(
+            [selectedDoctor],
+            format(date, 'yyyy-MM-dd'),
+            format(addDays(date, 13), 'yyyy-MM-dd')
           )
-          setAvailableTimes(times)
+          for (const [day, times] of Object.entries(availability[selectedDoctor] ?? {})) {
+            availabilityRef.current[`${selectedDoctor}:${day}`] = times
+          }
+          setAvailableTimes(availabilityRef.current[key] ?? [])
         } catch (error) {
           toast({
             title: "Error",
@@ -119,6 +130,9 @@ export default function BookingPage() {
         patient_id: "PT001", // This would come from auth context in a real app
         type: formData.reason
       })
+      const key = `${selectedDoctor}:${format(date, 'yyyy-MM-dd')}`
+      availabilityRef.current[key] = (availabilityRef.current[key] ?? []).filter(time => time !== selectedTime)
+      setAvailableTimes(availabilityRef.current[key])
 
       toast({
         title: "Success",
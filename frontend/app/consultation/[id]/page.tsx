@@ -12,6 +12,7 @@ import { Tabs, TabsContent, TabsList, TabsTrigger } from "@/components/ui/tabs"
 import { toast } from "sonner"
 import { api } from "@/lib/api"
 import { useAudioRecorder } from "@/lib/hooks/useAudioRecorder"
+import { useLiveTranscription } from "@/lib/hooks/useLiveTranscription"
 
 interface Patient {
   id: string;
@@ -21,6 +22,11 @@ interface Patient {
   previous_procedures: string;
 }
 
+async function sha256Hex(blob: Blob): Promise<string> {
+  const digest = await crypto.subtle.digest('SHA-256', await blob.arrayBuffer())
+  return Array.from(new Uint8Array(digest)).map(b => b.toString(16).padStart(2, '0')).join('')
+}
+
 async function blobToFile(blob: Blob): Promise<File> {
   const timestamp = new Date().getTime()
   return new File([blob], `recording-${timestamp}.wav`, { type: 'audio/wav' })
@@ -35,7 +41,9 @@ export default function ConsultationPage() {
   const [transcribing, setTranscribing] = useState(false)
   const [appointment, setAppointment] = useState<any>(null)
   const [patient, setPatient] = useState<Patient | null>(null)
-  const { isRecording, startRecording, stopRecording } = useAudioRecorder()
+  const { isRecording: isUploadRecording, startRecording, stopRecording } = useAudioRecorder()
+  const { isStreaming, liveText, startStreaming, stopStreaming } = useLiveTranscription()
+  const isRecording = isUploadRecording || isStreaming
   const [showSoapNotes, setShowSoapNotes] = useState(false)
   const [soapNotes, setSoapNotes] = useState("")
   const [referralLetter, setReferralLetter] = useState("")
@@ -47,15 +55,10 @@ export default function ConsultationPage() {
     const fetchData = async () => {
       try {
         setLoading(true)
-        const [appointmentData] = await Promise.all([
-          fetch(`${API_BASE_URL}/appointments/${appointmentId}`).then(res => res.json())
-        ])
-        setAppointment(appointmentData);
-        const [patientData] = await Promise.all([
-          fetch(`${API_BASE_URL}/patients/${appointmentData.patient_id}`).then(res => res.json())
-        ])
-        setPatient(patientData);
-        console.log(patientData);
+        // One request returns the appointment with its patient embedded
+        const consultation = await api.getConsultation(appointmentId as string)
+        setAppointment(consultation.appointment);
+        setPatient(consultation.patient);
       } catch (error) {
         toast.error("Failed to fetch consultation details")
       } finally {
@@ -70,21 +73,33 @@ export default function ConsultationPage() {
   const handleRecording = async () => {
     try {
       if (!isRecording) {
-        await startRecording()
+        setTranscription("")
+        try {
+          // Transcribe while the visit is in progress; fall back to uploading the recording afterwards
+          await startStreaming()
+        } catch (error) {
+          console.warn('Live transcription unavailable, recording for upload:', error)
+          await startRecording()
+        }
       } else {
         setTranscribing(true)
-        const audioBlob = await stopRecording()
-        
-        const audioFile = await blobToFile(audioBlob)
-        const formData = new FormData()
-        formData.append('file', audioFile)
-        
-        // Get transcription
-        const response = await api.transcribeAudio(formData)
-        if (!response.ok) {
-          throw new Error('Transcription failed')
+        let transcription = ""
+        if (isStreaming) {
+          transcription = await stopStreaming()
+        } else {
+          const audioBlob = await stopRecording()
+
+          const audioFile = await blobToFile(audioBlob)
+          const formData = new FormData()
+          formData.append('file', audioFile)
+
+          // Get transcription
+          const response = await api.transcribeAudio(formData, await sha256Hex(audioFile))
+          if (!response.ok) {
+            throw new Error('Transcription failed')
+          }
+          transcription = (await response.json()).transcription
         }
-        const { transcription } = await response.json()
         setTranscription(transcription)
 
         // Generate summary using the new endpoint
@@ -293,8 +308,8 @@ export default function ConsultationPage() {
                     <CardTitle>Conversation Transcript</CardTitle>
                   </CardHeader>
                   <CardContent>
-                    {transcription ? (
-                      <p className="text-sm whitespace-pre-wrap">{transcription}</p>
+                    {transcription || liveText ? (
+                      <p className="text-sm whitespace-pre-wrap">{transcription || liveText}</p>
                     ) : (
                       <p className="text-sm text-muted-foreground italic">
                         No conversation transcript available yet
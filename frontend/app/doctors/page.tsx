@@ -9,12 +9,12 @@ import { Calendar } from "@/components/ui/calendar"
 import { Popover, PopoverContent, PopoverTrigger } from "@/components/ui/popover"
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from "@/components/ui/card"
 import { SiteHeader } from "@/components/site-header"
-import { api, Appointment } from "@/lib/api"
+import { api, DoctorDay } from "@/lib/api"
 import { useToast } from "@/components/ui/use-toast"
 
 export default function DoctorDashboard() {
   const [date, setDate] = useState<Date>(new Date())
-  const [appointments, setAppointments] = useState<Appointment[]>([])
+  const [appointments, setAppointments] = useState<DoctorDay["appointments"]>([])
   const [loading, setLoading] = useState(true)
   const { toast } = useToast()
 
@@ -25,8 +25,9 @@ export default function DoctorDashboard() {
         setLoading(true)
         const doctorId = "DR001" // This would come from auth context
         const formattedDate = format(date, 'yyyy-MM-dd')
-        const appointmentsList = await api.getDoctorAppointments(doctorId, formattedDate)
-        setAppointments(appointmentsList)
+        // Patients come embedded, so the list renders without a request per appointment
+        const day = await api.getDoctorDay(doctorId, formattedDate)
+        setAppointments(day.appointments)
       } catch (error) {
         toast({
           title: "Error",
@@ -102,11 +103,11 @@ export default function DoctorDashboard() {
                   ) : (
                     appointments.map((appointment) => (
                       <div
-                        key={appointment.patient_id}
+                        key={appointment.appointment_id}
                         className="flex items-center justify-between p-4 border rounded-lg"
                       >
                         <div className="space-y-1">
-                          <p className="font-medium">Patient ID: {appointment.patient_id}</p>
+                          <p className="font-medium">{appointment.patient?.name ?? `Patient ID: ${appointment.patient_id}`}</p>
                           <p className="text-sm text-muted-foreground">{appointment.type}</p>
                         </div>
                         <div className="flex items-center space-x-4">
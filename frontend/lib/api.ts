@@ -24,6 +24,29 @@ export interface Patient {
   previous_procedures: string;
 }
 
+export interface Conversation {
+  conversation_id: string;
+  doctor_id: string;
+  patient_id: string;
+  appointment_id: string;
+  text: string;
+  summary: string;
+  created_at?: string;
+}
+
+export interface Consultation {
+  appointment: Appointment;
+  patient: (Patient & { id: string }) | null;
+  conversation: Conversation | null;
+}
+
+export interface DoctorDay {
+  doctor_id: string;
+  date: string;
+  appointments: (Appointment & { patient: { id: string; name: string; contact: string } | null })[];
+  free_times: string[];
+}
+
 // API service functions
 export const api = {
   // Doctors
@@ -50,12 +73,34 @@ export const api = {
     return response.json();
   },
 
+  // A doctor's appointments for a date with each patient embedded, plus the free times, in one request
+  getDoctorDay: async (doctorId: string, date: string): Promise<DoctorDay> => {
+    const response = await fetch(`${API_BASE_URL}/appointments/doctor/${doctorId}/day/${date}`);
+    if (!response.ok) throw new Error('Failed to fetch doctor day');
+    return response.json();
+  },
+
+  // An appointment with its patient and latest conversation, in one request
+  getConsultation: async (appointmentId: string): Promise<Consultation> => {
+    const response = await fetch(`${API_BASE_URL}/appointments/${appointmentId}/consultation`);
+    if (!response.ok) throw new Error('Failed to fetch consultation');
+    return response.json();
+  },
+
   getDoctorAvailableTimes: async (doctorId: string, date: string): Promise<string[]> => {
     const response = await fetch(`${API_BASE_URL}/appointments/doctor/${doctorId}/times/${date}`);
     if (!response.ok) throw new Error('Failed to fetch available times');
     return response.json();
   },
 
+  // Free slots per doctor and date for an inclusive date range, in one request
+  getDoctorAvailability: async (doctorIds: string[], start: string, end: string): Promise<Record<string, Record<string, string[]>>> => {
+    const params = new URLSearchParams({ doctor_ids: doctorIds.join(','), start, end });
+    const response = await fetch(`${API_BASE_URL}/appointments/availability?${params}`);
+    if (!response.ok) throw new Error('Failed to fetch availability');
+    return response.json();
+  },
+
   // Conversations
   createConversation: async (conversation: {
     doctor_id: string;
@@ -74,11 +119,12 @@ export const api = {
   },
 
   // Transcription
-  transcribeAudio: async (formData: FormData): Promise<Response> => {
+  // Passing the file's SHA-256 lets the server check its cache before sending a repeat upload to the backend
+  transcribeAudio: async (formData: FormData, sha256?: string): Promise<Response> => {
     const response = await fetch(`${API_BASE_URL}/transcribe/audio`, {
       method: 'POST',
       body: formData,
-      // headers: {'content-type': 'audio/wav'}
+      headers: sha256 ? { 'X-Content-SHA256': sha256 } : undefined,
     });
     return response;
   },
@@ -0,0 +1,140 @@
+import { useState, useRef } from 'react'
+
+const API_BASE_URL = process.env.NEXT_PUBLIC_API_BASE_URL || ''
+// How long to wait after stopping for the server's full transcript before using the segments received so far
+const TRANSCRIPT_TIMEOUT_MS = 20000
+
+// Converts microphone samples to 16-bit PCM off the main thread
+const PCM_WORKLET = `
+class PcmCapture extends AudioWorkletProcessor {
+  process(inputs) {
+    const channel = inputs[0][0]
+    if (channel) {
+      const pcm = new Int16Array(channel.length)
+      for (let i = 0; i < channel.length; i++) {
+        const s = Math.max(-1, Math.min(1, channel[i]))
+        pcm[i] = s < 0 ? s * 0x8000 : s * 0x7fff
+      }
+      this.port.postMessage(pcm.buffer, [pcm.buffer])
+    }
+    return true
+  }
+}
+registerProcessor('pcm-capture', PcmCapture)
+`
+
+interface Segment {
+  start: number
+  end: number
+  text: string
+}
+
+export function useLiveTranscription() {
+  const [isStreaming, setIsStreaming] = useState(false)
+  const [finalText, setFinalText] = useState('')
+  const [partialText, setPartialText] = useState('')
+  const socket = useRef<WebSocket | null>(null)
+  const audioContext = useRef<AudioContext | null>(null)
+  const mediaStream = useRef<MediaStream | null>(null)
+  const transcriptResolver = useRef<((text: string) => void) | null>(null)
+  // Final segments received so far, readable from callbacks that captured an older render
+  const committedText = useRef('')
+
+  const cleanup = () => {
+    mediaStream.current?.getTracks().forEach(track => track.stop())
+    audioContext.current?.close()
+    mediaStream.current = null
+    audioContext.current = null
+    setIsStreaming(false)
+  }
+
+  const openSocket = (sampleRate: number): Promise<WebSocket> => {
+    const url = `${API_BASE_URL.replace(/^http/, 'ws')}/transcribe/stream?sample_rate=${sampleRate}`
+    return new Promise((resolve, reject) => {
+      const ws = new WebSocket(url)
+      ws.binaryType = 'arraybuffer'
+      ws.onopen = () => resolve(ws)
+      ws.onerror = () => reject(new Error('Live transcription unavailable'))
+      ws.onmessage = (message) => {
+        const event = JSON.parse(message.data)
+        if (event.type === 'partial') {
+          setPartialText(event.text)
+        } else if (event.type === 'final') {
+          const text = event.segments.map((segment: Segment) => segment.text).join(' ')
+          committedText.current = committedText.current ? `${committedText.current} ${text}` : text
+          setFinalText(committedText.current)
+          setPartialText('')
+        } else if (event.type === 'transcript') {
+          committedText.current = event.text
+          setFinalText(event.text)
+          setPartialText('')
+          transcriptResolver.current?.(event.text)
+        } else if (event.type === 'error') {
+          console.error('Live transcription error:', event.detail)
+        }
+      }
+      ws.onclose = () => transcriptResolver.current?.(committedText.current)
+    })
+  }
+
+  const startStreaming = async () => {
+    committedText.current = ''
+    setFinalText('')
+    setPartialText('')
+    mediaStream.current = await navigator.mediaDevices.getUserMedia({
+      audio: { channelCount: 1, sampleRate: 16000 }
+    })
+    try {
+      audioContext.current = new AudioContext({ sampleRate: 16000 })
+      const moduleUrl = URL.createObjectURL(new Blob([PCM_WORKLET], { type: 'application/javascript' }))
+      await audioContext.current.audioWorklet.addModule(moduleUrl)
+      URL.revokeObjectURL(moduleUrl)
+
+      socket.current = await openSocket(audioContext.current.sampleRate)
+      const source = audioContext.current.createMediaStreamSource(mediaStream.current)
+      const capture = new AudioWorkletNode(audioContext.current, 'pcm-capture')
+      capture.port.onmessage = (message) => {
+        if (socket.current?.readyState === WebSocket.OPEN) {
+          socket.current.send(message.data)
+        }
+      }
+      source.connect(capture)
+      setIsStreaming(true)
+    } catch (error) {
+      cleanup()
+      throw error
+    }
+  }
+
+  // Resolves with the full transcript, which the server has mostly finished by the time recording stops.
+  // If it never arrives, resolves after TRANSCRIPT_TIMEOUT_MS with the final segments received so far.
+  const stopStreaming = (): Promise<string> => {
+    return new Promise((resolve) => {
+      const ws = socket.current
+      cleanup()
+      if (!ws || ws.readyState !== WebSocket.OPEN) {
+        resolve(committedText.current)
+        return
+      }
+      const timeout = setTimeout(() => {
+        console.error('Live transcription did not return a transcript in time')
+        transcriptResolver.current?.(committedText.current)
+      }, TRANSCRIPT_TIMEOUT_MS)
+      transcriptResolver.current = (text: string) => {
+        clearTimeout(timeout)
+        transcriptResolver.current = null
+        socket.current = null
+        ws.close()
+        resolve(text)
+      }
+      ws.send(JSON.stringify({ type: 'stop' }))
+    })
+  }
+
+  return {
+    isStreaming,
+    liveText: partialText ? `${finalText} ${partialText}`.trim() : finalText,
+    startStreaming,
+    stopStreaming
+  }
+}